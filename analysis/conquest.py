@@ -0,0 +1,165 @@
+import linecache
+import random
+from collections import defaultdict
+from functools import lru_cache
+
+# Generates exact conquest kernels for any number of decks from the series' state machine.
+# A state is the pair of decks each player already won with (bitmasks, deck i is bit i). Every game each player
+# picks one of their remaining decks at random, the winner's deck is done, and the hero wins the series once all
+# their decks won. The kernel is flat straight-line code: the forward probability of every reachable state,
+# with each matchup cell and each sum of cells computed once and reused (common subexpression elimination).
+#
+# conquest_kernel(3) is the same series as conquest_bo5, conquest_kernel(3, fixed=True) as conquest_bo5_fixed,
+# conquest_kernel(2) as conquest_bo3 and conquest_kernel(4) is Bo7 (5 decks, 1 ban).
+# batched=True kernels take a numpy matchup matrix and arrays of deck ids, and evaluate all of them at once.
+
+def _remaining(won, n):
+    return [i for i in range(n) if not won >> i & 1]
+
+def _popcount(mask):
+    return bin(mask).count("1")
+
+class _Emitter:
+    def __init__(self, batched):
+        self.batched = batched
+        self.lines = []
+        self.names = set()
+
+    def define(self, name, expression):
+        if name not in self.names:
+            self.names.add(name)
+            self.lines.append(f"{name} = {expression}")
+        return name
+
+    def cell(self, h, v):
+        index = f"mups[h{h + 1}, v{v + 1}]" if self.batched else f"mups[h{h + 1}][v{v + 1}]"
+        return self.define(f"m{h + 1}_{v + 1}", index)
+
+    # Hero deck h wins against one of the villain decks vs
+    def hero_wins(self, h, vs):
+        if len(vs) == 1:
+            return self.cell(h, vs[0])
+        mask = sum(1 << v for v in vs)
+        return self.define(f"w{h + 1}_{mask}", " + ".join(self.cell(h, v) for v in vs))
+
+    # Villain deck v wins against one of the hero decks hs
+    def villain_wins(self, v, hs):
+        mask = sum(1 << h for h in hs)
+        cells = " - ".join(self.cell(h, v) for h in hs)
+        return self.define(f"l{v + 1}_{mask}", f"{len(hs)} - {cells}")
+
+def conquest_name(n, fixed=False, batched=False):
+    return f"conquest_{n}" + ("_fixed" if fixed else "") + ("_batched" if batched else "")
+
+# Source code of the kernel for n decks per player
+# fixed: the hero plays their decks in order (h1 until it wins, then h2...), like conquest_bo5_fixed
+def conquest_source(n, fixed=False, batched=False):
+    if n < 1:
+        raise ValueError("A conquest series needs at least one deck per player")
+    full = (1 << n) - 1
+    emitter = _Emitter(batched)
+    incoming = defaultdict(list)
+    wins = []
+
+    states = [(hw, vw) for hw in range(full) for vw in range(full)]
+    states.sort(key=lambda state: (_popcount(state[0]) + _popcount(state[1]), state))
+    for hw, vw in states:
+        if (hw, vw) == (0, 0):
+            probability = None
+        elif incoming[(hw, vw)]:
+            probability = emitter.define(f"p{hw}_{vw}", " + ".join(incoming.pop((hw, vw))))
+        else:
+            continue
+
+        hs = _remaining(hw, n)[:1] if fixed else _remaining(hw, n)
+        vs = _remaining(vw, n)
+        games = len(hs) * len(vs)
+        transitions = [((hw | 1 << h, vw), emitter.hero_wins(h, vs)) for h in hs]
+        transitions += [((hw, vw | 1 << v), emitter.villain_wins(v, hs)) for v in vs]
+        for (next_hw, next_vw), chance in transitions:
+            term = chance if probability is None else f"{probability}*{chance}"
+            if games > 1:
+                term = f"{term}/{games}"
+            if next_hw == full:
+                wins.append(term)
+            elif next_vw != full:
+                incoming[(next_hw, next_vw)].append(term)
+
+    decks = ", ".join([f"h{i + 1}" for i in range(n)] + [f"v{i + 1}" for i in range(n)])
+    body = emitter.lines + ["return " + " + ".join(wins)]
+    return f"def {conquest_name(n, fixed, batched)}(mups, {decks}):\n" + "".join(f"    {line}\n" for line in body)
+
+# Compiled kernel for n decks per player, generated once per process
+@lru_cache(maxsize=None)
+def conquest_kernel(n, fixed=False, batched=False):
+    source = conquest_source(n, fixed, batched)
+    name = conquest_name(n, fixed, batched)
+    filename = f"<{name}>"
+    # Lets tracebacks and profilers show the generated lines
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+    namespace = {}
+    exec(compile(source, filename, "exec"), namespace)
+    return namespace[name]
+
+# Chances of winning for each ban option, for lineups of any size (each player bans one deck)
+def ban_list(mups, hero_decks, villain_decks, fixed=False):
+    conquest = conquest_kernel(len(hero_decks) - 1, fixed)
+    final = [[] for _ in range(len(hero_decks))]
+
+    for i in range(len(hero_decks)):
+        h_subset = hero_decks[:i] + hero_decks[i+1:]
+        for j in range(len(villain_decks)):
+            v_subset = villain_decks[:j] + villain_decks[j+1:]
+            final[i].append(conquest(mups, *h_subset, *v_subset))
+
+    return final
+
+# Compares the generated kernels with the hand-written formulas and the recursive conquest on random matchups,
+# returns a list of mismatches (empty if they all agree)
+def check_generated(trials=20, seed=0, num_decks=10, max_decks=4, tolerance=1e-12):
+    import numpy as np
+    from . import series as se
+
+    rng = random.Random(seed)
+    mismatches = []
+
+    def compare(name, got, expected):
+        if not np.allclose(got, expected, rtol=0, atol=tolerance):
+            mismatches.append(f"{name}: {got} != {expected}")
+
+    for _ in range(trials):
+        # Not antisymmetric, like HSReplay matchups measured from each side: every formula reads mups[h][v] only
+        mups = [[rng.uniform(0.2, 0.8) for _ in range(num_decks)] for _ in range(num_decks)]
+
+        h, v = rng.sample(range(num_decks), max_decks), rng.sample(range(num_decks), max_decks)
+        compare("conquest_bo3", conquest_kernel(2)(mups, *h[:2], *v[:2]), se.conquest_bo3(mups, *h[:2], *v[:2]))
+        compare("conquest_bo5", conquest_kernel(3)(mups, *h[:3], *v[:3]), se.conquest_bo5(mups, *h[:3], *v[:3]))
+        compare("conquest_bo5_fixed", conquest_kernel(3, fixed=True)(mups, *h[:3], *v[:3]),
+                se.conquest_bo5_fixed(mups, *h[:3], *v[:3]))
+        for n in range(1, max_decks + 1):
+            compare(f"conquest_{n}", conquest_kernel(n)(mups, *h[:n], *v[:n]),
+                    se.conquest_recursive(mups, h[:n], v[:n]))
+
+    matrix = np.array(mups)
+    np_rng = np.random.default_rng(seed)
+    for n in range(1, max_decks + 1):
+        for fixed in (False, True):
+            decks = [np_rng.integers(0, num_decks, trials) for _ in range(2 * n)]
+            batched = conquest_kernel(n, fixed, batched=True)(matrix, *decks)
+            scalar = [conquest_kernel(n, fixed)(mups, *(int(d[k]) for d in decks)) for k in range(trials)]
+            compare(conquest_name(n, fixed, batched=True), batched, np.array(scalar))
+    return mismatches
+
+# python -m analysis.conquest [N] [--fixed] [--batched]: prints a kernel's source, or checks them all without N
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Generates exact conquest kernels.")
+    parser.add_argument("decks", type=int, nargs="?", help="decks per player after bans (3 is Bo5)")
+    parser.add_argument("--fixed", action="store_true", help="hero plays their decks in order")
+    parser.add_argument("--batched", action="store_true", help="numpy kernel over arrays of deck ids")
+    args = parser.parse_args()
+    if args.decks:
+        print(conquest_source(args.decks, args.fixed, args.batched))
+    else:
+        mismatches = check_generated()
+        print("\n".join(mismatches) if mismatches else "Generated kernels match the reference formulas")
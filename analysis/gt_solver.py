@@ -1,9 +1,18 @@
+import numpy as np
 from operator import add, neg
 
 # Function used to solve a payoff matrix nash equilibrium efficiently
 # The function is a python implementation of the Lemke-Howson algorithm
 # I did not write this function myself
 def solve(payoff_matrix, iterations=1000):
+    rowcnt, colcnt, value_of_game, _ = solve_to_tolerance(payoff_matrix, None, iterations)
+    return rowcnt, colcnt, value_of_game
+
+# The iterations of solve, stopping once the duality gap is under tolerance instead of always running max_iterations
+# (tolerance None runs them all, that is solve). After t iterations max(row_cum_payoff)/t and min(col_cum_payoff)/t
+# bound the value of the game from above and below, the gap is checked every check_every iterations.
+# Returns the gap too, the value is within gap/2 of the real one
+def solve_to_tolerance(payoff_matrix, tolerance, max_iterations=1000, check_every=10):
     transpose = list(zip(*payoff_matrix))
     numrows = len(payoff_matrix)
     numcols = len(transpose)
@@ -14,12 +23,38 @@ def solve(payoff_matrix, iterations=1000):
     colcnt = [0] * numcols
     rowcnt = [0] * numrows
     active = 0
-    for _ in range(iterations):
+    iterations = 0
+    while iterations < max_iterations:
         rowcnt[active] += 1
         col_cum_payoff = list(map(add, payoff_matrix[active], col_cum_payoff))
         active = min(list(zip(col_cum_payoff, colpos)))[1]
         colcnt[active] += 1
         row_cum_payoff = list(map(add, transpose[active], row_cum_payoff))
         active = -max(list(zip(row_cum_payoff, rowpos)))[1]
+        iterations += 1
+        if (tolerance is not None and iterations % check_every == 0
+                and (max(row_cum_payoff) - min(col_cum_payoff)) / iterations <= tolerance):
+            break
+    gap = (max(row_cum_payoff) - min(col_cum_payoff)) / iterations
     value_of_game = (max(row_cum_payoff) + min(col_cum_payoff)) / 2.0 / iterations
-    return rowcnt, colcnt, value_of_game
+    return rowcnt, colcnt, value_of_game, gap
+
+# Same algorithm on many payoff matrices at once, payoffs has shape (games, rows, columns)
+# argmin/argmax return the first index on ties like min/max above, so each game plays out exactly like solve
+def solve_batch(payoffs, iterations=1000):
+    games, numrows, numcols = payoffs.shape
+    game = np.arange(games)
+    row_cum_payoff = np.zeros((games, numrows))
+    col_cum_payoff = np.zeros((games, numcols))
+    rowcnt = np.zeros((games, numrows), dtype=np.int64)
+    colcnt = np.zeros((games, numcols), dtype=np.int64)
+    active = np.zeros(games, dtype=np.intp)
+    for _ in range(iterations):
+        rowcnt[game, active] += 1
+        col_cum_payoff += payoffs[game, active, :]
+        active = col_cum_payoff.argmin(axis=1)
+        colcnt[game, active] += 1
+        row_cum_payoff += payoffs[game, :, active]
+        active = row_cum_payoff.argmax(axis=1)
+    values = (row_cum_payoff.max(axis=1) + col_cum_payoff.min(axis=1)) / 2.0 / iterations
+    return rowcnt, colcnt, values
@@ -0,0 +1,202 @@
+import random
+import warnings
+import numpy as np
+from multiprocessing import parent_process
+from . import series as se
+from . import gt_solver as gt
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Pluggable implementations of the hot kernels: conquest_bo5, ban_list_bo5, solve, solve_to_tolerance and lhs_first_pick
+# "python" uses series.py and gt_solver.py as they are, "numba" uses the compiled versions below
+# Matchups go through prepare() once, each backend wants them in its own format (lists or a float64 array)
+class Kernels:
+    def __init__(self, name, prepare, conquest_bo5, ban_list_bo5, solve, solve_to_tolerance, lhs_first_pick):
+        self.name = name
+        self.prepare = prepare
+        self.conquest_bo5 = conquest_bo5
+        self.ban_list_bo5 = ban_list_bo5
+        self.solve = solve
+        self.solve_to_tolerance = solve_to_tolerance
+        self.lhs_first_pick = lhs_first_pick
+
+PYTHON = Kernels(
+    "python",
+    lambda mups: np.asarray(mups, dtype=float).tolist(),
+    se.conquest_bo5,
+    se.banList_bo5,
+    gt.solve,
+    gt.solve_to_tolerance,
+    se.lhs_first_pick,
+)
+
+# Compiled kernels, cache=True saves the machine code next to the sources so new processes don't compile again
+# Same operations in the same order as the Python versions, ties are broken the same way
+if numba is not None:
+    _nb_conquest_bo5 = numba.njit(cache=True)(se.conquest_bo5)
+
+    @numba.njit(cache=True)
+    def _nb_ban_list_bo5(mups, hero_decks, villain_decks):
+        final = np.empty((4, 4))
+        for i in range(4):
+            h = np.delete(hero_decks, i)
+            for j in range(4):
+                v = np.delete(villain_decks, j)
+                final[i, j] = _nb_conquest_bo5(mups, h[0], h[1], h[2], v[0], v[1], v[2])
+        return final
+
+    @numba.njit(cache=True)
+    def _nb_play(payoff_matrix, row_cum_payoff, col_cum_payoff, rowcnt, colcnt, active):
+        numrows, numcols = payoff_matrix.shape
+        rowcnt[active] += 1
+        for j in range(numcols):
+            col_cum_payoff[j] = payoff_matrix[active, j] + col_cum_payoff[j]
+        active = 0
+        for j in range(1, numcols):
+            if col_cum_payoff[j] < col_cum_payoff[active]:
+                active = j
+        colcnt[active] += 1
+        for i in range(numrows):
+            row_cum_payoff[i] = payoff_matrix[i, active] + row_cum_payoff[i]
+        active = 0
+        for i in range(1, numrows):
+            if row_cum_payoff[i] > row_cum_payoff[active]:
+                active = i
+        return active
+
+    @numba.njit(cache=True)
+    def _nb_solve(payoff_matrix, iterations, tolerance, check_every):
+        numrows, numcols = payoff_matrix.shape
+        row_cum_payoff = np.zeros(numrows)
+        col_cum_payoff = np.zeros(numcols)
+        rowcnt = np.zeros(numrows, dtype=np.int64)
+        colcnt = np.zeros(numcols, dtype=np.int64)
+        active = 0
+        played = 0
+        while played < iterations:
+            active = _nb_play(payoff_matrix, row_cum_payoff, col_cum_payoff, rowcnt, colcnt, active)
+            played += 1
+            if tolerance >= 0 and played % check_every == 0 and \
+                    (row_cum_payoff.max() - col_cum_payoff.min()) / played <= tolerance:
+                break
+        gap = (row_cum_payoff.max() - col_cum_payoff.min()) / played
+        value_of_game = (row_cum_payoff.max() + col_cum_payoff.min()) / 2.0 / played
+        return rowcnt, colcnt, value_of_game, gap
+
+    @numba.njit("float64(float64[:, :], int64[:], int64[:], int64, int64)", cache=True)
+    def _nb_lhs_rec(mups, h_decks, v_decks, h_active, v_active):
+        current_match = mups[h_decks[h_active], v_decks[v_active]]
+        if len(v_decks) == 1:
+            win = current_match
+        else:
+            new_v_decks = np.delete(v_decks, v_active)
+            win_rest = 1.0
+            for deck in range(len(new_v_decks)):
+                temp = _nb_lhs_rec(mups, h_decks, new_v_decks, h_active, deck)
+                if temp < win_rest:
+                    win_rest = temp
+            win = current_match * win_rest
+        if len(h_decks) == 1:
+            lose = 0.0
+        else:
+            new_h_decks = np.delete(h_decks, h_active)
+            win_rest = 0.0
+            for deck in range(len(new_h_decks)):
+                temp = _nb_lhs_rec(mups, new_h_decks, v_decks, deck, v_active)
+                if temp > win_rest:
+                    win_rest = temp
+            lose = (1 - current_match) * win_rest
+        return win + lose
+
+    @numba.njit(cache=True)
+    def _nb_lhs_first_pick(mups, h_decks, v_decks):
+        fp = np.empty((len(h_decks), len(v_decks)))
+        for i in range(len(h_decks)):
+            for j in range(len(v_decks)):
+                fp[i, j] = _nb_lhs_rec(mups, h_decks, v_decks, i, j)
+        return fp
+
+    def _decks(decks):
+        return np.asarray(decks, dtype=np.int64)
+
+    def _numba_solve(payoff_matrix, iterations=1000):
+        rowcnt, colcnt, value_of_game, _ = _nb_solve(np.asarray(payoff_matrix, dtype=np.float64), iterations, -1.0, 1)
+        return rowcnt, colcnt, value_of_game
+
+    def _numba_solve_to_tolerance(payoff_matrix, tolerance, max_iterations=1000, check_every=10):
+        return _nb_solve(np.asarray(payoff_matrix, dtype=np.float64), max_iterations, tolerance, check_every)
+
+    NUMBA = Kernels(
+        "numba",
+        lambda mups: np.ascontiguousarray(mups, dtype=np.float64),
+        lambda mups, h1, h2, h3, v1, v2, v3: _nb_conquest_bo5(mups, h1, h2, h3, v1, v2, v3),
+        lambda mups, hero_decks, villain_decks: _nb_ban_list_bo5(mups, _decks(hero_decks), _decks(villain_decks)),
+        _numba_solve,
+        _numba_solve_to_tolerance,
+        lambda mups, h_decks, h_size, v_decks, v_size: _nb_lhs_first_pick(mups, _decks(h_decks[:h_size]), _decks(v_decks[:v_size])),
+    )
+else:
+    NUMBA = None
+
+# Compares a backend against the Python reference on random matchups, returns a list of mismatches (empty if equivalent)
+def check_equivalence(kernels, trials=20, seed=0, num_decks=10, tolerance=1e-12):
+    rng = random.Random(seed)
+    mismatches = []
+
+    def compare(name, got, expected):
+        got, expected = np.asarray(got, dtype=float), np.asarray(expected, dtype=float)
+        if got.shape != expected.shape or not np.allclose(got, expected, rtol=0, atol=tolerance):
+            mismatches.append(f"{name}: {got.tolist()} != {expected.tolist()}")
+
+    for _ in range(trials):
+        mups = [[rng.uniform(0.2, 0.8) for _ in range(num_decks)] for _ in range(num_decks)]
+        prepared = kernels.prepare(mups)
+        hero, villain = rng.sample(range(num_decks), 4), rng.sample(range(num_decks), 4)
+
+        compare("conquest_bo5", kernels.conquest_bo5(prepared, *hero[:3], *villain[:3]),
+                se.conquest_bo5(mups, *hero[:3], *villain[:3]))
+        banlist = se.banList_bo5(mups, hero, villain)
+        compare("ban_list_bo5", kernels.ban_list_bo5(prepared, hero, villain), banlist)
+        for name, got, expected in (
+            ("solve", kernels.solve(banlist), gt.solve(banlist)),
+            ("solve_to_tolerance", kernels.solve_to_tolerance(banlist, 0.002), gt.solve_to_tolerance(banlist, 0.002)),
+        ):
+            for part, (a, b) in enumerate(zip(got, expected)):
+                compare(f"{name}[{part}]", a, b)
+        compare("lhs_first_pick", kernels.lhs_first_pick(prepared, hero[:3], 3, villain[:3], 3),
+                se.lhs_first_pick(mups, hero[:3], 3, villain[:3], 3))
+    return mismatches
+
+# Picks the kernel backend: "python", "numba" or "auto" (numba when installed)
+# The numba kernels are checked against the Python ones once in the main process, any mismatch falls back to Python
+def get_kernels(backend="auto"):
+    if backend not in ("auto", "python", "numba"):
+        raise ValueError(f"Unknown kernel backend {backend}, use auto, python or numba")
+    if backend == "python" or (backend == "auto" and NUMBA is None):
+        return PYTHON
+    if NUMBA is None:
+        raise ImportError("The numba kernel backend needs numba installed (pip install numba)")
+    if parent_process() is None:
+        mismatches = check_equivalence(NUMBA)
+        if mismatches:
+            warnings.warn(f"Numba kernels don't match the reference, using Python: {mismatches[0]}")
+            return PYTHON
+    return NUMBA
+
+# python -m analysis.kernels: checks the available backends and times them against each other
+if __name__ == "__main__":
+    import time
+    backends = [PYTHON] + ([NUMBA] if NUMBA else [])
+    for kernels in backends:
+        mismatches = check_equivalence(kernels)
+        print(f"{kernels.name}: {'equivalent' if not mismatches else mismatches[0]}")
+        mups = kernels.prepare([[0.5] * 10 for _ in range(10)])
+        banlist = kernels.ban_list_bo5(mups, [0, 1, 2, 3], [4, 5, 6, 7])
+        kernels.solve(banlist)
+        start = time.perf_counter()
+        for _ in range(200):
+            kernels.solve(kernels.ban_list_bo5(mups, [0, 1, 2, 3], [4, 5, 6, 7]))
+        print(f"{kernels.name}: {(time.perf_counter() - start) / 200 * 1e3:.3f} ms per ban phase")
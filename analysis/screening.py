@@ -0,0 +1,61 @@
+import json
+import math
+import os
+import time
+import numpy as np
+
+# Calibrated runs kept in the calibration file, the oldest are dropped
+CALIBRATION_RUNS = 50
+
+# Cheap score of every lineup: the average matchup of its decks against the field's decks, without the ban phase
+# deck_share[d] is the share of the field's decks that are deck d (each field lineup counts its weight once per deck)
+def proxy_scores(matchups, lineup_decks, opponents):
+    matchups = np.asarray(matchups, dtype=float)
+    deck_share = np.zeros(len(matchups))
+    for villain_decks, weight in opponents:
+        deck_share[villain_decks] += weight
+    deck_share /= deck_share.sum()
+    return (matchups @ deck_share)[np.asarray(lineup_decks)].mean(axis=1)
+
+# Ranks from 1 (highest value), ties in order
+def ranks(values):
+    order = np.argsort(-np.asarray(values), kind="stable")
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(1, len(order) + 1)
+    return rank
+
+# How well the proxy ranks the lineups it was compared on:
+#   spearman    rank correlation of proxy and exact win rates
+#   depth       deepest proxy rank of the exact best `top` lineups, as a share of the lineups
+#   recall      share of the exact best `top` lineups that are also in the proxy's best `top`
+def agreement(proxy, exact, top):
+    proxy_rank, exact_rank = ranks(proxy), ranks(exact)
+    top = min(top, len(exact))
+    best = exact_rank <= top
+    spearman = np.corrcoef(proxy_rank, exact_rank)[0, 1] if len(exact) > 1 else 1.0
+    return {
+        "lineups": len(exact),
+        "top": top,
+        "spearman": float(spearman),
+        "depth": float(proxy_rank[best].max() / len(exact)),
+        "recall": float((proxy_rank[best] <= top).mean()),
+    }
+
+def load_calibration(path):
+    if not path or not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)["runs"]
+
+def save_calibration(path, runs, run):
+    runs = (runs + [dict(run, time=time.strftime("%Y-%m-%d %H:%M:%S"))])[-CALIBRATION_RUNS:]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"runs": runs}, f, indent=1)
+
+# Number of lineups to calculate exactly, M: the deepest proxy rank any calibrated run with at least `top` best lineups
+# needed, times margin. Without calibrated runs, default_share of the lineups. Never fewer than top.
+def candidate_count(num_lineups, runs, top, margin, default_share):
+    depths = [run["depth"] for run in runs if run["top"] >= top]
+    share = max(depths) * margin if depths else default_share
+    return min(num_lineups, max(top, math.ceil(share * num_lineups)))
@@ -0,0 +1,85 @@
+import numpy as np
+from .series import conquest_bo5
+from .gt_solver import solve_batch
+
+# Complex step for the derivatives of conquest_bo5: f(x + ih).imag / h is the exact derivative of a real formula
+# (no cancellation like finite differences), conquest_bo5 only adds, subtracts, multiplies and divides by constants
+STEP = 1e-20
+
+# Decks left in each triple after banning deck i
+KEEP = [[k for k in range(4) if k != ban] for ban in range(4)]
+
+# Lets conquest_bo5 run on arrays of deck ids, mups[h][v] becomes matrix[h, v]
+# With a slot (hero array, villain array) the cell read through exactly those arrays gets the complex step added,
+# so every element of the arrays is differentiated with respect to its own cell
+class _Cells:
+    def __init__(self, matrix, hero=None, villain=None):
+        self.matrix = matrix
+        self.hero = hero
+        self.villain = villain
+        self.cache = {}
+
+    def __getitem__(self, h):
+        return _CellsRow(self, h)
+
+class _CellsRow:
+    def __init__(self, cells, h):
+        self.cells = cells
+        self.h = h
+
+    def __getitem__(self, v):
+        key = (id(self.h), id(v))
+        if key not in self.cells.cache:
+            value = self.cells.matrix[self.h, v]
+            if self.h is self.cells.hero and v is self.cells.villain:
+                value = value + 1j * STEP
+            self.cells.cache[key] = value
+        return self.cells.cache[key]
+
+# Derivative of each lineup's field win rate with respect to every matchup, in one vectorized pass
+# By the envelope theorem the derivative of a ban phase's value with respect to its payoff B[i][j] is x[i] * y[j],
+# with x and y the equilibrium ban strategies from solve, so nothing is solved again per matchup
+#   matchups: normalized (0-1) matchup matrix, lineups: deck ids (K, 4), field: deck ids (F, 4),
+#   weights: share of the field of each opponent (F,), summing to 1
+# Returns sens (K, n, n): change of lineup k's win rate per unit of m[a][b], with the mirrored m[b][a] = 1 - m[a][b]
+# moving the other way, so sens[k, a, b] = -sens[k, b, a]. Multiply by a change to get its first order effect
+def matchup_sensitivity(matchups, lineups, field, weights, iterations=1000):
+    matchups = np.asarray(matchups, dtype=float)
+    lineups, field = np.asarray(lineups), np.asarray(field)
+    weights = np.asarray(weights, dtype=float)
+    num_lineups, num_opponents, n = len(lineups), len(field), len(matchups)
+
+    # Ban matrices banlists[k, o, i, j]: lineup k without deck i against opponent o without deck j
+    shape = (num_lineups, num_opponents, 4, 4)
+    hero = lineups[:, KEEP][:, None, :, None, :]
+    villain = field[:, KEEP][None, :, None, :, :]
+    h = [np.broadcast_to(hero[..., p], shape) for p in range(3)]
+    v = [np.broadcast_to(villain[..., q], shape) for q in range(3)]
+    banlists = conquest_bo5(_Cells(matchups), *h, *v)
+
+    rowcnt, colcnt, _ = solve_batch(banlists.reshape(-1, 4, 4), iterations)
+    x = rowcnt.reshape(num_lineups, num_opponents, 4) / iterations
+    y = colcnt.reshape(num_lineups, num_opponents, 4) / iterations
+    value_by_payoff = weights[None, :, None, None] * x[..., :, None] * y[..., None, :]
+
+    sens = np.zeros((num_lineups, n, n))
+    lineup_index = np.broadcast_to(np.arange(num_lineups)[:, None, None, None], shape)
+    for p in range(3):
+        for q in range(3):
+            payoff_by_cell = conquest_bo5(_Cells(matchups, h[p], v[q]), *h, *v).imag / STEP
+            np.add.at(sens, (lineup_index, h[p], v[q]), value_by_payoff * payoff_by_cell)
+    return sens - sens.transpose(0, 2, 1)
+
+# The matchups one lineup depends on the most, as (deck, opponent, derivative) sorted by size, skipping unused ones
+# Each matchup shows up once, seen from the lineup's side when one of its decks is in it
+def top_matchups(sens, lineup, count=20):
+    upper = np.triu_indices(len(sens), 1)
+    order = np.argsort(-np.abs(sens[upper]), kind="stable")[:count]
+    matchups = []
+    for a, b in zip(upper[0][order], upper[1][order]):
+        if sens[a, b] == 0:
+            break
+        if b in lineup and a not in lineup:
+            a, b = b, a
+        matchups.append((int(a), int(b), float(sens[a, b])))
+    return matchups
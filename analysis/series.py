@@ -1,4 +1,5 @@
 from .gt_solver import solve
+from .conquest import conquest_kernel
 
 # Calculates chances of winning bo3 match after ban
 def conquest_bo3 (mups, h1, h2, v1, v2):
@@ -366,11 +367,11 @@ def conquest_recursive(mups, h_decks, v_decks):
             new_h_decks.remove(h_deck)
             winning_chance += deck_win * conquest_recursive(mups, new_h_decks, v_decks)
 
-      # Chance of winning with each villain deck
+      # Chance of winning with each villain deck, 1 - mups[h][v] like the other conquest formulas
       for v_deck in v_decks:
             deck_win = 0
             for h_deck in h_decks:
-                  deck_win += mups[v_deck][h_deck]
+                  deck_win += 1 - mups[h_deck][v_deck]
             deck_win = deck_win / total
             new_v_decks = v_decks.copy()
             new_v_decks.remove(v_deck)
@@ -379,13 +380,15 @@ def conquest_recursive(mups, h_decks, v_decks):
       return winning_chance
 
 # Calculates chances of winning for each ban option on bo7 format
+# Uses the generated 4 deck conquest kernel, conquest_recursive gives the same results much slower
 def banList_bo7 (mups, hero_decks, villain_decks):
+    conquest_bo7 = conquest_kernel(4)
     final = [[] for _ in range(5)]
 
     for i in range(5):
         h_subset = hero_decks[:i] + hero_decks[i+1:]
         for j in range(5):
             v_subset = villain_decks[:j] + villain_decks[j+1:]
-            final[i].append(conquest_recursive(mups, *h_subset, *v_subset))
+            final[i].append(conquest_bo7(mups, *h_subset, *v_subset))
 
     return final
@@ -0,0 +1,306 @@
+"""
+Offline benchmarks for the series math, the ban phase solver, field generation,
+the lineup pipeline and the CLI result writers.
+
+Matchups, field and archetypes are synthetic (seeded), so it runs on any
+machine without HSReplay access. Results are written as JSON and can be
+compared against a stored baseline to catch regressions:
+
+    python benchmark.py                                  # data/benchmark.json
+    python benchmark.py --save-baseline                  # data/benchmark_baseline.json
+    python benchmark.py --compare data/benchmark_baseline.json
+
+Compare exits with status 1 when a benchmark got slower (or used more memory)
+than the baseline by more than --threshold. Baselines are only meaningful
+on the machine they were recorded on.
+"""
+import argparse
+import csv
+import gc
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random as rd
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import analysis.series as se
+from analysis.conquest import conquest_kernel
+from result_format import BinaryResultWriter
+from write_results import ResultWriter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "web", "backend"))
+from app.calculator import ban_list_bo5, calculate_lineups, conquest_bo5, generate_field, solve  # noqa: E402
+from app.precompute import Precomputed  # noqa: E402
+
+CLASSES = ["DEATHKNIGHT", "DEMONHUNTER", "DRUID", "HUNTER", "MAGE", "PALADIN",
+           "PRIEST", "ROGUE", "SHAMAN", "WARLOCK", "WARRIOR"]
+OUTPUT_PATH = "data/benchmark.json"
+BASELINE_PATH = "data/benchmark_baseline.json"
+
+
+def synthetic_data(num_decks, num_classes, seed):
+    """Random matchups, deck frequencies and archetypes shaped like request_all_data's output."""
+    rng = np.random.default_rng(seed)
+    classes = [CLASSES[i % num_classes] for i in range(num_decks)]
+    archetypes = pd.DataFrame({
+        "id": range(num_decks),
+        "name": [f"Deck {i} {c.title()}" for i, c in enumerate(classes)],
+        "player_class_name": classes,
+    }).sort_values(["player_class_name", "name"]).reset_index(drop=True)
+    names = archetypes["name"].tolist()
+
+    # Win rates in percent, m[i][j] + m[j][i] = 100
+    upper = np.triu(rng.uniform(30, 70, (num_decks, num_decks)).round(2), 1)
+    values = upper + np.tril(100 - upper.T, -1) + np.eye(num_decks) * 50
+    matchups = pd.DataFrame(values, index=names, columns=names)
+
+    # Frequencies sum to 400 like HSReplay data (about 400 lineups in the field)
+    weights = rng.dirichlet(np.ones(num_decks))
+    deck_pct = pd.Series(weights * 400, index=names).sort_values(ascending=False)
+
+    by_class = archetypes.groupby("player_class_name")["name"].apply(list).to_dict()
+    lineups = []
+    for combo in itertools.combinations(by_class.keys(), 4):
+        for lineup in itertools.product(*(by_class[c] for c in combo)):
+            lineups.append(list(lineup))
+    return matchups, deck_pct, archetypes, lineups
+
+
+def result_rows(lineups, num_rows, seed):
+    """Output rows (4 deck names and a win rate string, as merged from the chunks) cycling over the lineups."""
+    rng = rd.Random(seed)
+    return [lineups[i % len(lineups)] + [repr(rng.random())] for i in range(num_rows)]
+
+
+def write_csv(rows, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        for row in rows:
+            writer.writerow(row)
+
+
+def write_binary(rows, path, deck_names):
+    binary = BinaryResultWriter(path, deck_names, len(rows))
+    for row in rows:
+        binary.append(row)
+    binary.close()
+
+
+def write_results(rows, folder, deck_names, binary):
+    """The CLI output path: chunks sorted on add, merged to the CSV (and the binary copy) on finish."""
+    writer = ResultWriter(os.path.join(folder, "output.csv"), top_k=None, deck_names=deck_names,
+                          binary_path=os.path.join(folder, "output_npy") if binary else None)
+    for row in rows:
+        writer.add(row)
+    writer.finish()
+
+
+def time_calls(func, number, repeat):
+    """Seconds per call of `number` calls of func, for each of `repeat` runs."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return times
+
+
+def time_pool_calls(func, number, repeat, conn):
+    """Runs in a forked process: sends the timings and the largest RSS of the pool workers it started."""
+    times = time_calls(func, number, repeat)
+    # ru_maxrss is in KiB on Linux
+    conn.send((times, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024))
+    conn.close()
+
+
+def measure(func, number=1, repeat=3, pool=False):
+    """
+    Time `number` calls of func, `repeat` times.
+
+    Memory is the peak allocated by this process, from one more traced call.
+    Pool workers would inherit the tracing and crawl, so functions using a
+    pool run in their own forked process instead and memory is the largest
+    RSS of that run's workers. RUSAGE_CHILDREN only ever grows, so measured
+    here it would report the peak of an earlier pool benchmark.
+    """
+    if pool:
+        context = multiprocessing.get_context("fork")
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=time_pool_calls, args=(func, number, repeat, sender))
+        process.start()
+        sender.close()
+        try:
+            times, peak = receiver.recv()
+        except EOFError:
+            times = None
+        process.join()
+        if times is None:
+            raise RuntimeError(f"benchmark process exited with code {process.exitcode}")
+    else:
+        times = time_calls(func, number, repeat)
+        gc.collect()
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "seconds": statistics.median(times),
+        "min_seconds": min(times),
+        "mean_seconds": statistics.mean(times),
+        "calls": number * repeat,
+        "peak_memory_bytes": peak,
+        "memory": "worker_rss" if pool else "traced",
+    }
+
+
+def run(args):
+    matchups, deck_pct, archetypes, lineups = synthetic_data(args.decks, args.classes, args.seed)
+    mups = (matchups / 100).values.tolist()
+    index = {name: i for i, name in enumerate(archetypes["name"])}
+    rng = rd.Random(args.seed)
+    hero, villain = ([index[d] for d in rng.choice(lineups)] for _ in range(2))
+    banlist = ban_list_bo5(mups, hero, villain)
+
+    rd.seed(args.seed)
+    field = generate_field(deck_pct, lineups, num_iterations=args.field_iterations)
+    subset = lineups[:args.lineups]
+    print(f"{len(archetypes)} decks, {len(lineups)} lineups, field of {len(field)} lineups, "
+          f"pipeline on {len(subset)} lineups", file=sys.stderr)
+
+    benchmarks = {
+        "conquest_bo5": (lambda: conquest_bo5(mups, *hero[:3], *villain[:3]), 2000, args.repeat, False),
+        "conquest_generated[3]": (lambda: conquest_kernel(3)(mups, *hero[:3], *villain[:3]), 2000, args.repeat, False),
+        "conquest_generated[4]": (lambda: conquest_kernel(4)(mups, *hero, *villain), 200, args.repeat, False),
+        "ban_list_bo5": (lambda: ban_list_bo5(mups, hero, villain), 200, args.repeat, False),
+        "solve": (lambda: solve(banlist), 50, args.repeat, False),
+        "lhs_first_pick": (lambda: se.lhs_first_pick(mups, hero, 4, villain, 4), 20, args.repeat, False),
+        "generate_field": (
+            lambda: generate_field(deck_pct, lineups, num_iterations=args.field_iterations), 1, 1, False
+        ),
+        "precompute": (lambda: Precomputed(matchups, archetypes), 1, args.repeat, False),
+    }
+    rows = result_rows(lineups, args.result_rows, args.seed)
+    deck_names = archetypes["name"].tolist()
+    folder = tempfile.mkdtemp(prefix="benchmark_")
+    benchmarks.update({
+        "write_csv_rows": (lambda: write_csv(rows, os.path.join(folder, "rows.csv")), 1, args.repeat, False),
+        "write_binary_rows": (lambda: write_binary(rows, os.path.join(folder, "rows_npy"), deck_names), 1, args.repeat, False),
+        "result_writer[csv]": (lambda: write_results(rows, folder, deck_names, False), 1, args.repeat, False),
+        "result_writer[csv+binary]": (lambda: write_results(rows, folder, deck_names, True), 1, args.repeat, False),
+    })
+    precomputed = Precomputed(matchups, archetypes)
+    for workers in args.workers:
+        benchmarks[f"calculate_lineups[workers={workers}]"] = (
+            lambda w=workers: calculate_lineups(matchups, field, subset, archetypes, max_workers=w), 1, 1, True
+        )
+        benchmarks[f"calculate_lineups_precomputed[workers={workers}]"] = (
+            lambda w=workers: calculate_lineups(
+                matchups, field, lineups, archetypes, max_workers=w, precomputed=precomputed
+            ), 1, args.repeat, True
+        )
+
+    results = {}
+    for name, (func, number, repeat, pool) in benchmarks.items():
+        if args.only and not any(pattern in name for pattern in args.only):
+            continue
+        print(f"Running {name}...", file=sys.stderr)
+        results[name] = measure(func, number, repeat, pool)
+    shutil.rmtree(folder, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "decks": len(archetypes),
+            "lineups": len(lineups),
+            "field_lineups": len(field),
+            "pipeline_lineups": len(subset),
+            "params": {k: getattr(args, k) for k in ("decks", "classes", "seed", "workers", "lineups", "field_iterations",
+                                                     "repeat", "result_rows")},
+            "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline, threshold):
+    """Print current vs baseline ratios, returns the names of regressed benchmarks."""
+    regressions = []
+    if baseline["meta"].get("params") != report["meta"].get("params"):
+        print("Warning: baseline was recorded with different parameters", file=sys.stderr)
+    print(f"{'benchmark':<44} {'seconds':>12} {'baseline':>12} {'time':>7} {'memory':>7}")
+    for name, result in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<44} {result['seconds']:>12.6f} {'-':>12}")
+            continue
+        time_ratio = result["seconds"] / base["seconds"]
+        memory_ratio = result["peak_memory_bytes"] / max(base["peak_memory_bytes"], 1)
+        flag = ""
+        if time_ratio > threshold or memory_ratio > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<44} {result['seconds']:>12.6f} {base['seconds']:>12.6f} "
+              f"{time_ratio:>6.2f}x {memory_ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the lineup calculator.")
+    parser.add_argument("--decks", type=int, default=12, help="number of synthetic decks")
+    parser.add_argument("--classes", type=int, default=6, help="number of classes the decks are spread over")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="pool sizes for calculate_lineups")
+    parser.add_argument("--lineups", type=int, default=24,
+                        help="lineups in the unprecomputed calculate_lineups run (the precomputed run uses all)")
+    parser.add_argument("--field-iterations", type=int, default=500, help="generate_field iterations")
+    parser.add_argument("--result-rows", type=int, default=300_000, help="rows written by the result writer benchmarks")
+    parser.add_argument("--repeat", type=int, default=3, help="timed repeats of the fast benchmarks")
+    parser.add_argument("--only", nargs="+", help="only run benchmarks whose name contains one of these")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help=f"also save the results to {BASELINE_PATH}")
+    parser.add_argument("--compare", metavar="BASELINE", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    if args.classes < 4 or args.classes > len(CLASSES) or args.decks < args.classes:
+        parser.error(f"need 4 to {len(CLASSES)} classes and at least one deck per class")
+
+    report = run(args)
+    for path in [args.output] + ([BASELINE_PATH] if args.save_baseline else []):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {path}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+    else:
+        for name, result in report["results"].items():
+            print(f"{name:<44} {result['seconds']:>12.6f} s  {result['peak_memory_bytes'] / 2**20:>8.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
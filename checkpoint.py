@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import pandas as pd
+from configuration import CHECKPOINT_PATH, CHECKPOINT_INTERVAL, RANDOM_TARGET, NUM_ITERACTIONS, SOLVER_TOLERANCE
+
+# Hash of every input that changes the results, used to only resume runs with the same data
+def fingerprint(matchups, deck_pct, lineups):
+    digest = hashlib.sha256()
+    digest.update(matchups.to_csv().encode())
+    digest.update(deck_pct.sort_index().to_csv().encode())
+    digest.update(json.dumps(lineups).encode())
+    digest.update(f"{RANDOM_TARGET},{NUM_ITERACTIONS},{SOLVER_TOLERANCE}".encode())
+    return digest.hexdigest()
+
+# A crash can leave half a record at the end of the file, that lineup simply gets calculated again
+def drop_torn_line(path):
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+# Checkpoints of other inputs can't be resumed by this run and the data they were made from has moved on,
+# only directories with a fingerprint file are checkpoints
+def remove_stale(path, keep):
+    for name in os.listdir(path):
+        directory = os.path.join(path, name)
+        if name != keep and os.path.isfile(os.path.join(directory, "fingerprint")):
+            shutil.rmtree(directory, ignore_errors=True)
+
+# Keeps the generated field and the finished lineup ids with their values on disk
+# Finished lineups are appended to done.csv and synced every CHECKPOINT_INTERVAL seconds
+# Starting a checkpoint removes the ones left by interrupted runs of other inputs
+class Checkpoint:
+    def __init__(self, fp, path=CHECKPOINT_PATH, interval=CHECKPOINT_INTERVAL):
+        self.dir = os.path.join(path, fp[:16])
+        self.interval = interval
+        self.field_path = os.path.join(self.dir, "field.csv")
+        self.done_path = os.path.join(self.dir, "done.csv")
+        self.last_sync = time.monotonic()
+        os.makedirs(self.dir, exist_ok=True)
+        remove_stale(path, fp[:16])
+        with open(os.path.join(self.dir, "fingerprint"), "w") as f:
+            f.write(fp)
+        drop_torn_line(self.done_path)
+        self.done_file = open(self.done_path, "a")
+
+    def load_field(self):
+        if not os.path.exists(self.field_path):
+            return None
+        return pd.read_csv(self.field_path, header=None)
+
+    def save_field(self, field):
+        tmp_path = f"{self.field_path}.tmp"
+        field.to_csv(tmp_path, index=False, header=False)
+        os.replace(tmp_path, self.field_path)
+
+    # Yields (lineup_id, values) of every lineup finished by previous runs
+    def completed(self):
+        with open(self.done_path) as f:
+            for line in f:
+                lineup_id, *values = line.split(",")
+                yield int(lineup_id), [float(value) for value in values]
+
+    # Values are the win rate, and its error when solving to a tolerance
+    def record(self, lineup_id, *values):
+        self.done_file.write(",".join([str(lineup_id)] + [repr(value) for value in values]) + "\n")
+        if time.monotonic() - self.last_sync >= self.interval:
+            self.sync()
+
+    def sync(self):
+        self.done_file.flush()
+        os.fsync(self.done_file.fileno())
+        self.last_sync = time.monotonic()
+
+    # Called once the results are safely written, nothing left to resume
+    def clear(self):
+        self.done_file.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
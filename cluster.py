@@ -0,0 +1,295 @@
+from main import kernels, lineup_value
+from tqdm import tqdm
+from multiprocessing import Pool
+from multiprocessing.connection import Client, Listener
+from request_data import request_all_data
+from create_field import generate_field, read_opponents
+from loguru import logger
+from write_results import ResultWriter
+from configuration import OUTPUT_PATH, BINARY_OUTPUT_PATH, TOP_K, SOLVER_TOLERANCE, OPPONENTS_PATH
+from configuration import CLUSTER_HOST, CLUSTER_PORT, CLUSTER_AUTHKEY, CLUSTER_SHARD_SIZE, CLUSTER_TIMEOUT, CLUSTER_HEARTBEAT
+from collections import deque
+import argparse
+import heapq
+import ipaddress
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+
+# Spreads one calculation over several hosts. The coordinator requests the data, generates the field and splits the
+# lineup ids in shards; each worker runs a Pool on its own host. Messages are pickled tuples over an authenticated
+# multiprocessing.connection socket:
+#   coordinator -> worker   ("setup", inputs)          once per worker: matchups, field, lineups, TOP_K, solver tolerance
+#                           ("shard", start, stop)      solve lineup ids start..stop-1
+#                           ("done",)                   no shards left
+#   worker -> coordinator   ("alive", solved)           every CLUSTER_HEARTBEAT seconds while solving
+#                           ("result", start, rows)     the best TOP_K (lineup id, values) of the shard
+# A worker that disconnects or stays silent for CLUSTER_TIMEOUT seconds loses its shard, which goes back to the front
+# of the queue. Once workers have connected, the coordinator gives up when none is left for CLUSTER_TIMEOUT seconds
+# (or right away when its --local workers all exited). It merges the partial top K results into the usual output.
+# On one machine, `python3 cluster.py coordinator --local 3` also starts 3 local workers standing in for hosts.
+# Unpickling runs code, so there is no default key and the coordinator only listens on loopback unless allowed otherwise.
+
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+# Shards of lineup ids waiting for a worker, in flight or done, and the number of workers connected
+class ShardQueue:
+    def __init__(self, num_lineups, shard_size):
+        self.pending = deque((start, min(start + shard_size, num_lineups)) for start in range(0, num_lineups, shard_size))
+        self.total = len(self.pending)
+        self.done = set()
+        self.condition = threading.Condition()
+        self.workers = 0
+        # Since when no worker is connected, None until the first one connects
+        self.idle_since = None
+
+    # Next shard, waiting while other workers may still give theirs back. None once every shard is done
+    def take(self):
+        with self.condition:
+            while not self.pending and len(self.done) < self.total:
+                self.condition.wait()
+            return self.pending.popleft() if self.pending else None
+
+    def requeue(self, shard):
+        with self.condition:
+            if shard not in self.done:
+                self.pending.appendleft(shard)
+                self.condition.notify_all()
+
+    # Marks a shard done, False if another worker already finished it
+    def finish(self, shard):
+        with self.condition:
+            if shard in self.done:
+                return False
+            self.done.add(shard)
+            self.condition.notify_all()
+            return True
+
+    # True once every shard is done, False if timeout seconds passed first
+    def wait(self, timeout=None):
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.done) >= self.total, timeout)
+
+    def connect(self):
+        with self.condition:
+            self.workers += 1
+            self.idle_since = None
+
+    def disconnect(self):
+        with self.condition:
+            self.workers -= 1
+            if not self.workers:
+                self.idle_since = time.monotonic()
+
+    # Seconds without any worker after at least one connected, 0 while workers are connected or none came yet
+    def idle(self):
+        with self.condition:
+            return time.monotonic() - self.idle_since if self.idle_since is not None else 0
+
+# Talks to one worker until the shards run out or the worker is lost
+def serve_worker(conn, address, setup, shards, on_result, timeout=CLUSTER_TIMEOUT):
+    shard = None
+    shards.connect()
+    try:
+        conn.send(("setup", setup))
+        while True:
+            shard = shards.take()
+            if shard is None:
+                conn.send(("done",))
+                return
+            conn.send(("shard",) + shard)
+            message = ("alive",)
+            while message[0] != "result":
+                if not conn.poll(timeout):
+                    raise TimeoutError(f"no message in {timeout} seconds")
+                message = conn.recv()
+            if shards.finish(shard):
+                on_result(shard, message[2])
+            shard = None
+    except (OSError, EOFError, TimeoutError) as error:
+        logger.warning(f"Lost worker {address}: {str(error) or 'connection closed'}")
+        if shard:
+            logger.warning(f"Requeuing lineups {shard[0]}-{shard[1] - 1}.")
+            shards.requeue(shard)
+    finally:
+        conn.close()
+        shards.disconnect()
+
+def accept_workers(listener, setup, shards, on_result, timeout):
+    while True:
+        try:
+            conn = listener.accept()
+        except OSError:
+            # Closed once every shard is done
+            return
+        except Exception as error:
+            logger.warning(f"Rejected a connection: {error}")
+            continue
+        logger.info(f"Worker {listener.last_accepted} connected.")
+        threading.Thread(target=serve_worker, args=(conn, listener.last_accepted, setup, shards, on_result, timeout),
+                         daemon=True).start()
+
+# Calculates the lineups (deck ids) against the field on the workers and writes the merged results
+def coordinate(matchups, lineups, deck_names, opponents, num_lines, host=CLUSTER_HOST, port=CLUSTER_PORT,
+               authkey=CLUSTER_AUTHKEY, shard_size=CLUSTER_SHARD_SIZE, timeout=CLUSTER_TIMEOUT, local_workers=0,
+               local_processes=None, allow_remote=False):
+    if not is_loopback(host) and not allow_remote:
+        raise ValueError(f"Listening on {host} accepts workers from other hosts, allow it explicitly (--allow-remote)")
+    if not authkey:
+        if not local_workers:
+            raise ValueError("The cluster needs a secret key, set HS_CLUSTER_KEY or --authkey")
+        # Only the local workers started below get this key
+        authkey = secrets.token_hex()
+    setup = {
+        "matchups": matchups, "lineups": lineups, "opponents": opponents, "num_lines": num_lines,
+        "top_k": TOP_K, "solver_tolerance": SOLVER_TOLERANCE,
+    }
+    shards = ShardQueue(len(lineups), shard_size)
+    writer = ResultWriter(OUTPUT_PATH, binary_path=BINARY_OUTPUT_PATH, deck_names=deck_names)
+    progress = tqdm(total=len(lineups), desc="Calculating the best lineups...")
+    lock = threading.Lock()
+
+    def on_result(shard, rows):
+        with lock:
+            for lineup_id, values in rows:
+                writer.add([deck_names[deck] for deck in lineups[lineup_id]] + values)
+            progress.update(shard[1] - shard[0])
+
+    listener = Listener((host, port), authkey=authkey.encode())
+    logger.info(f"Waiting for workers on {host}:{listener.address[1]}, {shards.total} shards of up to {shard_size} lineups.")
+    threading.Thread(target=accept_workers, args=(listener, setup, shards, on_result, timeout), daemon=True).start()
+    workers = [start_local_worker(listener.address[1], authkey, local_processes) for _ in range(local_workers)]
+    try:
+        while not shards.wait(1):
+            if shards.idle() >= timeout:
+                raise RuntimeError(f"No worker left for {timeout} seconds, {shards.total - len(shards.done)} shards unsolved")
+            if workers and not shards.workers and all(worker.poll() is not None for worker in workers):
+                raise RuntimeError(f"The local workers exited, {shards.total - len(shards.done)} shards unsolved")
+    except RuntimeError as error:
+        logger.error(f"{error}, giving up.")
+        raise
+    finally:
+        listener.close()
+        progress.close()
+        for worker in workers:
+            try:
+                worker.wait(timeout)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+    logger.info("Merging sorted results...")
+    return writer.finish()
+
+def start_local_worker(port, authkey, processes=None):
+    command = [sys.executable, os.path.abspath(__file__), "worker", "--host", "127.0.0.1", "--port", str(port)]
+    if processes:
+        command += ["--processes", str(processes)]
+    return subprocess.Popen(command, env={**os.environ, "HS_CLUSTER_KEY": authkey})
+
+# Constant inputs of the worker's calculation, set in each Pool process
+_cluster = None
+
+def init_cluster_worker(setup):
+    global _cluster
+    _cluster = (kernels.prepare(setup["matchups"]), setup["lineups"], setup["opponents"], setup["num_lines"])
+
+def solve_cluster_line(lineup_id):
+    mups_list, lineups, opponents, num_lines = _cluster
+    value_line, error_line = lineup_value(mups_list, lineups[lineup_id], opponents)
+    values = [value_line/num_lines]
+    if SOLVER_TOLERANCE is not None:
+        values.append(error_line/num_lines)
+    return lineup_id, values
+
+def connect(host, port, authkey, timeout=CLUSTER_TIMEOUT):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return Client((host, port), authkey=authkey.encode())
+        except ConnectionRefusedError:
+            if time.time() > deadline:
+                raise
+            time.sleep(1)
+
+# Solves the shards the coordinator sends until it has none left
+def work(host, port, authkey=CLUSTER_AUTHKEY, processes=None, heartbeat=CLUSTER_HEARTBEAT):
+    if not authkey:
+        raise ValueError("The cluster needs a secret key, set HS_CLUSTER_KEY or --authkey")
+    conn = connect(host, port, authkey)
+    logger.info(f"Connected to {host}:{port}.")
+    with conn:
+        _, setup = conn.recv()
+        if setup["solver_tolerance"] != SOLVER_TOLERANCE:
+            raise ValueError(f"The coordinator uses SOLVER_TOLERANCE = {setup['solver_tolerance']}, this worker {SOLVER_TOLERANCE}")
+        with Pool(processes, initializer=init_cluster_worker, initargs=(setup,)) as pool:
+            while True:
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    logger.warning("The coordinator closed the connection.")
+                    return
+                if message[0] == "done":
+                    break
+                _, start, stop = message
+                rows = []
+                last_sent = time.time()
+                for row in pool.imap_unordered(solve_cluster_line, range(start, stop), chunksize=8):
+                    rows.append(row)
+                    if time.time() - last_sent > heartbeat:
+                        conn.send(("alive", len(rows)))
+                        last_sent = time.time()
+                if setup["top_k"]:
+                    rows = heapq.nlargest(setup["top_k"], rows, key=lambda row: row[1][0])
+                conn.send(("result", start, rows))
+                logger.info(f"Solved lineups {start}-{stop - 1}.")
+    logger.success("No shards left.")
+
+def main(args):
+    matchups, lineups, deck_pct, arcs = request_all_data()
+    deck_names = arcs['name'].tolist()
+    deck_ids = {deck: index for index, deck in enumerate(deck_names)}
+    if args.opponents:
+        field = read_opponents(args.opponents, deck_names)
+        logger.info(f"Ranking lineups against {len(field)} known opponents.")
+    else:
+        field = generate_field(deck_pct, lineups)
+    opponents = [([deck_ids[deck] for deck in opp[:4]], opp[4]) for opp in field.values.tolist()]
+    lineups = [[deck_ids[deck] for deck in line] for line in lineups]
+    saved = coordinate((matchups / 100).values, lineups, deck_names, opponents, sum(field[4]), args.host, args.port,
+                       args.authkey, args.shard_size, args.timeout, args.local, args.processes, args.allow_remote)
+    logger.success(f"{saved} results saved to {OUTPUT_PATH}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculates the best lineups on several hosts.")
+    parser.add_argument("role", choices=("coordinator", "worker"))
+    parser.add_argument("--host", help=f"coordinator: address to listen on (default {CLUSTER_HOST}), worker: coordinator address")
+    parser.add_argument("--port", type=int, default=CLUSTER_PORT, help=f"default {CLUSTER_PORT}")
+    parser.add_argument("--authkey", default=CLUSTER_AUTHKEY, help="shared secret key (default HS_CLUSTER_KEY), required")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="coordinator: allow listening on an address other hosts can reach")
+    parser.add_argument("--processes", type=int, help="worker processes per worker (default one per core)")
+    parser.add_argument("--shard-size", type=int, default=CLUSTER_SHARD_SIZE, metavar="N",
+                        help=f"coordinator: lineups per shard (default {CLUSTER_SHARD_SIZE})")
+    parser.add_argument("--timeout", type=float, default=CLUSTER_TIMEOUT, metavar="SECONDS",
+                        help=f"coordinator: seconds of silence before a worker is considered dead (default {CLUSTER_TIMEOUT})")
+    parser.add_argument("--local", type=int, default=0, metavar="N",
+                        help="coordinator: also start N workers on this machine")
+    parser.add_argument("--opponents", default=OPPONENTS_PATH, metavar="FILE",
+                        help="coordinator: rank lineups against the opponent lineups of a csv instead of an artificial field")
+    args = parser.parse_args()
+    if not args.authkey and not (args.role == "coordinator" and args.local):
+        parser.error("the cluster needs a secret key, set HS_CLUSTER_KEY or --authkey")
+    if args.role == "coordinator" and args.host and not is_loopback(args.host) and not args.allow_remote:
+        parser.error(f"listening on {args.host} accepts workers from other hosts, add --allow-remote")
+    if args.role == "worker":
+        work(args.host or "127.0.0.1", args.port, args.authkey, args.processes)
+    else:
+        os.makedirs("data", exist_ok=True)
+        args.host = args.host or CLUSTER_HOST
+        main(args)
@@ -23,6 +23,95 @@ MATCHUPS_PATH = "data/matchups_example.csv"
 FIELD_PATH = "data/field_example.csv"
 OUTPUT_PATH = "data/output.csv"
 
+########## Output configurations ##########
+# Results are written to disk in sorted chunks of this many lineups and merged at the end.
+# Memory usage depends on this value, not on the number of lineups.
+RESULTS_CHUNK_SIZE = 10_000
+# Only keep the best TOP_K lineups in the output file. None keeps every lineup.
+TOP_K = None
+# Optional binary copy of the results (deck ids + win rates as .npy files and a deck name list).
+# It loads memory mapped with result_format.load_results, much faster than parsing the CSV.
+BINARY_OUTPUT_PATH = None  # e.g. "data/output_npy"
+
+########## Solver configurations ##########
+# None solves every ban phase with 1000 fictitious play iterations.
+# A tolerance (e.g. 0.002) stops each ban phase once the gap between its upper and lower value bounds is under it,
+# much faster at a small, known cost in precision. The output then gets an error column: the largest possible
+# difference between the reported win rate and the exact one.
+SOLVER_TOLERANCE = None
+# Implementation of the series and solver kernels: "python", "numba" (compiled, needs pip install numba)
+# or "auto" (numba when installed). Both give the same results; numba is checked against python at startup.
+# The HS_KERNELS environment variable overrides it.
+KERNEL_BACKEND = os.getenv("HS_KERNELS", "auto")
+
+########## Checkpoint configurations ##########
+# Finished lineups are saved here so an interrupted run with the same inputs resumes where it stopped.
+# The checkpoint is deleted once the results are written, and checkpoints of other inputs when a run starts.
+# None disables checkpoints.
+CHECKPOINT_PATH = "data/checkpoint"
+# Seconds between checkpoint syncs to disk.
+CHECKPOINT_INTERVAL = 30
+
+########## Profiling configurations ##########
+# Writes per-phase timings and cProfile profiles of the run to this folder (see profiling.py). None disables profiling.
+# Also enabled with the HS_PROFILE environment variable or `python3 main.py --profile [folder]`.
+PROFILE_PATH = os.getenv("HS_PROFILE") or None
+# Also profile inside the Pool workers (HS_PROFILE_WORKERS=1 or --profile-workers). cProfile slows the hot loop down.
+PROFILE_WORKERS = os.getenv("HS_PROFILE_WORKERS") == "1"
+
+########## Sensitivity configurations ##########
+# `python3 main.py --sensitivity [N]` writes the matchups the best N lineups' win rates depend on the most here.
+# Derivative: win rate points gained per point of the matchup (its mirror moving the other way).
+# Effect: first order change of the win rate if the matchup moved by SENSITIVITY_DELTA points.
+SENSITIVITY_PATH = "data/sensitivity.csv"
+SENSITIVITY_MATCHUPS = 20
+SENSITIVITY_DELTA = 1
+
+########## Known opponents ##########
+# A csv of opponent lineups (Deck 1-4 and an optional Probability column) replaces the artificial field,
+# every lineup is then ranked against those opponents. Also set with `python3 main.py --opponents FILE`.
+# Runs against known opponents don't use checkpoints.
+OPPONENTS_PATH = None  # e.g. "data/opponents_example.csv"
+
+########## Sweep configurations ##########
+# `python3 sweep.py` calculates every combination of these values (see sweep.py) and compares the results.
+# Each rank range, region and time range is requested once and shared by all MIN_GAMES cutoffs.
+SWEEP_LEAGUE_RANK_RANGES = [LEAGUE_RANK_RANGE]
+SWEEP_REGIONS = [REGION]
+SWEEP_TIME_RANGES = [TIME_RANGE]
+SWEEP_MIN_GAMES = [MIN_GAMES]
+# Folder of the results of each combination and the comparison report
+SWEEP_OUTPUT_PATH = "data/sweep"
+# Best lineups of each combination compared across all of them
+SWEEP_REPORT_TOP = 10
+
+########## Screening configurations ##########
+# `python3 main.py --screen` first scores every lineup with a cheap proxy (average matchup of its decks against the
+# field's decks, no ban phase) and only calculates the best M of them exactly (see analysis/screening.py).
+# Every full run against the artificial field (not --opponents) saves here how deep in the proxy ranking its best
+# SCREENING_TOP lineups were; M is the deepest calibrated depth times SCREENING_MARGIN. None disables calibration.
+SCREENING_CALIBRATION_PATH = "data/screening_calibration.json"
+SCREENING_TOP = 100
+SCREENING_MARGIN = 1.5
+# Share of the lineups calculated exactly until a full run has been calibrated.
+SCREENING_DEFAULT_SHARE = 0.25
+
+########## Cluster configurations ##########
+# `python3 cluster.py coordinator` hands the lineups out in shards of CLUSTER_SHARD_SIZE to workers on other hosts
+# started with `python3 cluster.py worker --host <coordinator>` (see cluster.py). Each shard sends back its best TOP_K lineups.
+# The coordinator only listens on this machine by default, listening on other interfaces needs `--allow-remote`.
+CLUSTER_HOST = "127.0.0.1"
+CLUSTER_PORT = 6000
+# Coordinator and workers authenticate each other with this secret key, set it in the HS_CLUSTER_KEY environment
+# variable (or --authkey) on every host. There is no default: messages are unpickled, so anyone with the key can run code
+# on the coordinator and the workers. `--local` runs without one generate a random key for their local workers.
+CLUSTER_AUTHKEY = os.getenv("HS_CLUSTER_KEY")
+CLUSTER_SHARD_SIZE = 2_000
+# A worker that sends nothing for this many seconds is considered dead and its shard goes to another worker.
+CLUSTER_TIMEOUT = 120
+# Seconds between the messages a worker sends while solving a shard, keep it well under CLUSTER_TIMEOUT.
+CLUSTER_HEARTBEAT = 10
+
 ########## Artificial field configurations ##########
 # Lower random target means artificial field will not be close to bell curve.
 # The more iteractions, the closer it should be to bell curve for a perfect field.
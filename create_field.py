@@ -58,3 +58,28 @@ def generate_field(deck_pct, lineups):
 
     df = pd.DataFrame(lineups_tmp)
     return df
+
+# Field of known opponents: a csv with one lineup per row (4 deck columns) and an optional probability column
+# Without probabilities every opponent is equally likely, lineups missing one share what the others leave of 1
+def read_opponents(path, decks):
+    opponents = pd.read_csv(path)
+    lineups = opponents.iloc[:, :4].values.tolist()
+    unknown = sorted({deck for line in lineups for deck in line} - set(decks))
+    if unknown:
+        raise ValueError(f"Unknown decks in {path}: {', '.join(unknown)}")
+    if any(len(set(line)) != 4 for line in lineups):
+        raise ValueError(f"Every lineup in {path} needs 4 different decks")
+
+    probability = opponents.iloc[:, 4].astype(float) if opponents.shape[1] > 4 else pd.Series(1.0, index=opponents.index)
+    missing = probability.isna()
+    if missing.all():
+        probability[:] = 1.0
+    elif missing.any():
+        rest = 1 - probability.sum()
+        if rest < 0:
+            raise ValueError(f"Probabilities in {path} add up to more than 1")
+        probability[missing] = rest / missing.sum()
+
+    df = pd.DataFrame(lineups)
+    df[4] = probability.values
+    return df[df[4] > 0].reset_index(drop=True)
@@ -1,51 +1,182 @@
-import pandas as pd
-import analysis.series as se
-import analysis.gt_solver as gt
+from analysis.kernels import get_kernels
+from analysis.sensitivity import matchup_sensitivity, top_matchups
+from analysis.screening import proxy_scores, agreement, load_calibration, save_calibration, candidate_count
 from tqdm import tqdm
 from multiprocessing import Pool
 from request_data import request_all_data
-from create_field import generate_field
+from create_field import generate_field, read_opponents
 from loguru import logger
-from configuration import OUTPUT_PATH
+from write_results import ResultWriter
+from checkpoint import Checkpoint, fingerprint
+from profiling import Profiler
+from configuration import OUTPUT_PATH, CHECKPOINT_PATH, BINARY_OUTPUT_PATH, PROFILE_PATH, PROFILE_WORKERS, SOLVER_TOLERANCE, KERNEL_BACKEND
+from configuration import SENSITIVITY_PATH, SENSITIVITY_MATCHUPS, SENSITIVITY_DELTA, OPPONENTS_PATH
+from configuration import SCREENING_CALIBRATION_PATH, SCREENING_TOP, SCREENING_MARGIN, SCREENING_DEFAULT_SHARE
+import argparse
+import csv
+import itertools
 import os
+import numpy as np
+
+# Module level so spawned workers pick the same backend (compiled kernels load from numba's disk cache)
+kernels = get_kernels(KERNEL_BACKEND)
 
 def get_index(arcs, deck):
     return arcs[arcs['name'] == deck].index[0]
 
-def solve_line(task):
-    mups_list, line, field_art, num_lines, reverse_translator = task
+# Weighted win rate of a lineup against (villain decks, weight) opponents, and its error bound with SOLVER_TOLERANCE
+def lineup_value(mups_list, hero_decks, opponents):
     value_line = 0
-    for _, opp in field_art.iterrows():
-        hero_decks = [reverse_translator[l] for l in line[:4]]
-        villain_decks = [reverse_translator[o] for o in opp[:4]]
-        banlist = se.banList_bo5(mups_list, hero_decks, villain_decks)
-        value_line += gt.solve(banlist)[2]*opp[4]
+    error_line = 0
+    for villain_decks, weight in opponents:
+        banlist = kernels.ban_list_bo5(mups_list, hero_decks, villain_decks)
+        if SOLVER_TOLERANCE is None:
+            value_line += kernels.solve(banlist)[2]*weight
+        else:
+            _, _, value, gap = kernels.solve_to_tolerance(banlist, SOLVER_TOLERANCE)
+            value_line += value*weight
+            error_line += gap/2*weight
+    return value_line, error_line
+
+def solve_line(task):
+    lineup_id, mups_list, line, field_art, num_lines, reverse_translator = task
+    hero_decks = [reverse_translator[l] for l in line[:4]]
+    opponents = (([reverse_translator[o] for o in opp[:4]], opp[4]) for _, opp in field_art.iterrows())
+    value_line, error_line = lineup_value(mups_list, hero_decks, opponents)
 
     line.append(value_line/num_lines)
-    return line
+    if SOLVER_TOLERANCE is not None:
+        line.append(error_line/num_lines)
+    return lineup_id, line
+
+# Writes the matchups the best lineups of the output depend on the most, see analysis/sensitivity.py
+def write_sensitivity(top, matchups, field, num_lines, reverse_translator, translator):
+    with open(OUTPUT_PATH, newline="") as f:
+        best = [row for row in itertools.islice(csv.reader(f), top)]
+    lineups = [[reverse_translator[deck] for deck in row[:4]] for row in best]
+    opponents = [[reverse_translator[deck] for deck in opp[:4]] for opp in field.values.tolist()]
+    weights = field[4].to_numpy(dtype=float) / num_lines
+    sens = matchup_sensitivity(matchups.values, lineups, opponents, weights)
+
+    with open(SENSITIVITY_PATH, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["Rank", "Deck 1", "Deck 2", "Deck 3", "Deck 4", "Win Rate", "Deck", "Opponent", "Derivative", f"Effect of +{SENSITIVITY_DELTA} points"])
+        for rank, (row, lineup, lineup_sens) in enumerate(zip(best, lineups, sens), 1):
+            for deck, opponent, derivative in top_matchups(lineup_sens, lineup, SENSITIVITY_MATCHUPS):
+                writer.writerow([rank] + row[:5] + [translator[deck], translator[opponent], f"{derivative:.6f}", f"{derivative * SENSITIVITY_DELTA:.4f}"])
+    logger.success(f"Matchup sensitivity of the best {len(best)} lineups saved to {SENSITIVITY_PATH}")
+
+# Logs how well the proxy ranked the calculated lineups. Full runs (against the artificial field, the only ones that
+# compute the proxy without screening) are saved as calibration for screening,
+# screened runs warn when the exact best lineups came from too close to the screening cut
+def report_screening(proxy, exact, screened):
+    calculated = ~np.isnan(exact)
+    report = agreement(proxy[calculated], exact[calculated], SCREENING_TOP)
+    logger.info(f"Proxy vs exact on {report['lineups']} lineups: rank correlation {report['spearman']:.3f}, "
+                f"{report['recall']:.0%} of the exact best {report['top']} in the proxy's best {report['top']}, "
+                f"the exact best {report['top']} within the proxy's best {report['depth']:.1%}.")
+    if not screened:
+        if SCREENING_CALIBRATION_PATH:
+            save_calibration(SCREENING_CALIBRATION_PATH, load_calibration(SCREENING_CALIBRATION_PATH), report)
+            logger.info(f"Screening calibration saved to {SCREENING_CALIBRATION_PATH}")
+    elif report["depth"] > 1 / SCREENING_MARGIN:
+        logger.warning(f"The exact best {report['top']} lineups reach {report['depth']:.0%} deep into the {report['lineups']} "
+                       "screened lineups, screening may have cut good lineups. A full run recalibrates it.")
+
+def main(profiler=None, sensitivity=None, opponents=None, screen=False):
+    profiler = profiler or Profiler()
+    logger.info(f"Using the {kernels.name} kernels.")
+    with profiler.phase("crawl"):
+        matchups, lineups, deck_pct, arcs = request_all_data()
+    # Checkpoints are keyed by the inputs of the artificial field, known opponents and screened runs are short anyway
+    checkpoint = Checkpoint(fingerprint(matchups, deck_pct, lineups)) if CHECKPOINT_PATH and not opponents and not screen else None
+
+    with profiler.phase("field"):
+        field = checkpoint.load_field() if checkpoint else None
+        if opponents:
+            field = read_opponents(opponents, arcs['name'].tolist())
+            logger.info(f"Ranking lineups against {len(field)} known opponents.")
+        elif field is None:
+            field = generate_field(deck_pct, lineups)
+            if checkpoint:
+                checkpoint.save_field(field)
+        else:
+            logger.info("Resuming from checkpoint with the saved field.")
 
-def main():
-    matchups, lineups, deck_pct, arcs = request_all_data()
-    field = generate_field(deck_pct, lineups)
     matchups = matchups / 100
-    matchups_list = matchups.values.tolist()
+    matchups_list = kernels.prepare(matchups.values)
 
-    results = []
+    writer = ResultWriter(OUTPUT_PATH, binary_path=BINARY_OUTPUT_PATH, deck_names=arcs['name'].tolist())
+
+    # Lineups finished by an interrupted run go straight to the results
+    done = bytearray(len(lineups))
+    exact = np.full(len(lineups), np.nan)
+    if checkpoint:
+        for lineup_id, values in checkpoint.completed():
+            done[lineup_id] = 1
+            exact[lineup_id] = values[0]
+            writer.add(lineups[lineup_id] + values)
+        if writer.count:
+            logger.info(f"Skipping {writer.count} lineups already calculated.")
 
     num_lines = sum(field[4])
 
     translator = arcs['name'].to_dict()
     reverse_translator = {deck:index for index, deck in translator.items()}
-    tasks = [(matchups_list, line, field, num_lines, reverse_translator) for line in lineups]
-    with Pool() as pool:
-        for r in tqdm(pool.imap_unordered(solve_line, tasks), total=len(tasks), desc="Calculating the best lineups..."):
-            results.append(r)
-    results_df = pd.DataFrame(results)
-    sorted_results = results_df.sort_values(by=[4],ascending=False)
-    breakpoint()
-    sorted_results.to_csv(OUTPUT_PATH,index=False,header=False)
-    logger.success(f"Results saved to {OUTPUT_PATH}")
+
+    # Cheap proxy of every lineup, screening only calculates the best M of them (see analysis/screening.py)
+    # Full runs against the artificial field calibrate it, rankings against known opponents are a different field
+    proxy = None
+    if screen or (SCREENING_CALIBRATION_PATH and not opponents):
+        lineup_decks = [[reverse_translator[deck] for deck in line[:4]] for line in lineups]
+        field_decks = [([reverse_translator[deck] for deck in opp[:4]], opp[4]) for opp in field.values.tolist()]
+        proxy = proxy_scores(matchups.values, lineup_decks, field_decks)
+    if screen:
+        count = candidate_count(len(lineups), load_calibration(SCREENING_CALIBRATION_PATH), SCREENING_TOP,
+                                SCREENING_MARGIN, SCREENING_DEFAULT_SHARE)
+        for lineup_id in np.argsort(-proxy, kind="stable")[count:]:
+            done[lineup_id] = 1
+        logger.info(f"Screening: calculating the best {count} of {len(lineups)} lineups by the proxy.")
+    tasks = ((lineup_id, matchups_list, line, field, num_lines, reverse_translator)
+             for lineup_id, line in enumerate(lineups) if not done[lineup_id])
+    with profiler.phase("solve"), Pool(**profiler.pool_options()) as pool:
+        for lineup_id, r in tqdm(pool.imap_unordered(solve_line, tasks), total=len(lineups) - sum(done), desc="Calculating the best lineups..."):
+            if checkpoint:
+                checkpoint.record(lineup_id, *r[4:])
+            exact[lineup_id] = r[4]
+            writer.add(r)
+        # Let the workers exit on their own, so they can write their profiles
+        pool.close()
+        pool.join()
+    logger.info("Merging sorted results...")
+    with profiler.phase("sort"):
+        writer.flush()
+    with profiler.phase("output"):
+        saved = writer.finish()
+    if proxy is not None:
+        report_screening(proxy, exact, screen)
+    if sensitivity:
+        with profiler.phase("sensitivity"):
+            write_sensitivity(sensitivity, matchups, field, num_lines, reverse_translator, translator)
+    if checkpoint:
+        checkpoint.clear()
+    profiler.finish()
+    logger.success(f"{saved} results saved to {OUTPUT_PATH}")
+    if BINARY_OUTPUT_PATH:
+        logger.success(f"Binary results saved to {BINARY_OUTPUT_PATH}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculates the win rate of every lineup against an artificial field.")
+    parser.add_argument("--profile", nargs="?", const="data/profile", default=PROFILE_PATH, metavar="FOLDER",
+                        help="profile the run and write the results to FOLDER (default data/profile)")
+    parser.add_argument("--profile-workers", action="store_true", default=PROFILE_WORKERS,
+                        help="also profile inside the Pool workers")
+    parser.add_argument("--sensitivity", nargs="?", type=int, const=10, metavar="N",
+                        help=f"also write the matchups the best N lineups depend on the most to {SENSITIVITY_PATH} (default 10)")
+    parser.add_argument("--opponents", default=OPPONENTS_PATH, metavar="FILE",
+                        help="rank lineups against the opponent lineups of a csv instead of an artificial field")
+    parser.add_argument("--screen", action="store_true",
+                        help="only calculate the lineups a cheap proxy ranks best, as many as the screening calibration needs")
+    args = parser.parse_args()
     os.makedirs("data", exist_ok=True)
-    main()
+    main(Profiler(args.profile, args.profile_workers), args.sensitivity, args.opponents, args.screen)
@@ -0,0 +1,96 @@
+import cProfile
+import glob
+import json
+import os
+import pstats
+import time
+from contextlib import contextmanager
+from multiprocessing import util
+from loguru import logger
+
+# Files of a previous run in the profile folder that would get mixed into this one
+STALE_FILES = ("phase_*.prof", "worker_*.prof", "worker_*.json")
+
+# Profiles pipeline phases of one run with cProfile and writes them to a folder:
+#   phase_<name>.prof   profile of each phase in the main process
+#   worker_<pid>.prof   profile of each Pool worker (only with workers=True)
+#   profile.prof        all of the above merged, for pstats/snakeviz
+#   profile.txt         top functions of the merged profile by cumulative time
+#   trace.json          phase and worker spans in Chrome trace format (chrome://tracing, Perfetto)
+# A disabled profiler (path None) only runs the phases.
+class Profiler:
+    def __init__(self, path=None, workers=False):
+        self.path = path
+        self.workers = workers
+        self.timings = {}
+        self.events = []
+        self.start = time.time()
+        if path:
+            os.makedirs(path, exist_ok=True)
+            for pattern in STALE_FILES:
+                for stale in glob.glob(os.path.join(path, pattern)):
+                    os.remove(stale)
+
+    @contextmanager
+    def phase(self, name):
+        if not self.path:
+            yield
+            return
+        profile = cProfile.Profile()
+        start = time.time()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            end = time.time()
+            profile.dump_stats(os.path.join(self.path, f"phase_{name}.prof"))
+            self.timings[name] = self.timings.get(name, 0) + end - start
+            self.events.append(trace_event(name, start - self.start, end - start, os.getpid()))
+
+    # Keyword arguments for Pool so each worker profiles itself until it exits.
+    # Workers only write their profile when they exit normally: close and join the pool.
+    def pool_options(self):
+        if not (self.path and self.workers):
+            return {}
+        return {"initializer": start_worker_profile, "initargs": (self.path, self.start)}
+
+    def finish(self):
+        if not self.path:
+            return
+        profiles = sorted(glob.glob(os.path.join(self.path, "phase_*.prof")))
+        workers = sorted(glob.glob(os.path.join(self.path, "worker_*.prof")))
+        for span in sorted(glob.glob(os.path.join(self.path, "worker_*.json"))):
+            with open(span) as f:
+                self.events.append(json.load(f))
+
+        if profiles or workers:
+            stats = pstats.Stats(*(profiles + workers))
+            stats.dump_stats(os.path.join(self.path, "profile.prof"))
+            with open(os.path.join(self.path, "profile.txt"), "w") as f:
+                stats.stream = f
+                stats.sort_stats("cumulative").print_stats(40)
+
+        with open(os.path.join(self.path, "trace.json"), "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+        for name, seconds in self.timings.items():
+            logger.info(f"Phase {name}: {seconds:.2f}s")
+        logger.success(f"Profile saved to {self.path} ({len(workers)} worker profiles)")
+
+def trace_event(name, start, duration, pid):
+    return {"name": name, "ph": "X", "ts": start * 1e6, "dur": duration * 1e6, "pid": pid, "tid": pid}
+
+# Pool initializer, the profile is dumped by multiprocessing's exit handlers when the worker exits
+def start_worker_profile(path, run_start):
+    profile = cProfile.Profile()
+    started = time.time()
+    profile.enable()
+    util.Finalize(None, dump_worker_profile, args=(profile, path, run_start, started), exitpriority=10)
+
+def dump_worker_profile(profile, path, run_start, started):
+    profile.disable()
+    pid = os.getpid()
+    profile.dump_stats(os.path.join(path, f"worker_{pid}.prof"))
+    with open(os.path.join(path, f"worker_{pid}.json"), "w") as f:
+        json.dump(trace_event("worker", started - run_start, time.time() - started, pid), f)
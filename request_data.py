@@ -15,13 +15,13 @@ DEFAULT_HEADERS = {
     'Accept-Language': 'en-US,en;q=0.9',
 }
 
-def request_matchup_stats():
+def request_matchup_stats(league_rank_range=LEAGUE_RANK_RANGE, region=REGION, time_range=TIME_RANGE):
     url = "https://hsreplay.net/analytics/query/head_to_head_archetype_matchups_v2/"
     querystring = {
         "GameType":GAME_TYPE,
-        "LeagueRankRange":LEAGUE_RANK_RANGE,
-        "Region":REGION,
-        "TimeRange":TIME_RANGE,
+        "LeagueRankRange":league_rank_range,
+        "Region":region,
+        "TimeRange":time_range,
     }
     headers = DEFAULT_HEADERS.copy()
     if COOKIES:
@@ -80,12 +80,16 @@ def get_user_input(archetypes):
     deck_pct = pd.read_csv(FIELD_PATH, index_col=0)['pct'].sort_values(ascending=False)
     return matchups, archetypes, deck_pct
 
-def request_all_data():
-    matchup_data = struct_to_dataframe(request_matchup_stats())
+# Archetypes of every class that can be in a lineup
+def request_archetype_table():
     archetypes = pd.DataFrame(request_archetypes())
     archetypes = archetypes[(archetypes['player_class_name'] != 'WHIZBANG') & (archetypes['player_class_name'] != 'NEUTRAL')]
-    archetypes = archetypes[["id", "name", "player_class_name"]]
-    
+    return archetypes[["id", "name", "player_class_name"]]
+
+# Win rates and number of games of every archetype pair for one rank range, region and time range
+def request_dataset(archetypes, league_rank_range=LEAGUE_RANK_RANGE, region=REGION, time_range=TIME_RANGE):
+    matchup_data = struct_to_dataframe(request_matchup_stats(league_rank_range, region, time_range))
+
     id_to_name = archetypes[['id', 'name']].set_index('id', drop=True).to_dict()['name']
     matchup_data = matchup_data.rename(mapper=id_to_name, axis=0)
     matchup_data = matchup_data.rename(mapper=id_to_name, axis=1)
@@ -95,8 +99,11 @@ def request_all_data():
         matchup_data[column] = matchup_data[column].apply(filter_field, field="win_rate")
     for column in total_games.columns:
         total_games[column] = total_games[column].apply(filter_field, field="total_games")
-    
-    archetypes = archetypes[archetypes['name'].isin(total_games.sum()[total_games.sum() > MIN_GAMES].index)]
+    return matchup_data, total_games
+
+# Keeps the decks with more than min_games games, returns their matchups, lineups, field frequencies and archetypes
+def select_decks(matchup_data, total_games, archetypes, min_games=MIN_GAMES):
+    archetypes = archetypes[archetypes['name'].isin(total_games.sum()[total_games.sum() > min_games].index)]
     archetypes = archetypes.sort_values(["player_class_name", "name"])
 
     ## Using input
@@ -109,12 +116,17 @@ def request_all_data():
         deck_pct = (total_games_refined / total_games_refined.sum() * 400).sort_values(ascending=False)
 
     archetypes = archetypes.reset_index(drop=True)
-    logger.info(f"Analyzing decks with minimum of {MIN_GAMES} games.")
+    logger.info(f"Analyzing decks with minimum of {min_games} games.")
     logger.info(f"Got {len(archetypes)} decks.")
     classes = get_class_archetypes(archetypes)
     lineups = possible_lineups(classes)
     logger.info(f"Got {len(lineups)} possible lineups.")
     return matchups, lineups, deck_pct, archetypes
+
+def request_all_data():
+    archetypes = request_archetype_table()
+    matchup_data, total_games = request_dataset(archetypes)
+    return select_decks(matchup_data, total_games, archetypes)
     
 ## DEBUG
 def main():
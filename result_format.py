@@ -0,0 +1,79 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
+
+# Binary results are a folder with:
+#   decks.npy     int16 (lineups x 4) deck ids, sorted by win rate
+#   win_rate.npy  float64 (lineups) win rates
+#   error.npy     float64 (lineups) error bounds, only when the rows have one (SOLVER_TOLERANCE)
+#   names.json    deck names, the position in the list is the deck id
+# The .npy files are loaded memory mapped, so slicing and filtering millions of rows doesn't parse any text
+
+# Rows are buffered and stored BLOCK_ROWS at a time as slices of the memory maps, each block's deck ids and
+# win rates are built as arrays at once instead of a scalar memmap store per cell
+BLOCK_ROWS = 8_192
+
+# Writes rows of [deck1, deck2, deck3, deck4, win_rate] or [..., win_rate, error] in the order they are given
+class BinaryResultWriter:
+    def __init__(self, path, deck_names, num_rows):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.index = {name: i for i, name in enumerate(deck_names)}
+        self.decks = open_memmap(os.path.join(path, "decks.npy"), mode="w+", dtype=np.int16, shape=(num_rows, 4))
+        self.win_rate = open_memmap(os.path.join(path, "win_rate.npy"), mode="w+", dtype=np.float64, shape=(num_rows,))
+        # Created with the first rows that carry an error, an error.npy of an earlier run would be stale
+        self.error = None
+        error_path = os.path.join(path, "error.npy")
+        if os.path.exists(error_path):
+            os.remove(error_path)
+        with open(os.path.join(path, "names.json"), "w") as f:
+            json.dump(list(deck_names), f)
+        self.rows = []
+        self.size = 0
+
+    def append(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= BLOCK_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        index = self.index
+        stop = self.size + len(self.rows)
+        self.decks[self.size:stop] = np.array([index[deck] for row in self.rows for deck in row[:4]], dtype=np.int16).reshape(-1, 4)
+        self.win_rate[self.size:stop] = np.array([row[4] for row in self.rows], dtype=np.float64)
+        if len(self.rows[0]) > 5:
+            if self.error is None:
+                self.error = open_memmap(os.path.join(self.path, "error.npy"), mode="w+", dtype=np.float64, shape=self.win_rate.shape)
+            self.error[self.size:stop] = np.array([row[5] for row in self.rows], dtype=np.float64)
+        self.size = stop
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.decks.flush()
+        self.win_rate.flush()
+        if self.error is not None:
+            self.error.flush()
+        del self.decks, self.win_rate, self.error
+
+# Returns (decks, win_rate, names, error) with the arrays memory mapped read only, error is None without error bounds
+def load_results(path):
+    decks = np.load(os.path.join(path, "decks.npy"), mmap_mode="r")
+    win_rate = np.load(os.path.join(path, "win_rate.npy"), mmap_mode="r")
+    error_path = os.path.join(path, "error.npy")
+    error = np.load(error_path, mmap_mode="r") if os.path.exists(error_path) else None
+    with open(os.path.join(path, "names.json")) as f:
+        names = json.load(f)
+    return decks, win_rate, names, error
+
+# Same layout as the CSV output, for a (possibly sliced) part of the results
+def to_dataframe(decks, win_rate, names, error=None):
+    df = pd.DataFrame(np.asarray(names, dtype=object)[decks])
+    df[4] = np.asarray(win_rate)
+    if error is not None:
+        df[5] = np.asarray(error)
+    return df
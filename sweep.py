@@ -0,0 +1,172 @@
+from main import kernels, lineup_value
+from tqdm import tqdm
+from multiprocessing import Pool
+from request_data import request_archetype_table, request_dataset, select_decks
+from create_field import generate_field
+from loguru import logger
+from write_results import ResultWriter
+from configuration import SWEEP_LEAGUE_RANK_RANGES, SWEEP_REGIONS, SWEEP_TIME_RANGES, SWEEP_MIN_GAMES, SWEEP_OUTPUT_PATH
+from configuration import SWEEP_REPORT_TOP, SOLVER_TOLERANCE, USER_INPUT
+import argparse
+import csv
+import itertools
+import os
+import shutil
+
+# Runs the calculation of main.py for every combination of a grid of rank ranges, regions, time ranges and MIN_GAMES cutoffs:
+#   - the archetypes are requested once, and each (rank range, region, time range) dataset once for all its cutoffs
+#   - a dataset's matchups are prepared once for the decks of its lowest cutoff, higher cutoffs keep a subset
+#     of those decks and index into the same matchups
+#   - cutoffs that keep the same decks share one field and one calculation
+#   - the lineups of every calculation go through one Pool, so workers don't idle between combinations
+# Each combination gets its results in <output>/<label>.csv, and the combinations are compared in
+# summary.csv and comparison.csv. Sweeps don't use checkpoints.
+
+# Constant inputs of the sweep, set in each Pool worker:
+# the prepared matchups of each dataset and (dataset, opponents, number of field lineups) of each calculation
+_sweep = None
+
+def init_sweep_worker(prepared, calculations):
+    global _sweep
+    _sweep = (prepared, calculations)
+
+def solve_sweep_line(task):
+    calculation, lineup_id, hero_decks = task
+    prepared, calculations = _sweep
+    dataset, opponents, num_lines = calculations[calculation]
+    value_line, error_line = lineup_value(prepared[dataset], hero_decks, opponents)
+    values = [value_line/num_lines]
+    if SOLVER_TOLERANCE is not None:
+        values.append(error_line/num_lines)
+    return calculation, lineup_id, values
+
+def run_label(league_rank_range, region, time_range, min_games):
+    return f"{league_rank_range}_{region}_{time_range}_{min_games}"
+
+# Requests every dataset of the grid and generates the fields, returns the runs (one per combination)
+# and the distinct calculations with their lineups, as deck names and as deck ids into their dataset's matchups
+def plan_sweep(league_rank_ranges, regions, time_ranges, min_games):
+    archetypes = request_archetype_table()
+    cutoffs = sorted(set(min_games))
+    prepared = []
+    calculations = []
+    lineups = []
+    runs = []
+    for league_rank_range, region, time_range in itertools.product(league_rank_ranges, regions, time_ranges):
+        logger.info(f"Requesting {league_rank_range} / {region} / {time_range}...")
+        matchup_data, total_games = request_dataset(archetypes, league_rank_range, region, time_range)
+        deck_ids = None
+        calculation_of = {}
+        for cutoff in cutoffs:
+            matchups, cutoff_lineups, deck_pct, arcs = select_decks(matchup_data, total_games, archetypes, cutoff)
+            names = tuple(arcs['name'])
+            if deck_ids is None:
+                deck_ids = {deck: index for index, deck in enumerate(names)}
+                prepared.append(kernels.prepare((matchups / 100).values))
+            run = {
+                "label": run_label(league_rank_range, region, time_range, cutoff),
+                "league_rank_range": league_rank_range, "region": region, "time_range": time_range, "min_games": cutoff,
+                "decks": len(names), "lineups": len(cutoff_lineups), "field": 0, "calculation": None, "shared_with": "",
+            }
+            runs.append(run)
+            if not cutoff_lineups:
+                logger.warning(f"{run['label']} has no lineup of 4 classes, skipping it.")
+                continue
+            if names in calculation_of:
+                shared = runs[calculation_of[names]]
+                run.update(calculation=shared["calculation"], field=shared["field"], shared_with=shared["label"])
+                logger.info(f"{run['label']} has the same decks as {shared['label']}, sharing its results.")
+                continue
+
+            field = generate_field(deck_pct, cutoff_lineups)
+            opponents = [([deck_ids[deck] for deck in opp[:4]], opp[4]) for opp in field.values.tolist()]
+            calculation_of[names] = len(runs) - 1
+            run.update(calculation=len(calculations), field=len(field))
+            calculations.append((len(prepared) - 1, opponents, sum(field[4])))
+            lineups.append((cutoff_lineups, [[deck_ids[deck] for deck in line] for line in cutoff_lineups]))
+    return runs, prepared, calculations, lineups
+
+def run_sweep(league_rank_ranges, regions, time_ranges, min_games, output_path=SWEEP_OUTPUT_PATH, top=SWEEP_REPORT_TOP):
+    logger.info(f"Using the {kernels.name} kernels.")
+    runs, prepared, calculations, lineups = plan_sweep(league_rank_ranges, regions, time_ranges, min_games)
+    os.makedirs(output_path, exist_ok=True)
+    owners = {run["calculation"]: run for run in runs if run["calculation"] is not None and not run["shared_with"]}
+    writers = [ResultWriter(os.path.join(output_path, f"{owners[calculation]['label']}.csv"))
+               for calculation in range(len(calculations))]
+
+    tasks = [(calculation, lineup_id, hero_decks)
+             for calculation, (_, hero_lineups) in enumerate(lineups)
+             for lineup_id, hero_decks in enumerate(hero_lineups)]
+    logger.info(f"Calculating {len(tasks)} lineups of {len(calculations)} calculations for {len(runs)} combinations.")
+    with Pool(initializer=init_sweep_worker, initargs=(prepared, calculations)) as pool:
+        for calculation, lineup_id, values in tqdm(pool.imap_unordered(solve_sweep_line, tasks), total=len(tasks), desc="Calculating the sweep..."):
+            writers[calculation].add(lineups[calculation][0][lineup_id] + values)
+
+    logger.info("Merging sorted results...")
+    for run in runs:
+        path = os.path.join(output_path, f"{run['label']}.csv")
+        if run["calculation"] is None:
+            continue
+        if run["shared_with"]:
+            shutil.copyfile(os.path.join(output_path, f"{run['shared_with']}.csv"), path)
+        else:
+            writers[run["calculation"]].finish()
+    write_report(runs, output_path, top)
+    logger.success(f"Results of {len(runs)} combinations and their comparison saved to {output_path}")
+
+# summary.csv: one row per combination with its decks, lineups, field and best lineup
+# comparison.csv: the best `top` lineups of every combination, with their win rate and rank in each combination
+def write_report(runs, output_path, top):
+    done = [run for run in runs if run["calculation"] is not None]
+    best = {}
+    for run in done:
+        with open(os.path.join(output_path, f"{run['label']}.csv"), newline="") as f:
+            best[run["label"]] = list(itertools.islice(csv.reader(f), top))
+
+    with open(os.path.join(output_path, "summary.csv"), "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["Combination", "League Rank Range", "Region", "Time Range", "Min Games", "Decks", "Lineups",
+                         "Field Lineups", "Same Decks As", "Deck 1", "Deck 2", "Deck 3", "Deck 4", "Win Rate"])
+        for run in runs:
+            first = best.get(run["label"]) or [[""] * 5]
+            writer.writerow([run["label"], run["league_rank_range"], run["region"], run["time_range"], run["min_games"],
+                             run["decks"], run["lineups"], run["field"], run["shared_with"]] + first[0][:5])
+
+    # Win rate and rank of each compared lineup in each combination, blank where the lineup isn't possible or kept
+    compared = {tuple(row[:4]): {} for rows in best.values() for row in rows}
+    for run in done:
+        with open(os.path.join(output_path, f"{run['label']}.csv"), newline="") as f:
+            for rank, row in enumerate(csv.reader(f), 1):
+                scores = compared.get(tuple(row[:4]))
+                if scores is not None:
+                    scores[run["label"]] = (row[4], rank)
+
+    def average_win_rate(item):
+        scores = item[1].values()
+        return sum(float(win_rate) for win_rate, _ in scores) / len(scores)
+
+    with open(os.path.join(output_path, "comparison.csv"), "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["Deck 1", "Deck 2", "Deck 3", "Deck 4"]
+                        + [f"{column} {run['label']}" for run in done for column in ("Win Rate", "Rank")])
+        for lineup, scores in sorted(compared.items(), key=average_win_rate, reverse=True):
+            writer.writerow(list(lineup) + [value for run in done for value in scores.get(run["label"], ("", ""))])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculates the best lineups for a grid of data filters and compares them.")
+    parser.add_argument("--ranks", nargs="+", default=SWEEP_LEAGUE_RANK_RANGES, metavar="RANGE",
+                        help="league rank ranges (default SWEEP_LEAGUE_RANK_RANGES)")
+    parser.add_argument("--regions", nargs="+", default=SWEEP_REGIONS, metavar="REGION",
+                        help="regions (default SWEEP_REGIONS)")
+    parser.add_argument("--time-ranges", nargs="+", default=SWEEP_TIME_RANGES, metavar="RANGE",
+                        help="time ranges (default SWEEP_TIME_RANGES)")
+    parser.add_argument("--min-games", nargs="+", type=int, default=SWEEP_MIN_GAMES, metavar="N",
+                        help="minimum games per deck cutoffs (default SWEEP_MIN_GAMES)")
+    parser.add_argument("--output", default=SWEEP_OUTPUT_PATH, metavar="FOLDER",
+                        help=f"folder of the results and the report (default {SWEEP_OUTPUT_PATH})")
+    parser.add_argument("--top", type=int, default=SWEEP_REPORT_TOP, metavar="N",
+                        help=f"best lineups of each combination compared (default {SWEEP_REPORT_TOP})")
+    args = parser.parse_args()
+    if USER_INPUT:
+        parser.error("sweeps request their datasets from HSReplay, set USER_INPUT = False")
+    run_sweep(args.ranks, args.regions, args.time_ranges, args.min_games, args.output, args.top)
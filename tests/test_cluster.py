@@ -0,0 +1,74 @@
+import itertools
+import random
+import socket
+import threading
+import pytest
+import cluster
+
+NUM_DECKS = 16
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# Enough lineups that one worker process takes minutes, so it is killed mid shard
+def calculation(seed=0):
+    rng = random.Random(seed)
+    matchups = [[rng.uniform(0.2, 0.8) for _ in range(NUM_DECKS)] for _ in range(NUM_DECKS)]
+    lineups = [list(line) for line in itertools.combinations(range(NUM_DECKS), 4)]
+    opponents = [(rng.choice(lineups), 1) for _ in range(30)]
+    return matchups, lineups, [f"Deck {deck}" for deck in range(NUM_DECKS)], opponents, len(opponents)
+
+# Runs the coordinator in a thread, returns the thread and the list its RuntimeError goes to
+def start_coordinator(**kwargs):
+    errors = []
+    def coordinate():
+        try:
+            cluster.coordinate(*calculation(), shard_size=10_000, timeout=2, **kwargs)
+        except RuntimeError as error:
+            errors.append(error)
+    coordinator = threading.Thread(target=coordinate, daemon=True)
+    coordinator.start()
+    return coordinator, errors
+
+@pytest.fixture
+def connected(tmp_path, monkeypatch):
+    monkeypatch.setattr(cluster, "OUTPUT_PATH", str(tmp_path / "output.csv"))
+    monkeypatch.setattr(cluster, "BINARY_OUTPUT_PATH", None)
+    event = threading.Event()
+    connect = cluster.ShardQueue.connect
+    def connect_and_signal(self):
+        connect(self)
+        event.set()
+    monkeypatch.setattr(cluster.ShardQueue, "connect", connect_and_signal)
+    return event
+
+def test_coordinator_exits_when_its_only_worker_is_killed(connected):
+    port = free_port()
+    coordinator, errors = start_coordinator(port=port, authkey="test key")
+    worker = cluster.start_local_worker(port, "test key", 1)
+    try:
+        assert connected.wait(60)
+        worker.kill()
+        coordinator.join(30)
+    finally:
+        worker.kill()
+        worker.wait()
+    assert not coordinator.is_alive()
+    assert "No worker left" in str(errors[0])
+
+@pytest.mark.parametrize("after_connecting", [True, False])
+def test_coordinator_exits_when_its_local_worker_is_killed(connected, monkeypatch, after_connecting):
+    workers = []
+    start_local_worker = cluster.start_local_worker
+    monkeypatch.setattr(cluster, "start_local_worker", lambda *args: workers.append(start_local_worker(*args)) or workers[-1])
+    coordinator, errors = start_coordinator(port=free_port(), authkey=None, local_workers=1, local_processes=1)
+    if after_connecting:
+        assert connected.wait(60)
+    while not workers:
+        threading.Event().wait(0.05)
+    workers[0].kill()
+    coordinator.join(30)
+    assert not coordinator.is_alive()
+    assert errors
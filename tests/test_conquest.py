@@ -0,0 +1,61 @@
+import random
+import numpy as np
+import pytest
+from analysis import series as se
+from analysis.conquest import conquest_kernel
+
+NUM_DECKS = 10
+TRIALS = 25
+
+# Random matchups, antisymmetric (m[h][v] + m[v][h] = 1) or not, like HSReplay data measured from each side
+def matchups(seed, antisymmetric):
+    rng = random.Random(seed)
+    mups = [[rng.uniform(0.2, 0.8) for _ in range(NUM_DECKS)] for _ in range(NUM_DECKS)]
+    if antisymmetric:
+        for h in range(NUM_DECKS):
+            mups[h][h] = 0.5
+            for v in range(h + 1, NUM_DECKS):
+                mups[v][h] = 1 - mups[h][v]
+    return mups
+
+def pairings(seed, n):
+    rng = random.Random(seed)
+    return [(rng.sample(range(NUM_DECKS), n), rng.sample(range(NUM_DECKS), n)) for _ in range(TRIALS)]
+
+REFERENCES = [
+    (2, False, se.conquest_bo3),
+    (3, False, se.conquest_bo5),
+    (3, True, se.conquest_bo5_fixed),
+]
+
+@pytest.mark.parametrize("antisymmetric", [True, False])
+@pytest.mark.parametrize("n, fixed, reference", REFERENCES)
+def test_scalar_kernel_matches_hand_written(n, fixed, reference, antisymmetric):
+    mups = matchups(n, antisymmetric)
+    kernel = conquest_kernel(n, fixed)
+    for h, v in pairings(n, n):
+        assert kernel(mups, *h, *v) == pytest.approx(reference(mups, *h, *v), abs=1e-12)
+
+@pytest.mark.parametrize("antisymmetric", [True, False])
+@pytest.mark.parametrize("n, fixed, reference", REFERENCES)
+def test_batched_kernel_matches_hand_written(n, fixed, reference, antisymmetric):
+    mups = matchups(n, antisymmetric)
+    hero, villain = (np.array(side) for side in zip(*pairings(n, n)))
+    got = conquest_kernel(n, fixed, batched=True)(np.array(mups), *hero.T, *villain.T)
+    expected = [reference(mups, *h, *v) for h, v in zip(hero.tolist(), villain.tolist())]
+    np.testing.assert_allclose(got, expected, rtol=0, atol=1e-12)
+
+@pytest.mark.parametrize("antisymmetric", [True, False])
+@pytest.mark.parametrize("n", [1, 2, 3, 4])
+def test_kernel_matches_recursive(n, antisymmetric):
+    mups = matchups(10 + n, antisymmetric)
+    kernel = conquest_kernel(n)
+    for h, v in pairings(10 + n, n):
+        assert kernel(mups, *h, *v) == pytest.approx(se.conquest_recursive(mups, h, v), abs=1e-12)
+
+@pytest.mark.parametrize("antisymmetric", [True, False])
+def test_ban_list_bo7_matches_recursive(antisymmetric):
+    mups = matchups(20, antisymmetric)
+    for h, v in pairings(20, 5)[:5]:
+        expected = [[se.conquest_recursive(mups, h[:i] + h[i + 1:], v[:j] + v[j + 1:]) for j in range(5)] for i in range(5)]
+        np.testing.assert_allclose(se.banList_bo7(mups, h, v), expected, rtol=0, atol=1e-12)
@@ -3,13 +3,23 @@ Core calculation engine.
 This module contains the game theory and lineup calculation logic.
 All algorithms are preserved exactly from the original implementation.
 """
+import os
+import time
 import pandas as pd
+from contextlib import ExitStack
 import random as rd
 from copy import deepcopy
 from typing import Callable, Optional
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from .config import RANDOM_TARGET, NUM_ITERATIONS
+from .checkpoint import Checkpoint
+from .pairings import Pairings
+from .precompute import Precomputed, solve_batch
+from .metrics import CALCULATION_DURATION, FIELD_GENERATION_DURATION, PoolMonitor
+
+# Ban phases solved together per task when using precomputed tables
+WARM_BATCH_GAMES = 8192
 
 
 # ============================================================================
@@ -237,6 +247,7 @@ def alter_num_line(line: list, classes: dict, random_target: int) -> None:
                 classes[line[deck]][0] -= 1
 
 
+@FIELD_GENERATION_DURATION.time()
 def generate_field(
     deck_pct: pd.Series,
     lineups: list,
@@ -288,6 +299,49 @@ def generate_field(
     return df
 
 
+def opponent_field(opponents: list[dict], archetypes: pd.DataFrame) -> pd.DataFrame:
+    """
+    Field of known opponent lineups, used instead of generate_field.
+    
+    Args:
+        opponents: Dicts with `decks` (4 deck names) and an optional
+            `probability`. Without probabilities all opponents are equally
+            likely; opponents missing one share what the others leave of 1
+        archetypes: DataFrame with deck info
+    
+    Returns:
+        DataFrame like generate_field's, decks in the class order of
+        possible_lineups and the probability as frequency
+    """
+    deck_class = dict(zip(archetypes['name'], archetypes['player_class_name']))
+    lines = []
+    for opponent in opponents:
+        decks = opponent["decks"]
+        unknown = [deck for deck in decks if deck not in deck_class]
+        if unknown:
+            raise ValueError(f"Unknown deck: {unknown[0]}")
+        if len(decks) != 4 or len({deck_class[deck] for deck in decks}) != 4:
+            raise ValueError("Opponent lineups need 4 decks of different classes")
+        lines.append(sorted(decks, key=deck_class.get) + [opponent.get("probability")])
+    
+    given = [line[4] for line in lines if line[4] is not None]
+    if not given:
+        for line in lines:
+            line[4] = 1.0
+    elif len(given) < len(lines):
+        rest = 1 - sum(given)
+        if rest < 0:
+            raise ValueError("Opponent probabilities add up to more than 1")
+        for line in lines:
+            if line[4] is None:
+                line[4] = rest / (len(lines) - len(given))
+    
+    field = pd.DataFrame([line for line in lines if line[4] > 0])
+    if field.empty:
+        raise ValueError("No opponent has a probability above 0")
+    return field
+
+
 # ============================================================================
 # Lineup Calculation (Main Solver)
 # ============================================================================
@@ -317,13 +371,68 @@ def solve_single_lineup(args: tuple) -> list:
     return result
 
 
+def solve_indexed_lineup(args: tuple) -> tuple[int, list, float, float]:
+    """
+    Solve a lineup task tagged with its lineup id, see solve_single_lineup.
+    
+    Returns:
+        Tuple of (lineup_id, result, start time, seconds spent)
+    """
+    lineup_id, task = args
+    started = time.time()
+    result = solve_single_lineup(task)
+    return lineup_id, result, started, time.time() - started
+
+
+# Precomputed data of the running calculation, set in each pool worker
+_warm = None
+
+
+def init_warm_worker(table, hero_triples, field_columns, field_counts, num_lines) -> None:
+    """Pool initializer shipping the precomputed tables to a worker once."""
+    global _warm
+    _warm = (table, hero_triples, field_columns, field_counts, num_lines)
+
+
+def solve_lineup_batch(lineup_ids: list) -> tuple[list[tuple[int, float]], tuple, float, float]:
+    """
+    Solve lineups against the entire field with the precomputed tables.
+    Same values as solve_single_lineup, with all ban phases solved in one batch.
+    
+    Returns:
+        Tuple of ([(lineup_id, win rate)], (values, row counts, col counts) of
+        every pair, start time, seconds spent)
+    """
+    started = time.time()
+    table, hero_triples, field_columns, field_counts, num_lines = _warm
+    hero = hero_triples[lineup_ids]
+    # banlists[l, o, i, j]: lineup l without deck i against opponent o without deck j
+    banlists = table[hero[:, None, :, None], field_columns[None, :, None, :]]
+    rowcnt, colcnt, values = solve_batch(banlists.reshape(-1, 4, 4))
+    shape = (len(lineup_ids), len(field_counts))
+    values = values.reshape(shape)
+    pairs = (values, rowcnt.reshape(*shape, 4), colcnt.reshape(*shape, 4))
+    
+    results = []
+    for lineup_id, opp_values in zip(lineup_ids, values.tolist()):
+        value_line = 0
+        for value, count in zip(opp_values, field_counts):
+            value_line += value * count
+        results.append((lineup_id, value_line / num_lines))
+    return results, pairs, started, time.time() - started
+
+
+@CALCULATION_DURATION.time()
 def calculate_lineups(
     matchups: pd.DataFrame,
     field: pd.DataFrame,
     lineups: list,
     archetypes: pd.DataFrame,
     progress_callback: Optional[Callable[[float, str], None]] = None,
-    max_workers: Optional[int] = None
+    max_workers: Optional[int] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    precomputed: Optional[Precomputed] = None,
+    pairings: Optional[Pairings] = None
 ) -> pd.DataFrame:
     """
     Calculate win rates for all lineups against the field.
@@ -335,6 +444,13 @@ def calculate_lineups(
         archetypes: DataFrame with deck info
         progress_callback: Optional callback(progress, message)
         max_workers: Maximum parallel workers (None = auto)
+        checkpoint: Checkpoint of these inputs to save finished lineups in,
+            lineups it already holds are skipped. Closed when done and
+            cleared once all lineups are calculated (None = no checkpoint)
+        precomputed: Lineup index and outcome tables of the matchups, used
+            instead of evaluating every ban phase from scratch
+        pairings: Filled with the value and bans of every (lineup, field
+            lineup) pair, rows by lineup id (needs precomputed)
     
     Returns:
         DataFrame with lineups and win rates, sorted by win rate
@@ -352,27 +468,83 @@ def calculate_lineups(
     # Convert field to list for parallel processing
     field_data = field.values.tolist()
     
-    # Prepare tasks
-    tasks = [
-        (matchups_list, line, field_data, num_lines, reverse_translator)
-        for line in lineups
-    ]
-    
     results = []
-    total = len(tasks)
+    total = len(lineups)
+    
+    # Lineups finished by an interrupted run with the same inputs are reused
+    done = set()
+    if checkpoint:
+        for lineup_id, value in checkpoint.completed():
+            done.add(lineup_id)
+            results.append(lineups[lineup_id] + [value])
     
     # Process with progress tracking
     # Note: Using ProcessPoolExecutor for CPU-bound work
     from multiprocessing import Pool
     
-    completed = 0
-    with Pool(processes=max_workers) as pool:
-        for result in pool.imap_unordered(solve_single_lineup, tasks, chunksize=10):
-            results.append(result)
-            completed += 1
-            if progress_callback and completed % 50 == 0:
-                progress = completed / total
-                progress_callback(progress, f"Calculating lineups... {completed}/{total}")
+    completed = len(results)
+    pool_processes = max_workers or os.cpu_count() or 1
+    try:
+        if precomputed is not None:
+            # Ban matrices are lookups into the outcome table, workers get the tables once
+            hero_triples = precomputed.triples(precomputed.deck_array(lineups))
+            table, field_columns = precomputed.field_table(
+                precomputed.triples(precomputed.deck_array(field_data))
+            )
+            field_counts = [opp[4] for opp in field_data]
+            todo = [lineup_id for lineup_id in range(total) if lineup_id not in done]
+            batch = max(1, WARM_BATCH_GAMES // max(1, len(field_data)))
+            batches = [todo[i:i + batch] for i in range(0, len(todo), batch)]
+            initargs = (table, hero_triples, field_columns, field_counts, num_lines)
+            
+            with ExitStack() as stack:
+                if len(batches) > 1:
+                    pool = stack.enter_context(
+                        Pool(processes=max_workers, initializer=init_warm_worker, initargs=initargs)
+                    )
+                    outputs = pool.imap_unordered(solve_lineup_batch, batches)
+                    monitor = stack.enter_context(PoolMonitor(pool_processes, "lineups"))
+                else:
+                    # A single batch (small fields like known opponents) doesn't pay for starting a pool,
+                    # it runs in this process
+                    init_warm_worker(*initargs)
+                    outputs = map(solve_lineup_batch, batches)
+                    monitor = stack.enter_context(PoolMonitor(1, "lineups"))
+                for batch_results, pairs, started, seconds in outputs:
+                    monitor.record(started, seconds, len(batch_results))
+                    if pairings is not None:
+                        pairings.record([lineup_id for lineup_id, _ in batch_results], *pairs)
+                    for lineup_id, value in batch_results:
+                        results.append(lineups[lineup_id] + [value])
+                        if checkpoint:
+                            checkpoint.record(lineup_id, value)
+                    completed += len(batch_results)
+                    if progress_callback:
+                        progress = completed / total
+                        progress_callback(progress, f"Calculating lineups... {completed}/{total}")
+        else:
+            tasks = [
+                (lineup_id, (matchups_list, line, field_data, num_lines, reverse_translator))
+                for lineup_id, line in enumerate(lineups)
+                if lineup_id not in done
+            ]
+            
+            with Pool(processes=max_workers) as pool, PoolMonitor(pool_processes, "lineups") as monitor:
+                for lineup_id, result, started, seconds in pool.imap_unordered(solve_indexed_lineup, tasks, chunksize=10):
+                    monitor.record(started, seconds, 1)
+                    results.append(result)
+                    if checkpoint:
+                        checkpoint.record(lineup_id, result[4])
+                    completed += 1
+                    if progress_callback and completed % 50 == 0:
+                        progress = completed / total
+                        progress_callback(progress, f"Calculating lineups... {completed}/{total}")
+    finally:
+        if checkpoint:
+            checkpoint.close()
+    
+    if checkpoint:
+        checkpoint.clear()
     
     if progress_callback:
         progress_callback(1.0, "Sorting results...")
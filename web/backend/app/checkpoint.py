@@ -0,0 +1,143 @@
+"""
+Checkpoints for long lineup calculations.
+The generated field and the finished lineup ids with their win rates are
+kept on disk so an interrupted calculation with the same inputs reuses the
+field and skips completed work.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from threading import Lock
+from typing import Iterator, Optional
+
+import pandas as pd
+
+from .config import CHECKPOINT_INTERVAL, NUM_ITERATIONS, RANDOM_TARGET
+
+# Checkpoint directories of the calculations running in this process
+_open_dirs: set[str] = set()
+_open_lock = Lock()
+
+
+def fingerprint(
+    matchups: pd.DataFrame,
+    deck_pct: pd.Series,
+    lineups: list,
+    hero_lineups: list,
+    opponents: Optional[pd.DataFrame] = None
+) -> str:
+    """
+    Hash every input that changes the results of a calculation.
+
+    The generated field is random, so it's keyed by the inputs it's generated
+    from and saved in the checkpoint instead (see Checkpoint.save_field).
+
+    Args:
+        matchups: Matchup matrix DataFrame
+        deck_pct: Deck frequencies the field is generated from
+        lineups: All possible lineups, the field is drawn from them
+        hero_lineups: Lineups calculated, their ids are recorded
+        opponents: Field of known opponents replacing the generated one
+    """
+    digest = hashlib.sha256()
+    digest.update(matchups.to_csv().encode())
+    digest.update(deck_pct.sort_index().to_csv().encode())
+    digest.update(json.dumps(lineups).encode())
+    digest.update(json.dumps(hero_lineups).encode())
+    if opponents is not None:
+        digest.update(opponents.to_csv(index=False, header=False).encode())
+    digest.update(f"{RANDOM_TARGET},{NUM_ITERATIONS}".encode())
+    return digest.hexdigest()
+
+
+def remove_stale(directory: str, keep: str) -> None:
+    """
+    Remove the checkpoints of other inputs, left by interrupted calculations.
+
+    Only subdirectories with a fingerprint file are checkpoints, anything
+    else in the directory is left alone, and so are the checkpoints of
+    calculations still running.
+    """
+    with _open_lock:
+        running = set(_open_dirs)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name != keep and path not in running and os.path.isfile(os.path.join(path, "fingerprint")):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class Checkpoint:
+    """
+    Append-only log of finished lineups for one set of inputs.
+
+    Records are buffered and synced to disk every `interval` seconds.
+    A record torn by a crash is dropped and that lineup is calculated again.
+    Opening a checkpoint removes the ones of other inputs in the directory.
+    """
+
+    def __init__(self, directory: str, fp: str, interval: float = CHECKPOINT_INTERVAL):
+        self.dir = os.path.join(directory, fp[:16])
+        self.interval = interval
+        self.field_path = os.path.join(self.dir, "field.csv")
+        self.done_path = os.path.join(self.dir, "done.csv")
+        self.last_sync = time.monotonic()
+        os.makedirs(self.dir, exist_ok=True)
+        with _open_lock:
+            _open_dirs.add(self.dir)
+        remove_stale(directory, fp[:16])
+        with open(os.path.join(self.dir, "fingerprint"), "w") as f:
+            f.write(fp)
+        self._drop_torn_line()
+        self.done_file = open(self.done_path, "a")
+
+    def _drop_torn_line(self) -> None:
+        if not os.path.exists(self.done_path):
+            return
+        with open(self.done_path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def load_field(self) -> Optional[pd.DataFrame]:
+        """The field saved by a previous run, None if there is none."""
+        if not os.path.exists(self.field_path):
+            return None
+        return pd.read_csv(self.field_path, header=None)
+
+    def save_field(self, field: pd.DataFrame) -> None:
+        """Save the generated field, replaced atomically."""
+        tmp_path = f"{self.field_path}.tmp"
+        field.to_csv(tmp_path, index=False, header=False)
+        os.replace(tmp_path, self.field_path)
+
+    def completed(self) -> Iterator[tuple[int, float]]:
+        """Yield (lineup_id, win_rate) for every lineup finished by previous runs."""
+        with open(self.done_path) as f:
+            for line in f:
+                lineup_id, value = line.split(",")
+                yield int(lineup_id), float(value)
+
+    def record(self, lineup_id: int, value: float) -> None:
+        """Save a finished lineup, syncing to disk if the interval has passed."""
+        self.done_file.write(f"{lineup_id},{value!r}\n")
+        if time.monotonic() - self.last_sync >= self.interval:
+            self.sync()
+
+    def sync(self) -> None:
+        self.done_file.flush()
+        os.fsync(self.done_file.fileno())
+        self.last_sync = time.monotonic()
+
+    def close(self) -> None:
+        if not self.done_file.closed:
+            self.sync()
+            self.done_file.close()
+        with _open_lock:
+            _open_dirs.discard(self.dir)
+
+    def clear(self) -> None:
+        """Remove the checkpoint once the calculation finished."""
+        self.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
@@ -21,6 +21,40 @@ DEFAULT_MIN_GAMES = 10000
 RANDOM_TARGET = 40
 NUM_ITERATIONS = 2000
 
+# Minimum seconds between two progress messages on a websocket
+PROGRESS_MIN_INTERVAL = float(os.getenv("PROGRESS_MIN_INTERVAL", "0.25"))
+
+# Checkpoints for lineup calculations (empty directory disables them)
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "")
+CHECKPOINT_INTERVAL = float(os.getenv("CHECKPOINT_INTERVAL", "30"))
+
+# Directory for binary result artifacts of each calculation (empty disables them)
+RESULTS_DIR = os.getenv("RESULTS_DIR", "")
+# Number of result artifacts kept in RESULTS_DIR, the oldest are deleted
+MAX_STORED_ARTIFACTS = int(os.getenv("MAX_STORED_ARTIFACTS", "200"))
+# Number of crawled/uploaded datasets kept in memory
+MAX_STORED_DATASETS = int(os.getenv("MAX_STORED_DATASETS", "50"))
+
+# Number of full result sets kept in memory for paging
+MAX_STORED_RESULTS = int(os.getenv("MAX_STORED_RESULTS", "20"))
+
+# Memory for the per-pairing results of the stored result sets (10 bytes per lineup x field lineup).
+# Calculations that need more run without them, older result sets move theirs to RESULTS_DIR or drop them
+PAIRINGS_MEMORY_MB = float(os.getenv("PAIRINGS_MEMORY_MB", "512"))
+
+# Precomputed lineup index and outcome tables, built when a dataset arrives
+MAX_PRECOMPUTED = int(os.getenv("MAX_PRECOMPUTED", "4"))
+# Largest full outcome table kept in memory, bigger ones are built per field
+PRECOMPUTE_MAX_TABLE_MB = float(os.getenv("PRECOMPUTE_MAX_TABLE_MB", "512"))
+
+# Solved ban phases of single pairings kept per precomputed dataset (LRU)
+BAN_CACHE_SIZE = int(os.getenv("BAN_CACHE_SIZE", "4096"))
+
+# Lineup x lineup payoff matrices of the metagame mode: bigger ones are memory
+# mapped to a file in METAGAME_DIR (empty uses the system temp directory)
+METAGAME_MAX_MATRIX_MB = float(os.getenv("METAGAME_MAX_MATRIX_MB", "256"))
+METAGAME_DIR = os.getenv("METAGAME_DIR", "")
+
 # Available options for the UI
 LEAGUE_RANK_OPTIONS = [
     {"value": "BRONZE_THROUGH_GOLD", "label": "Bronze through Gold"},
@@ -9,6 +9,7 @@ import itertools
 from typing import Callable, Optional
 
 from .config import COOKIES
+from .metrics import CRAWL_DURATION
 
 # Headers to mimic a real browser (bypass Cloudflare)
 DEFAULT_HEADERS = {
@@ -90,6 +91,64 @@ def possible_lineups(classes: dict) -> list:
     return lineups
 
 
+def restricted_lineups(
+    classes: dict,
+    allowed_decks: Optional[list[str]] = None,
+    required_decks: Optional[list[str]] = None,
+    excluded_classes: Optional[list[str]] = None,
+) -> list:
+    """
+    Generate only the lineups a player can bring, in possible_lineups order.
+
+    Classes are narrowed to their allowed decks first (a required deck is
+    the only option of its class), and only class combinations containing
+    every required class are expanded, so the cost follows the number of
+    matching lineups instead of all of them.
+
+    Args:
+        classes: Decks by class, see get_class_archetypes
+        allowed_decks: Decks the player can pilot (None = all)
+        required_decks: Decks every lineup must contain
+        excluded_classes: Classes no lineup may contain
+
+    Raises:
+        ValueError: Unknown decks or contradictory constraints
+    """
+    deck_class = {deck: class_name for class_name, decks in classes.items() for deck in decks}
+    required = list(required_decks or [])
+    for deck in required + list(allowed_decks or []):
+        if deck not in deck_class:
+            raise ValueError(f"Unknown deck: {deck}")
+    excluded = set(excluded_classes or [])
+    for class_name in excluded - classes.keys():
+        raise ValueError(f"Unknown class: {class_name}")
+
+    options = {}
+    for class_name, decks in classes.items():
+        if class_name not in excluded:
+            options[class_name] = [
+                deck for deck in decks if allowed_decks is None or deck in allowed_decks or deck in required
+            ]
+    required_classes = {}
+    for deck in required:
+        class_name = deck_class[deck]
+        if class_name in excluded:
+            raise ValueError(f"{deck} is in an excluded class")
+        if required_classes.setdefault(class_name, deck) != deck:
+            raise ValueError(f"{required_classes[class_name]} and {deck} are both {class_name} decks")
+        options[class_name] = [deck]
+    if len(required_classes) > 4:
+        raise ValueError("A lineup can't require more than 4 decks")
+
+    lineups = []
+    for combo in itertools.combinations([c for c in options if options[c]], 4):
+        if required_classes.keys() <= set(combo):
+            for lineup in itertools.product(*(options[c] for c in combo)):
+                lineups.append(list(lineup))
+    return lineups
+
+
+@CRAWL_DURATION.time()
 def crawl_data(
     league_rank_range: str,
     game_type: str,
@@ -97,7 +156,7 @@ def crawl_data(
     time_range: str,
     min_games: int,
     progress_callback: Optional[Callable[[str, float, str], None]] = None
-) -> tuple[pd.DataFrame, pd.Series, pd.DataFrame, list]:
+) -> tuple[pd.DataFrame, pd.Series, pd.DataFrame, list, pd.DataFrame]:
     """
     Crawl all data from HSReplay.
     
@@ -110,7 +169,8 @@ def crawl_data(
         progress_callback: Optional callback(phase, progress, message)
     
     Returns:
-        Tuple of (matchups, deck_pct, archetypes, lineups)
+        Tuple of (matchups, deck_pct, archetypes, lineups, games) where games
+        holds the number of games behind each matchup cell (same layout)
     """
     if progress_callback:
         progress_callback("fetching_matchups", 0.1, "Fetching matchup data from HSReplay...")
@@ -151,6 +211,7 @@ def crawl_data(
     archetypes = archetypes.sort_values(["player_class_name", "name"])
     
     matchups = matchup_data.loc[archetypes['name'], archetypes['name']].T
+    games = total_games.loc[archetypes['name'], archetypes['name']].T.fillna(0)
     total_games_refined = total_games.sum().loc[archetypes['name']].astype(int)
     deck_pct = (total_games_refined / total_games_refined.sum() * 400).sort_values(ascending=False)
     
@@ -165,4 +226,4 @@ def crawl_data(
     if progress_callback:
         progress_callback("completed", 1.0, f"Done! {len(archetypes)} decks, {len(lineups)} possible lineups")
     
-    return matchups, deck_pct, archetypes, lineups
+    return matchups, deck_pct, archetypes, lineups, games
@@ -0,0 +1,156 @@
+"""
+Server-side datasets.
+Crawled or uploaded matchups and fields are stored under a content hash, so
+calculate requests only need to reference the dataset id and send their edits.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional
+
+import pandas as pd
+
+from .config import MAX_STORED_DATASETS
+
+# Class detection from deck names, only used for uploaded data without archetype info.
+# Two word classes come first so "Demon Hunter" isn't detected as "Hunter".
+CLASS_MAP = {
+    'Demon Hunter': 'DEMONHUNTER', 'Death Knight': 'DEATHKNIGHT',
+    'Warrior': 'WARRIOR', 'Paladin': 'PALADIN', 'Hunter': 'HUNTER',
+    'Rogue': 'ROGUE', 'Priest': 'PRIEST', 'Shaman': 'SHAMAN',
+    'Mage': 'MAGE', 'Warlock': 'WARLOCK', 'Druid': 'DRUID',
+}
+
+
+def infer_class(deck_name: str) -> str:
+    """Guess a deck's class from its name (HSReplay convention)."""
+    for class_name, class_code in CLASS_MAP.items():
+        if class_name in deck_name:
+            return class_code
+    return 'UNKNOWN'
+
+
+@dataclass
+class Dataset:
+    """Matchups, field and deck classes of one analysis."""
+    deck_names: list[str]
+    classes: list[str]
+    matchups: list[list[float]]  # percentages, rows and columns in deck_names order
+    field: list[dict]  # [{"deck": name, "pct": frequency}]
+    id: str = ""
+    games: Optional[list[list[float]]] = None  # games behind each matchup cell, only for crawled data
+
+    def __post_init__(self):
+        if not self.id:
+            self.id = self.content_hash()
+
+    def content_hash(self) -> str:
+        content = [self.deck_names, self.classes, self.matchups, self.field]
+        if self.games is not None:
+            content.append(self.games)
+        payload = json.dumps(content, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+    def matchups_hash(self) -> str:
+        """Hash of the data lineup win rates depend on (not the field)."""
+        payload = json.dumps([self.deck_names, self.classes, self.matchups])
+        return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+    def matchups_df(self) -> pd.DataFrame:
+        return pd.DataFrame(self.matchups, index=self.deck_names, columns=self.deck_names)
+
+    def archetypes_df(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            'id': range(len(self.deck_names)),
+            'name': self.deck_names,
+            'player_class_name': self.classes,
+        })
+
+    def deck_pct(self) -> pd.Series:
+        return pd.Series({entry["deck"]: entry["pct"] for entry in self.field})
+
+    def with_edits(self, matchup_edits: list, field_edits: list) -> "Dataset":
+        """
+        Build a new dataset with edited matchup cells and field frequencies.
+
+        Args:
+            matchup_edits: Entries with row_deck, col_deck and value (percentage)
+            field_edits: Entries with deck and pct
+        """
+        if not matchup_edits and not field_edits:
+            return self
+
+        index = {name: i for i, name in enumerate(self.deck_names)}
+        matchups = [row.copy() for row in self.matchups]
+        for edit in matchup_edits:
+            if edit.row_deck not in index or edit.col_deck not in index:
+                raise KeyError(f"Unknown matchup: {edit.row_deck} vs {edit.col_deck}")
+            matchups[index[edit.row_deck]][index[edit.col_deck]] = edit.value
+
+        field = {entry["deck"]: entry["pct"] for entry in self.field}
+        for edit in field_edits:
+            field[edit.deck] = edit.pct
+
+        return Dataset(
+            deck_names=self.deck_names,
+            classes=self.classes,
+            matchups=matchups,
+            field=[{"deck": deck, "pct": pct} for deck, pct in field.items()],
+            games=self.games,
+        )
+
+    @classmethod
+    def from_crawl(
+        cls, matchups: pd.DataFrame, deck_pct: pd.Series, archetypes: pd.DataFrame, games: Optional[pd.DataFrame] = None
+    ) -> "Dataset":
+        """Build from crawler output, keeping the real archetype classes and game counts."""
+        classes = archetypes.set_index('name')['player_class_name']
+        deck_names = matchups.columns.tolist()
+        return cls(
+            deck_names=deck_names,
+            classes=[classes[name] for name in deck_names],
+            matchups=matchups.values.tolist(),
+            field=[{"deck": str(deck), "pct": float(pct)} for deck, pct in deck_pct.items()],
+            games=games.loc[deck_names, deck_names].values.tolist() if games is not None else None,
+        )
+
+    @classmethod
+    def from_upload(cls, deck_names: list[str], values: list[list[float]], field: Optional[list[dict]] = None) -> "Dataset":
+        """Build from user data, classes are inferred from deck names."""
+        if field is None:
+            field = [{"deck": deck, "pct": 100 / len(deck_names)} for deck in deck_names]
+        return cls(
+            deck_names=deck_names,
+            classes=[infer_class(name) for name in deck_names],
+            matchups=values,
+            field=field,
+        )
+
+
+class DatasetStore:
+    """Keeps the most recently used datasets in memory, keyed by content hash."""
+
+    def __init__(self, max_datasets: int = MAX_STORED_DATASETS):
+        self.max_datasets = max_datasets
+        self._datasets: "OrderedDict[str, Dataset]" = OrderedDict()
+        self._lock = Lock()
+
+    def add(self, dataset: Dataset) -> Dataset:
+        with self._lock:
+            self._datasets[dataset.id] = dataset
+            self._datasets.move_to_end(dataset.id)
+            while len(self._datasets) > self.max_datasets:
+                self._datasets.popitem(last=False)
+        return dataset
+
+    def get(self, dataset_id: str) -> Optional[Dataset]:
+        with self._lock:
+            dataset = self._datasets.get(dataset_id)
+            if dataset is not None:
+                self._datasets.move_to_end(dataset_id)
+            return dataset
+
+
+dataset_store = DatasetStore()
@@ -0,0 +1,131 @@
+"""
+Field evolution: how the rankings change once the field adapts.
+
+The generated field is a snapshot, while real fields move toward the
+lineups that win. Starting from the field weights of a calculation, each
+step moves a share `rate` of the field:
+
+    replicator      players switch to field lineups in proportion to how
+                    well they do: w <- (1 - rate) w + rate w * f / mean(f)
+    best_response   players switch to the single best field lineup:
+                    w <- (1 - rate) w + rate e_best
+
+where f is the win rate of each field lineup against the current field.
+Only lineups already in the field can gain weight.
+
+The game values of every lineup against every field lineup are computed
+once (the first evaluation, in a process pool). After that a step is a
+matrix-vector product, and so is ranking all lineups against a field.
+"""
+import os
+import time
+from multiprocessing import Pool
+from typing import Callable, Optional
+
+import numpy as np
+
+from .metrics import PoolMonitor
+from .precompute import lineup_values
+
+DYNAMICS = ("replicator", "best_response")
+MAX_EVOLUTION_STEPS = 10000
+
+# Lineups evaluated against the field per pool task
+VALUES_BATCH_LINEUPS = 256
+
+
+# Constant inputs of the running evaluation, set in each pool worker
+_evolution = None
+
+
+def init_values_worker(matchups, field_decks) -> None:
+    """Pool initializer shipping the matchups and field to a worker once."""
+    global _evolution
+    _evolution = (matchups, field_decks)
+
+
+def lineup_field_values(task: tuple[int, np.ndarray]) -> tuple[int, np.ndarray, float, float]:
+    """
+    Game values of a batch of lineups against every field lineup.
+
+    Returns:
+        Tuple of (first row, values as float32, start time, seconds spent)
+    """
+    started = time.time()
+    start, lineup_decks = task
+    matchups, field_decks = _evolution
+    values = lineup_values(matchups, lineup_decks, field_decks).astype(np.float32)
+    return start, values, started, time.time() - started
+
+
+def field_values(
+    matchups: np.ndarray,
+    lineup_decks: np.ndarray,
+    field_decks: np.ndarray,
+    progress_callback: Optional[Callable[[float, str], None]] = None,
+    max_workers: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Win rate of every lineup against every field lineup.
+
+    Args:
+        matchups: Normalized (0-1) matchup matrix
+        lineup_decks: Deck ids of the lineups, shape (lineups, 4)
+        field_decks: Deck ids of the field lineups, shape (opponents, 4)
+        progress_callback: Optional callback(progress, message)
+        max_workers: Maximum parallel workers (None = auto)
+
+    Returns:
+        float32 array (lineups, opponents)
+    """
+    values = np.empty((len(lineup_decks), len(field_decks)), dtype=np.float32)
+    tasks = [
+        (start, lineup_decks[start:start + VALUES_BATCH_LINEUPS])
+        for start in range(0, len(lineup_decks), VALUES_BATCH_LINEUPS)
+    ]
+    monitor = PoolMonitor(max_workers or os.cpu_count() or 1, "field_values")
+    with Pool(processes=max_workers, initializer=init_values_worker, initargs=(matchups, field_decks)) as pool, monitor:
+        for done, (start, block, started, seconds) in enumerate(pool.imap_unordered(lineup_field_values, tasks), 1):
+            monitor.record(started, seconds)
+            values[start:start + len(block)] = block
+            if progress_callback:
+                progress_callback(done / len(tasks), f"Evaluating lineups against the field... {done}/{len(tasks)}")
+    return values
+
+
+def evolve_field(
+    field_matrix: np.ndarray,
+    weights: np.ndarray,
+    steps: int,
+    dynamics: str = "replicator",
+    rate: float = 0.5,
+) -> list[np.ndarray]:
+    """
+    Field weights after each step of the dynamics.
+
+    Args:
+        field_matrix: Win rate of each field lineup against each field lineup
+        weights: Starting share of the field of each field lineup
+        steps: Number of steps
+        dynamics: "replicator" or "best_response", see the module docstring
+        rate: Share of the field that adapts each step (0-1]
+
+    Returns:
+        List of steps + 1 weight arrays, the starting weights first
+    """
+    if dynamics not in DYNAMICS:
+        raise ValueError(f"Unknown dynamics: {dynamics}")
+    field_matrix = np.asarray(field_matrix, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    history = [weights]
+    for _ in range(steps):
+        fitness = field_matrix @ weights
+        if dynamics == "replicator":
+            adapted = weights * fitness / (weights @ fitness)
+        else:
+            adapted = np.zeros_like(weights)
+            adapted[fitness.argmax()] = 1
+        weights = (1 - rate) * weights + rate * adapted
+        weights /= weights.sum()
+        history.append(weights)
+    return history
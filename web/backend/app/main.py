@@ -2,13 +2,19 @@
 FastAPI main application.
 Provides REST API and WebSocket endpoints for the lineup calculator.
 """
-import asyncio
 import json
 import io
 import csv
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException
+import os
+import shutil
+import tempfile
+import uuid
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import numpy as np
 import pandas as pd
 
 from .config import (
@@ -21,6 +27,10 @@ from .config import (
     DEFAULT_REGION,
     DEFAULT_TIME_RANGE,
     DEFAULT_MIN_GAMES,
+    CHECKPOINT_DIR,
+    METAGAME_DIR,
+    METAGAME_MAX_MATRIX_MB,
+    PAIRINGS_MEMORY_MB,
 )
 from .models import (
     CrawlerOptions,
@@ -28,10 +38,21 @@ from .models import (
     FieldData,
     FieldEntry,
     CalculateRequest,
+    MetagameRequest,
+    EvolutionRequest,
     LineupResult,
 )
-from .crawler import crawl_data, get_class_archetypes, possible_lineups
-from .calculator import generate_field, calculate_lineups
+from .crawler import crawl_data, get_class_archetypes, possible_lineups, restricted_lineups
+from .calculator import generate_field, calculate_lineups, opponent_field
+from .checkpoint import Checkpoint, fingerprint
+from .results import ResultSet, result_store
+from .pairings import Pairings
+from .datasets import Dataset, dataset_store
+from .precompute import precompute_store
+from .progress import ProgressChannel
+from .uncertainty import bootstrap_lineups
+from .metagame import payoff_matrix, symmetric_equilibrium
+from .metrics import ACTIVE_JOBS, WEBSOCKET_MESSAGES, CountingSender, render as render_metrics
 
 app = FastAPI(
     title="Hearthstone Lineup Calculator",
@@ -48,6 +69,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Result pages and datasets are large JSON documents
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 
 @app.get("/")
 async def root():
@@ -55,6 +79,12 @@ async def root():
     return {"status": "ok", "message": "Hearthstone Lineup Calculator API"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: phase durations, queue waits, websocket messages, jobs and pool usage."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api/options")
 async def get_options():
     """Get available crawler options for the UI."""
@@ -97,8 +127,13 @@ async def upload_matchups(file: UploadFile = File(...)):
         deck_names = df.index.tolist()
         values = df.values.tolist()
         
+        # Uploaded data has no archetype info, classes come from deck names
+        dataset = dataset_store.add(Dataset.from_upload(deck_names, values))
+        precompute_store.schedule(dataset)
+        
         return {
             "success": True,
+            "dataset_id": dataset.id,
             "matchups": {
                 "deck_names": deck_names,
                 "values": values
@@ -141,91 +176,243 @@ async def upload_field(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail=f"Failed to parse CSV: {str(e)}")
 
 
+def get_result_set(result_id: str) -> ResultSet:
+    result_set = result_store.get(result_id)
+    if result_set is None:
+        raise HTTPException(status_code=404, detail="Results not found, they may have expired")
+    return result_set
+
+
+@app.get("/api/results/{result_id}")
+async def get_results_page(
+    result_id: str,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=1000),
+    include: list[str] = Query(default=[]),
+    exclude: list[str] = Query(default=[]),
+    include_class: list[str] = Query(default=[]),
+    exclude_class: list[str] = Query(default=[]),
+    sort: str = Query(default="win_rate", pattern="^(win_rate|lineup)$"),
+    order: str = Query(default="desc", pattern="^(asc|desc)$"),
+):
+    """
+    Get a page of the full results of a calculation.
+    Lineups can be filtered by decks and classes they must include or exclude.
+    """
+    result_set = get_result_set(result_id)
+    try:
+        return result_set.query(
+            offset=offset,
+            limit=limit,
+            include=include,
+            exclude=exclude,
+            include_classes=include_class,
+            exclude_classes=exclude_class,
+            sort=sort,
+            descending=order == "desc",
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=str(e.args[0]))
+
+
+@app.get("/api/results/{result_id}/summary")
+async def get_results_summary(result_id: str):
+    """Get totals and the deck list of a calculation."""
+    return get_result_set(result_id).summary()
+
+
+@app.get("/api/results/{result_id}/sensitivity")
+async def get_results_sensitivity(
+    result_id: str,
+    top: int = Query(default=10, ge=1, le=100),
+    matchups: int = Query(default=20, ge=1, le=500),
+    delta: float = Query(default=1.0, gt=0, le=50),
+):
+    """
+    Matchups the best lineups of a calculation depend on the most.
+    Derivatives come from the ban phase equilibria, `effect` is the first order
+    change of the win rate when the matchup moves by `delta` points.
+    """
+    result_set = get_result_set(result_id)
+    # Inputs are only kept in memory, results reloaded from disk can't be analyzed
+    if result_set.matchups is None:
+        raise HTTPException(status_code=409, detail="The inputs of this calculation are no longer available")
+    return await run_in_threadpool(result_set.sensitivity, top, matchups, delta)
+
+
+@app.get("/api/results/{result_id}/breakdown/{rank}")
+async def get_results_breakdown(
+    result_id: str,
+    rank: int,
+    opponents: int = Query(default=5, ge=1, le=50),
+):
+    """
+    Breakdown of one lineup of a calculation: its worst and best field opponents,
+    how its decks fare and get banned, and the decks it bans. Built from the
+    pairings kept by the calculation, nothing is solved again.
+    """
+    result_set = get_result_set(result_id)
+    if not 1 <= rank <= len(result_set):
+        raise HTTPException(status_code=404, detail="No lineup with this rank")
+    try:
+        return result_set.breakdown(rank - 1, opponents)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/api/results/{result_id}/tournament")
+async def get_results_tournament(
+    result_id: str,
+    top: int = Query(default=10, ge=1, le=50),
+    events: int = Query(default=20000, ge=100, le=1000000),
+    players: int = Query(default=128, ge=2, le=4096),
+    rounds: int = Query(default=7, ge=1, le=20),
+    top_cut: int = Query(default=8, ge=2, le=64),
+    seed: int = Query(default=0, ge=0),
+):
+    """
+    Monte Carlo Swiss tournaments with a top cut for the best lineups of a calculation.
+    Opponents are drawn from the calculation's field, `p_top_cut` and `p_win` are
+    the shares of simulated events where the lineup made the cut and won.
+    """
+    result_set = get_result_set(result_id)
+    if result_set.matchups is None:
+        raise HTTPException(status_code=409, detail="The inputs of this calculation are no longer available")
+    try:
+        return await run_in_threadpool(
+            result_set.tournament, top,
+            events=events, players=players, rounds=rounds, top_cut=top_cut, seed=seed,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/datasets/{dataset_id}/bans")
+def get_ban_recommendation(
+    dataset_id: str,
+    hero: list[str] = Query(...),
+    villain: list[str] = Query(...),
+):
+    """
+    Ban phase of one pairing: ban matrix, equilibrium bans and match win rate.
+    Served from the dataset's precomputed outcome table, repeated pairings from a cache.
+    Rows of `ban_matrix` are the hero deck banned, columns the villain deck banned.
+    """
+    dataset = dataset_store.get(dataset_id)
+    if dataset is None:
+        raise HTTPException(status_code=404, detail="Dataset not found, it may have expired")
+    for lineup in (hero, villain):
+        if len(lineup) != 4 or len(set(lineup)) != 4:
+            raise HTTPException(status_code=400, detail="Lineups need 4 different decks")
+    precomputed = precompute_store.get(dataset)
+    unknown = [deck for deck in hero + villain if deck not in precomputed.deck_ids]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown deck: {unknown[0]}")
+    
+    banlist, rowcnt, colcnt, value = precomputed.ban_phase(
+        [precomputed.deck_ids[deck] for deck in hero], [precomputed.deck_ids[deck] for deck in villain]
+    )
+    return {
+        "hero": hero,
+        "villain": villain,
+        "ban_matrix": banlist.tolist(),
+        # Share of the equilibrium each deck is banned in
+        "hero_bans": {deck: count / sum(rowcnt) for deck, count in zip(hero, rowcnt)},
+        "villain_bans": {deck: count / sum(colcnt) for deck, count in zip(villain, colcnt)},
+        "win_rate": value,
+    }
+
+
+@app.get("/api/results/{result_id}/csv")
+async def export_results_csv(
+    result_id: str,
+    include: list[str] = Query(default=[]),
+    exclude: list[str] = Query(default=[]),
+    include_class: list[str] = Query(default=[]),
+    exclude_class: list[str] = Query(default=[]),
+):
+    """Download the (filtered) results of a calculation as CSV."""
+    result_set = get_result_set(result_id)
+    filters = dict(
+        include=include,
+        exclude=exclude,
+        include_classes=include_class,
+        exclude_classes=exclude_class,
+    )
+    try:
+        total = result_set.query(limit=1, **filters)["total"]
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=str(e.args[0]))
+    
+    # Bootstrapped results also export their intervals and top probabilities
+    extra = list(ResultSet.UNCERTAINTY_COLUMNS) if result_set.uncertainty is not None else []
+    
+    def rows():
+        yield ",".join(["Rank", "Deck 1", "Deck 2", "Deck 3", "Deck 4", "Win Rate"] + extra) + "\n"
+        for offset in range(0, total, 10000):
+            page = result_set.query(offset=offset, limit=10000, **filters)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator="\n")
+            for row in page["rows"]:
+                writer.writerow([row["rank"], *row["decks"], f"{row['win_rate']:.4f}"] + [f"{row[key]:.4f}" for key in extra])
+            yield buffer.getvalue()
+    
+    return StreamingResponse(
+        rows(),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=lineup_results.csv"},
+    )
+
+
 @app.websocket("/ws/crawl")
 async def websocket_crawl(websocket: WebSocket):
     """
     WebSocket endpoint for crawling HSReplay data with progress updates.
     """
     await websocket.accept()
+    send = CountingSender(websocket)
+    ACTIVE_JOBS.labels("crawl").inc()
     
     try:
         # Receive crawler options
         data = await websocket.receive_json()
         options = CrawlerOptions(**data)
         
-        async def send_progress(phase: str, progress: float, message: str):
-            await websocket.send_json({
-                "phase": phase,
-                "progress": progress,
-                "message": message,
-                "completed": False
-            })
-        
-        # Run crawler in thread pool to not block
-        loop = asyncio.get_event_loop()
-        
-        # Progress tracking with asyncio
-        progress_queue = asyncio.Queue()
-        
-        def sync_progress_callback(phase: str, progress: float, message: str):
-            # Put progress in queue (sync -> async bridge)
-            asyncio.run_coroutine_threadsafe(
-                progress_queue.put((phase, progress, message)),
-                loop
-            )
-        
-        # Start crawler in executor
-        import concurrent.futures
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(
-                crawl_data,
-                options.league_rank_range,
-                options.game_type,
-                options.region,
-                options.time_range,
-                options.min_games,
-                sync_progress_callback
-            )
-            
-            # Send progress updates while waiting
-            while not future.done():
-                try:
-                    phase, progress, message = await asyncio.wait_for(
-                        progress_queue.get(),
-                        timeout=0.1
-                    )
-                    await send_progress(phase, progress, message)
-                except asyncio.TimeoutError:
-                    continue
-            
-            # Get result
-            matchups, deck_pct, archetypes, lineups = future.result()
-        
-        # Convert to response format
-        deck_names = matchups.columns.tolist()
-        matchup_values = matchups.values.tolist()
+        # Run crawler in the executor, progress is sent rate-limited
+        channel = ProgressChannel(send)
+        matchups, deck_pct, archetypes, lineups, games = await channel.run(
+            crawl_data,
+            options.league_rank_range,
+            options.game_type,
+            options.region,
+            options.time_range,
+            options.min_games,
+            channel.report
+        )
         
-        field_entries = [
-            {"deck": str(deck), "pct": float(pct)}
-            for deck, pct in deck_pct.items()
-        ]
+        # Keep the data server-side, calculations reference it by id
+        dataset = dataset_store.add(Dataset.from_crawl(matchups, deck_pct, archetypes, games))
+        # Build the outcome tables while the user looks at the data
+        precompute_store.schedule(dataset)
         
-        await websocket.send_json({
+        await send({
             "phase": "completed",
             "progress": 1.0,
-            "message": f"Done! Found {len(deck_names)} decks, {len(lineups)} possible lineups",
+            "message": f"Done! Found {len(dataset.deck_names)} decks, {len(lineups)} possible lineups",
             "completed": True,
+            "dataset_id": dataset.id,
             "matchups": {
-                "deck_names": deck_names,
-                "values": matchup_values
+                "deck_names": dataset.deck_names,
+                "values": dataset.matchups
             },
-            "field": {"entries": field_entries}
+            "field": {"entries": dataset.field},
+            "has_games": dataset.games is not None
         })
         
     except WebSocketDisconnect:
         pass
     except Exception as e:
-        await websocket.send_json({
+        await send({
             "phase": "error",
             "progress": 0,
             "message": str(e),
@@ -233,6 +420,8 @@ async def websocket_crawl(websocket: WebSocket):
             "error": str(e)
         })
     finally:
+        ACTIVE_JOBS.labels("crawl").dec()
+        WEBSOCKET_MESSAGES.labels("crawl").observe(send.count)
         await websocket.close()
 
 
@@ -242,175 +431,197 @@ async def websocket_calculate(websocket: WebSocket):
     WebSocket endpoint for calculating optimal lineups with progress updates.
     """
     await websocket.accept()
+    send = CountingSender(websocket)
+    ACTIVE_JOBS.labels("calculate").inc()
+    checkpoint = None
     
     try:
         # Receive calculation request
-        data = await websocket.receive_json()
-        
-        matchups_data = data.get("matchups", {})
-        field_data = data.get("field", {})
-        
-        deck_names = matchups_data.get("deck_names", [])
-        matchup_values = matchups_data.get("values", [])
-        field_entries = field_data.get("entries", [])
+        request = CalculateRequest(**await websocket.receive_json())
         
-        if not deck_names or not matchup_values or not field_entries:
-            await websocket.send_json({
+        async def send_error(message: str, error: str):
+            await send({
                 "phase": "error",
                 "progress": 0,
-                "message": "Missing matchups or field data",
-                "completed": True,
-                "error": "Missing matchups or field data"
-            })
-            return
-        
-        async def send_progress(phase: str, progress: float, message: str):
-            await websocket.send_json({
-                "phase": phase,
-                "progress": progress,
                 "message": message,
-                "completed": False
+                "completed": True,
+                "error": error
             })
         
-        loop = asyncio.get_event_loop()
-        
-        # Create DataFrames from input
-        matchups_df = pd.DataFrame(
-            matchup_values,
-            index=deck_names,
-            columns=deck_names
-        )
+        if request.dataset_id:
+            dataset = dataset_store.get(request.dataset_id)
+            if dataset is None:
+                await send_error("Dataset expired, please send the full data", "dataset_not_found")
+                return
+        elif request.matchups and request.field:
+            dataset = dataset_store.add(Dataset.from_upload(
+                request.matchups.deck_names,
+                request.matchups.values,
+                [entry.model_dump() for entry in request.field.entries]
+            ))
+        else:
+            await send_error("Missing matchups or field data", "Missing matchups or field data")
+            return
         
-        # Create archetypes DataFrame
-        # We need to infer class from deck name (HSReplay convention)
-        # For now, we'll create a simple structure
-        archetypes_data = []
-        class_map = {
-            'Warrior': 'WARRIOR', 'Paladin': 'PALADIN', 'Hunter': 'HUNTER',
-            'Rogue': 'ROGUE', 'Priest': 'PRIEST', 'Shaman': 'SHAMAN',
-            'Mage': 'MAGE', 'Warlock': 'WARLOCK', 'Druid': 'DRUID',
-            'Demon Hunter': 'DEMONHUNTER', 'Death Knight': 'DEATHKNIGHT'
-        }
+        try:
+            dataset = dataset_store.add(dataset.with_edits(request.matchup_edits, request.field_edits))
+        except KeyError as e:
+            await send_error(str(e.args[0]), "Invalid edits")
+            return
         
-        for i, name in enumerate(deck_names):
-            player_class = 'UNKNOWN'
-            for class_name, class_code in class_map.items():
-                if class_name in name:
-                    player_class = class_code
-                    break
-            archetypes_data.append({
-                'id': i,
-                'name': name,
-                'player_class_name': player_class
-            })
+        channel = ProgressChannel(send)
         
-        archetypes_df = pd.DataFrame(archetypes_data)
+        matchups_df = dataset.matchups_df()
+        archetypes_df = dataset.archetypes_df()
         
         # Validate we have at least 4 different classes
         unique_classes = archetypes_df['player_class_name'].nunique()
         if unique_classes < 4:
-            await websocket.send_json({
-                "phase": "error",
-                "progress": 0,
-                "message": f"Need at least 4 different classes, found {unique_classes}. Make sure deck names include the class name (e.g., 'Control Warrior').",
-                "completed": True,
-                "error": "Insufficient classes"
-            })
+            await send_error(
+                f"Need at least 4 different classes, found {unique_classes}. Make sure deck names include the class name (e.g., 'Control Warrior').",
+                "Insufficient classes"
+            )
             return
         
-        # Create deck_pct Series
-        deck_pct = pd.Series(
-            {entry["deck"]: entry["pct"] for entry in field_entries}
-        )
+        if request.uncertainty and dataset.games is None:
+            await send_error(
+                "Confidence intervals need the game counts of crawled HSReplay data.",
+                "Missing game counts"
+            )
+            return
+        
+        deck_pct = dataset.deck_pct()
+        
+        # Usually already built since the dataset arrived, edited matchups start a new build
+        precompute_store.schedule(dataset)
         
         # Generate lineups
-        await send_progress("generating_lineups", 0.05, "Generating possible lineups...")
+        channel.report("generating_lineups", 0.05, "Generating possible lineups...")
         
         classes = get_class_archetypes(archetypes_df)
         lineups = possible_lineups(classes)
         
-        await send_progress("generating_field", 0.1, f"Found {len(lineups)} possible lineups. Generating field...")
-        
-        # Generate field with progress
-        progress_queue = asyncio.Queue()
-        
-        def field_progress_callback(progress: float, message: str):
-            asyncio.run_coroutine_threadsafe(
-                progress_queue.put(("generating_field", 0.1 + progress * 0.3, message)),
-                loop
+        # Only the lineups the player can bring are calculated, the field uses all of them
+        hero_lineups = lineups
+        if request.hero_pool:
+            hero_pool = request.hero_pool
+            try:
+                hero_lineups = restricted_lineups(
+                    classes, hero_pool.allowed_decks, hero_pool.required_decks, hero_pool.excluded_classes
+                )
+            except ValueError as e:
+                await send_error(str(e), "Invalid hero pool")
+                return
+            if not hero_lineups:
+                await send_error("No lineup matches the hero pool", "Invalid hero pool")
+                return
+        
+        opponents = None
+        if request.opponents:
+            # Known opponents replace the artificial field
+            try:
+                opponents = opponent_field([opponent.model_dump() for opponent in request.opponents], archetypes_df)
+            except ValueError as e:
+                await send_error(str(e), "Invalid opponents")
+                return
+        
+        # Finished lineups and the generated field of an interrupted run with the same inputs are reused
+        if CHECKPOINT_DIR:
+            checkpoint = Checkpoint(
+                CHECKPOINT_DIR, fingerprint(matchups_df, deck_pct, lineups, hero_lineups, opponents)
             )
         
-        import concurrent.futures
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(
+        field = checkpoint.load_field() if checkpoint and opponents is None else None
+        if opponents is not None:
+            field = opponents
+            field_message = f"Ranking lineups against {len(field)} known opponents."
+        elif field is not None:
+            field_message = f"Resuming with the saved field of {len(field)} lineups."
+        else:
+            channel.report("generating_field", 0.1, f"Found {len(lineups)} possible lineups. Generating field...")
+            
+            # Generate field with progress
+            field = await channel.run(
                 generate_field,
                 deck_pct,
                 lineups,
-                field_progress_callback
-            )
-            
-            while not future.done():
-                try:
-                    phase, progress, message = await asyncio.wait_for(
-                        progress_queue.get(),
-                        timeout=0.1
-                    )
-                    await send_progress(phase, progress, message)
-                except asyncio.TimeoutError:
-                    continue
-            
-            field = future.result()
-        
-        await send_progress("calculating", 0.4, f"Field generated with {len(field)} lineups. Calculating win rates...")
-        
-        # Calculate lineups with progress
-        def calc_progress_callback(progress: float, message: str):
-            asyncio.run_coroutine_threadsafe(
-                progress_queue.put(("calculating", 0.4 + progress * 0.55, message)),
-                loop
+                channel.stage("generating_field", 0.1, 0.3)
             )
+            if checkpoint:
+                checkpoint.save_field(field)
+            field_message = f"Field generated with {len(field)} lineups."
+        
+        channel.report("calculating", 0.4, f"{field_message} Preparing outcome tables...")
+        precomputed = await channel.run(precompute_store.get, dataset)
+        
+        channel.report("calculating", 0.4, f"{field_message} Calculating win rates...")
+        
+        # Calculate lineups with progress, throughput and ETA
+        span = 0.3 if request.uncertainty else 0.55
+        # Per-pairing results only when they fit the memory budget, see pairings.py
+        pairings = None
+        if Pairings.size(len(hero_lineups), len(field)) <= PAIRINGS_MEMORY_MB * 2**20:
+            pairings = Pairings(len(hero_lineups), len(field))
+        results_df = await channel.run(
+            calculate_lineups,
+            matchups_df,
+            field,
+            hero_lineups,
+            archetypes_df,
+            channel.stage("calculating", 0.4, span, total=len(hero_lineups), unit="lineups"),
+            None,
+            checkpoint,
+            precomputed,
+            pairings
+        )
         
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(
-                calculate_lineups,
-                matchups_df,
+        result_set = ResultSet.from_dataframe(results_df, archetypes_df)
+        if pairings is not None:
+            result_set.attach_pairings(precomputed.deck_array(hero_lineups), pairings)
+        field_counts = field[4].to_numpy(dtype=np.float64)
+        result_set.set_inputs(
+            precomputed.matchups, precomputed.deck_array(field.values.tolist()), field_counts / field_counts.sum()
+        )
+        if request.uncertainty:
+            options = request.uncertainty
+            channel.report("bootstrap", 0.7, f"Bootstrapping {options.replicates} resampled matchup matrices...")
+            stats = await channel.run(
+                bootstrap_lineups,
+                precomputed,
+                np.array(dataset.games, dtype=np.float64),
                 field,
-                lineups,
-                archetypes_df,
-                calc_progress_callback
+                hero_lineups,
+                options.replicates,
+                options.method,
+                options.confidence,
+                options.seed,
+                channel.stage("bootstrap", 0.7, 0.25, total=options.replicates, unit="replicates")
             )
-            
-            while not future.done():
-                try:
-                    phase, progress, message = await asyncio.wait_for(
-                        progress_queue.get(),
-                        timeout=0.5
-                    )
-                    await send_progress(phase, progress, message)
-                except asyncio.TimeoutError:
-                    continue
-            
-            results_df = future.result()
+            result_set.attach_uncertainty(precomputed.deck_array(hero_lineups), stats, options.model_dump())
         
-        await send_progress("finalizing", 0.98, "Preparing results...")
+        channel.report("finalizing", 0.98, "Preparing results...")
+        await channel.flush()
         
-        # Convert results to response format
-        # Results DataFrame has deck names in columns 0-3 and win_rate in column 4
-        results = []
+        # Keep the full result set server-side, the client pages through it
+        result_id = uuid.uuid4().hex
+        result_store.add(result_id, result_set)
         
-        for _, row in results_df.head(100).iterrows():  # Return top 100
-            decks = [str(row[i]) for i in range(4)]
-            results.append({
-                "decks": decks,
-                "win_rate": float(row[4])
-            })
+        # The first page is sent along so the results view can render right away
+        first_page = result_set.query(limit=100)
+        results = [
+            {key: value for key, value in row.items() if key != "rank"}
+            for row in first_page["rows"]
+        ]
         
-        await websocket.send_json({
+        await send({
             "phase": "completed",
             "progress": 1.0,
             "message": f"Done! Calculated {len(results_df)} lineups",
             "completed": True,
-            "results": results
+            "results": results,
+            "result_id": result_id,
+            "dataset_id": dataset.id,
+            "total": len(result_set)
         })
         
     except WebSocketDisconnect:
@@ -418,7 +629,7 @@ async def websocket_calculate(websocket: WebSocket):
     except Exception as e:
         import traceback
         traceback.print_exc()
-        await websocket.send_json({
+        await send({
             "phase": "error",
             "progress": 0,
             "message": str(e),
@@ -426,6 +637,157 @@ async def websocket_calculate(websocket: WebSocket):
             "error": str(e)
         })
     finally:
+        if checkpoint:
+            checkpoint.close()
+        ACTIVE_JOBS.labels("calculate").dec()
+        WEBSOCKET_MESSAGES.labels("calculate").observe(send.count)
+        await websocket.close()
+
+
+@app.websocket("/ws/metagame")
+async def websocket_metagame(websocket: WebSocket):
+    """
+    WebSocket endpoint solving the lineup x lineup metagame with progress updates.
+    """
+    await websocket.accept()
+    send = CountingSender(websocket)
+    ACTIVE_JOBS.labels("metagame").inc()
+    matrix_dir = None
+    
+    try:
+        request = MetagameRequest(**await websocket.receive_json())
+        
+        dataset = dataset_store.get(request.dataset_id)
+        if dataset is None:
+            raise ValueError("Dataset expired, please send the full data")
+        
+        channel = ProgressChannel(send)
+        channel.report("preparing", 0.02, "Preparing outcome tables...")
+        precomputed = await channel.run(precompute_store.get, dataset)
+        
+        if request.result_id:
+            result_set = get_result_set(request.result_id)
+            rows = result_set.decks[:request.top or len(result_set)]
+            lineup_decks = precomputed.deck_array([[result_set.names[d] for d in row] for row in rows])
+        else:
+            lineup_decks = precomputed.lineup_decks[:request.top]
+        size = len(lineup_decks)
+        
+        # Big matrices live in a memory mapped file for the duration of the job
+        path = None
+        if size * size * 4 > METAGAME_MAX_MATRIX_MB * 2 ** 20:
+            matrix_dir = tempfile.mkdtemp(prefix="metagame-", dir=METAGAME_DIR or None)
+            path = os.path.join(matrix_dir, "payoffs.npy")
+        
+        channel.report("payoffs", 0.05, f"Solving {size * (size - 1) // 2} lineup pairs...")
+        matrix = await channel.run(
+            payoff_matrix,
+            precomputed,
+            lineup_decks,
+            path,
+            channel.stage("payoffs", 0.05, 0.8, total=size * (size - 1) // 2, unit="pairs")
+        )
+        
+        channel.report("equilibrium", 0.85, "Solving the equilibrium...")
+        mixture, payoffs = await channel.run(
+            symmetric_equilibrium,
+            matrix,
+            request.iterations,
+            channel.stage("equilibrium", 0.85, 0.13)
+        )
+        await channel.flush()
+        
+        def lineup(index: int) -> dict:
+            return {
+                "decks": [precomputed.deck_names[d] for d in lineup_decks[index]],
+                "weight": float(mixture[index]),
+                "win_rate": float(payoffs[index]),
+            }
+        
+        support = np.flatnonzero(mixture)
+        support = support[np.argsort(-mixture[support], kind="stable")]
+        best = np.argsort(-payoffs, kind="stable")[:20]
+        await send({
+            "phase": "completed",
+            "progress": 1.0,
+            "message": f"Done! Equilibrium of {size} lineups",
+            "completed": True,
+            "lineups": size,
+            # Best win rate against the mixture minus 0.5, 0 at an exact equilibrium
+            "exploitability": float(payoffs.max() - 0.5),
+            "equilibrium": [lineup(index) for index in support[:200]],
+            "best_responses": [lineup(index) for index in best],
+        })
+        
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        await send({
+            "phase": "error",
+            "progress": 0,
+            "message": detail,
+            "completed": True,
+            "error": detail
+        })
+    finally:
+        if matrix_dir:
+            shutil.rmtree(matrix_dir, ignore_errors=True)
+        ACTIVE_JOBS.labels("metagame").dec()
+        WEBSOCKET_MESSAGES.labels("metagame").observe(send.count)
+        await websocket.close()
+
+
+@app.websocket("/ws/evolve")
+async def websocket_evolve(websocket: WebSocket):
+    """
+    WebSocket endpoint evolving the field of a calculation with progress updates.
+    Only the first evolution of a calculation evaluates lineups, later ones are instant.
+    """
+    await websocket.accept()
+    send = CountingSender(websocket)
+    ACTIVE_JOBS.labels("evolve").inc()
+    
+    try:
+        request = EvolutionRequest(**await websocket.receive_json())
+        result_set = get_result_set(request.result_id)
+        
+        channel = ProgressChannel(send)
+        channel.report("evaluating", 0.0, "Evaluating lineups against the field...")
+        evolution = await channel.run(
+            result_set.evolution,
+            request.report_steps,
+            request.dynamics,
+            request.rate,
+            request.top,
+            channel.stage("evaluating", 0.0, 0.95, total=len(result_set), unit="lineups")
+        )
+        # The evolution's values count toward the pairings memory budget
+        result_store.trim_pairs()
+        await channel.flush()
+        
+        await send({
+            "phase": "completed",
+            "progress": 1.0,
+            "message": f"Done! Evolved the field for {max(request.report_steps)} steps",
+            "completed": True,
+            **evolution,
+        })
+        
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        await send({
+            "phase": "error",
+            "progress": 0,
+            "message": detail,
+            "completed": True,
+            "error": detail
+        })
+    finally:
+        ACTIVE_JOBS.labels("evolve").dec()
+        WEBSOCKET_MESSAGES.labels("evolve").observe(send.count)
         await websocket.close()
 
 
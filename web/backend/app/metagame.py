@@ -0,0 +1,168 @@
+"""
+Lineup x lineup metagame and its equilibrium.
+
+Instead of scoring lineups against a fixed field, the metagame mode plays
+every lineup of a pool against every other one, then finds the mixture of
+lineups no lineup can beat on average: what a fully adapted field looks like.
+
+    payoff matrix   M[a, b] = win rate of lineup a against lineup b, ban
+                    phase included. The matrix is antisymmetric
+                    (M[b, a] = 1 - M[a, b]), so only the blocks on and above
+                    the diagonal are solved, in parallel, and mirrored. Big
+                    matrices are memory mapped to a file.
+    equilibrium     symmetric fictitious play, the same method as the ban
+                    phase solver, with each iteration reading one row of M
+"""
+import os
+import time
+from multiprocessing import Pool
+from typing import Callable, Optional
+
+import numpy as np
+
+from .calculator import WARM_BATCH_GAMES
+from .metrics import PoolMonitor
+from .precompute import Precomputed, conquest_table, solve_batch
+
+# Lineups per side of a block of the payoff matrix
+BLOCK_LINEUPS = 512
+
+
+# Constant inputs of the running payoff matrix, set in each pool worker
+_metagame = None
+
+
+def init_metagame_worker(table, matchups, triple_decks, lineup_triples) -> None:
+    """Pool initializer shipping the lineup index to a worker once."""
+    global _metagame
+    _metagame = (table, matchups, triple_decks, lineup_triples)
+
+
+def solve_block(block: tuple[int, int, int, int]) -> tuple[tuple, np.ndarray, float, float]:
+    """
+    Win rates of the lineups of a row block against those of a column block.
+
+    On the diagonal only the pairs above it are solved.
+
+    Returns:
+        Tuple of (block, values as float32, start time, seconds spent)
+    """
+    started = time.time()
+    table, matchups, triple_decks, lineup_triples = _metagame
+    row_start, row_stop, col_start, col_stop = block
+    rows, columns = lineup_triples[row_start:row_stop], lineup_triples[col_start:col_stop]
+    if table is None:
+        # Outcome table of just the triples of this block
+        needed_rows, rows = np.unique(rows, return_inverse=True)
+        needed_columns, columns = np.unique(columns, return_inverse=True)
+        table = conquest_table(matchups, triple_decks[needed_rows], triple_decks[needed_columns])
+        rows, columns = rows.reshape(-1, 4), columns.reshape(-1, 4)
+
+    if row_start == col_start:
+        a, b = np.triu_indices(len(rows), 1)
+    else:
+        a, b = (index.ravel() for index in np.indices((len(rows), len(columns))))
+    values = np.empty(len(a), dtype=np.float32)
+    for start in range(0, len(a), WARM_BATCH_GAMES):
+        stop = start + WARM_BATCH_GAMES
+        # banlists[p, i, j]: row lineup of pair p without deck i against its column lineup without deck j
+        banlists = table[rows[a[start:stop], :, None], columns[b[start:stop], None, :]]
+        values[start:stop] = solve_batch(banlists)[2]
+    return block, values, started, time.time() - started
+
+
+def payoff_matrix(
+    precomputed: Precomputed,
+    lineup_decks: np.ndarray,
+    path: Optional[str] = None,
+    progress_callback: Optional[Callable[[float, str], None]] = None,
+    max_workers: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Win rate of every lineup of a pool against every other one.
+
+    Args:
+        precomputed: Lineup index and outcome table of the matchups
+        lineup_decks: Deck ids of the lineups of the pool, shape (lineups, 4)
+        path: .npy file to memory map the matrix to (None keeps it in memory)
+        progress_callback: Optional callback(progress, message)
+        max_workers: Maximum parallel workers (None = auto)
+
+    Returns:
+        float32 array (lineups, lineups), M[a, b] = 1 - M[b, a]
+    """
+    lineup_triples = precomputed.triples(lineup_decks)
+    size = len(lineup_triples)
+    if path:
+        matrix = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(size, size))
+    else:
+        matrix = np.empty((size, size), dtype=np.float32)
+    np.fill_diagonal(matrix, 0.5)
+
+    starts = range(0, size, BLOCK_LINEUPS)
+    blocks = [
+        (rows, min(rows + BLOCK_LINEUPS, size), columns, min(columns + BLOCK_LINEUPS, size))
+        for rows in starts for columns in starts if columns >= rows
+    ]
+    initargs = (precomputed.table, precomputed.matchups, precomputed.triple_decks, lineup_triples)
+    monitor = PoolMonitor(max_workers or os.cpu_count() or 1, "metagame")
+    with Pool(processes=max_workers, initializer=init_metagame_worker, initargs=initargs) as pool, monitor:
+        for done, (block, values, started, seconds) in enumerate(pool.imap_unordered(solve_block, blocks), 1):
+            monitor.record(started, seconds)
+            row_start, row_stop, col_start, col_stop = block
+            if row_start == col_start:
+                a, b = np.triu_indices(row_stop - row_start, 1)
+                matrix[row_start + a, row_start + b] = values
+                matrix[row_start + b, row_start + a] = 1 - values
+            else:
+                values = values.reshape(row_stop - row_start, col_stop - col_start)
+                matrix[row_start:row_stop, col_start:col_stop] = values
+                matrix[col_start:col_stop, row_start:row_stop] = 1 - values.T
+            if progress_callback:
+                progress_callback(done / len(blocks), f"Solving lineup pairs... block {done}/{len(blocks)}")
+
+    if path:
+        matrix.flush()
+    return matrix
+
+
+def symmetric_equilibrium(
+    matrix: np.ndarray,
+    iterations: int = 10000,
+    progress_callback: Optional[Callable[[float, str], None]] = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Equilibrium mixture of lineups of a symmetric metagame, by fictitious play.
+
+    Every iteration the field adds one copy of the best lineup against
+    itself. Against lineup b, lineup a scores M[a, b] = 1 - M[b, a], so the
+    running payoffs only need row b of the matrix.
+
+    Args:
+        matrix: Payoff matrix, see payoff_matrix
+        iterations: Fictitious play iterations
+        progress_callback: Optional callback(progress, message)
+
+    Returns:
+        Tuple of (mixture, win rate of each lineup against the mixture).
+        The best win rate minus 0.5 is how far the mixture is from an
+        exact equilibrium.
+    """
+    size = len(matrix)
+    counts = np.zeros(size, dtype=np.int64)
+    cum_payoff = np.zeros(size)
+    best = 0
+    report_every = max(1, iterations // 100)
+    for iteration in range(iterations):
+        counts[best] += 1
+        cum_payoff += 1 - matrix[best]
+        best = cum_payoff.argmax()
+        if progress_callback and (iteration + 1) % report_every == 0:
+            progress_callback((iteration + 1) / iterations, f"Solving the equilibrium... {iteration + 1}/{iterations}")
+
+    mixture = counts / iterations
+    support = np.flatnonzero(counts)
+    payoffs = np.empty(size)
+    for start in range(0, size, BLOCK_LINEUPS):
+        payoffs[start:start + BLOCK_LINEUPS] = matrix[start:start + BLOCK_LINEUPS, support] @ mixture[support]
+    return mixture, payoffs
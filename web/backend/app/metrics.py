@@ -0,0 +1,268 @@
+"""
+Prometheus-style metrics.
+
+A minimal in-process registry rendered in the Prometheus text format by
+GET /metrics. Pool workers don't touch it: they return their timings with
+their results and the parent process records them.
+"""
+import bisect
+import functools
+import math
+import time
+from threading import Lock
+from typing import Optional
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+SOLVE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MESSAGE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_registry: list["_Metric"] = []
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = Lock()
+        self._children: dict[tuple, "_Metric"] = {}
+        self._labelvalues: tuple = ()
+        _registry.append(self)
+
+    def labels(self, *values: str) -> "_Metric":
+        """Series for one combination of label values."""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        values = tuple(str(value) for value in values)
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._new_child()
+                child._labelvalues = values
+                self._children[values] = child
+            return child
+
+    def _new_child(self) -> "_Metric":
+        child = object.__new__(type(self))
+        child.name = self.name
+        child.labelnames = self.labelnames
+        child._lock = Lock()
+        child._copy_config(self)
+        child._init_value()
+        return child
+
+    def _copy_config(self, parent: "_Metric") -> None:
+        pass
+
+    def _series(self) -> list["_Metric"]:
+        if self.labelnames:
+            with self._lock:
+                return list(self._children.values())
+        return [self]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for series in self._series():
+            lines.extend(series._render_samples())
+        return lines
+
+
+class Gauge(_Metric):
+    """Value that goes up and down."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._init_value()
+
+    def _init_value(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def _render_samples(self) -> list[str]:
+        labels = _format_labels(self.labelnames, self._labelvalues)
+        return [f"{self.name}{labels} {_format_value(self.value)}"]
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DURATION_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames)
+        self._init_value()
+
+    def _copy_config(self, parent: "Histogram") -> None:
+        self.buckets = parent.buckets
+
+    def _init_value(self) -> None:
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+
+    def observe(self, value: float, count: int = 1) -> None:
+        """Record `count` observations of `value`."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += count
+            self.sum += value * count
+
+    def time(self) -> "_Timer":
+        """Context manager or decorator observing the elapsed seconds."""
+        return _Timer(self)
+
+    def _render_samples(self) -> list[str]:
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, self._labelvalues, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, self._labelvalues)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.start: Optional[float] = None
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.start)
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.histogram):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class CountingSender:
+    """Wraps websocket.send_json and counts the messages sent."""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.count = 0
+
+    async def __call__(self, data: dict) -> None:
+        self.count += 1
+        await self.websocket.send_json(data)
+
+
+class PoolMonitor:
+    """
+    Records the timings pool workers return with their results.
+
+    Used as a context manager around the pool, it counts the pool's processes
+    in POOL_WORKERS and keeps POOL_UTILIZATION up to date, both labeled with
+    the kind of work (`task`). Every task's time goes to POOL_TASK_DURATION,
+    lineup calculations also report their per-lineup time.
+    """
+
+    def __init__(self, processes: int, task: str):
+        self.processes = processes
+        self.task = task
+        self.busy = 0.0
+        self.dispatched = 0.0
+
+    def __enter__(self) -> "PoolMonitor":
+        POOL_WORKERS.labels(self.task).inc(self.processes)
+        self.dispatched = time.time()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        POOL_WORKERS.labels(self.task).dec(self.processes)
+
+    def record(self, started: float, seconds: float, lineups: int = 0) -> None:
+        """
+        Record one finished task.
+
+        Args:
+            started: Wall clock time (time.time) the worker started the task
+            seconds: Time the worker spent on it
+            lineups: Number of lineups the task solved against the field,
+                for LINEUP_SOLVE_DURATION (0 = not a lineup calculation)
+        """
+        QUEUE_WAIT.labels("pool").observe(max(0.0, started - self.dispatched))
+        POOL_TASK_DURATION.labels(self.task).observe(seconds)
+        if lineups:
+            LINEUP_SOLVE_DURATION.observe(seconds / lineups, lineups)
+        self.busy += seconds
+        elapsed = time.time() - self.dispatched
+        if elapsed > 0:
+            POOL_UTILIZATION.labels(self.task).set(min(1.0, self.busy / (elapsed * self.processes)))
+
+
+CRAWL_DURATION = Histogram(
+    "hs_crawl_duration_seconds", "Time to crawl matchups and archetypes from HSReplay."
+)
+FIELD_GENERATION_DURATION = Histogram(
+    "hs_field_generation_duration_seconds", "Time to generate the artificial field."
+)
+CALCULATION_DURATION = Histogram(
+    "hs_calculation_duration_seconds", "Time to calculate the win rates of all lineups."
+)
+LINEUP_SOLVE_DURATION = Histogram(
+    "hs_lineup_solve_duration_seconds", "Worker time to solve one lineup against the field.",
+    buckets=SOLVE_BUCKETS,
+)
+POOL_TASK_DURATION = Histogram(
+    "hs_pool_task_duration_seconds", "Worker time per pool task, by kind of work.",
+    labelnames=("task",),
+)
+QUEUE_WAIT = Histogram(
+    "hs_queue_wait_seconds", "Time work waited before starting, in the thread executor or the process pool.",
+    labelnames=("queue",),
+)
+WEBSOCKET_MESSAGES = Histogram(
+    "hs_websocket_messages", "Messages sent per websocket connection.",
+    labelnames=("endpoint",), buckets=MESSAGE_BUCKETS,
+)
+ACTIVE_JOBS = Gauge("hs_active_jobs", "Crawls and calculations running.", labelnames=("kind",))
+POOL_WORKERS = Gauge("hs_pool_workers", "Processes in running pools, by kind of work.", labelnames=("task",))
+POOL_UTILIZATION = Gauge(
+    "hs_pool_utilization", "Share of pool worker time spent on tasks in the latest pool of each kind of work (0-1).",
+    labelnames=("task",),
+)
@@ -39,10 +39,61 @@ class FieldData(BaseModel):
     entries: list[FieldEntry]
 
 
+class UncertaintyOptions(BaseModel):
+    """Bootstrap of the matchups from their HSReplay game counts."""
+    replicates: int = Field(default=100, ge=10, le=1000)
+    method: str = Field(default="beta", pattern="^(beta|binomial)$")
+    confidence: float = Field(default=0.95, gt=0, lt=1)
+    seed: int = 0
+
+
+class OpponentLineup(BaseModel):
+    """Known opponent lineup, `probability` of facing it when known."""
+    decks: list[str] = Field(min_length=4, max_length=4)
+    probability: Optional[float] = Field(default=None, ge=0, le=1)
+
+
+class HeroPool(BaseModel):
+    """Decks the player can bring, only matching lineups are calculated."""
+    allowed_decks: Optional[list[str]] = None  # None allows every deck
+    required_decks: list[str] = []
+    excluded_classes: list[str] = []
+
+
 class CalculateRequest(BaseModel):
-    """Request to calculate optimal lineups."""
-    matchups: MatchupMatrix
-    field: FieldData
+    """
+    Request to calculate optimal lineups.
+    References a server-side dataset and sends only the edits made to it.
+    Full matchups and field are still accepted when there is no dataset.
+    """
+    dataset_id: Optional[str] = None
+    matchup_edits: list[MatchupEntry] = []
+    field_edits: list[FieldEntry] = []
+    matchups: Optional[MatchupMatrix] = None
+    field: Optional[FieldData] = None
+    uncertainty: Optional[UncertaintyOptions] = None  # adds confidence intervals, needs crawled data
+    opponents: Optional[list[OpponentLineup]] = Field(default=None, min_length=1)  # replaces the generated field
+    hero_pool: Optional[HeroPool] = None  # the field still uses every lineup
+
+
+class MetagameRequest(BaseModel):
+    """
+    Request to solve the lineup x lineup metagame of a dataset.
+    The pool is every possible lineup, or the best `top` lineups of a calculation.
+    """
+    dataset_id: str
+    result_id: Optional[str] = None
+    top: Optional[int] = Field(default=None, ge=2)
+    iterations: int = Field(default=10000, ge=100, le=1000000)
+
+
+class EvolutionRequest(BaseModel):
+    """Request to evolve the field of a calculation and rank lineups along the way."""
+    result_id: str
+    report_steps: list[int] = Field(default=[0, 10, 50, 100], min_length=1)
+    dynamics: str = Field(default="replicator", pattern="^(replicator|best_response)$")
+    rate: float = Field(default=0.5, gt=0, le=1)
+    top: int = Field(default=20, ge=1, le=100)
 
 
 class LineupResult(BaseModel):
@@ -68,4 +119,5 @@ class CrawlerStatus(BaseModel):
     completed: bool = False
     matchups: Optional[MatchupMatrix] = None
     field: Optional[FieldData] = None
+    dataset_id: Optional[str] = None
     error: Optional[str] = None
@@ -0,0 +1,120 @@
+"""
+Per-pairing results of a calculation.
+
+The calculation solves the ban phase of every (lineup, field lineup) pair
+and used to keep only each lineup's weighted average. Keeping the pairs
+lets the results view break any lineup down (best and worst opponents,
+its decks, its bans) without solving anything again.
+
+They are stored compactly, 10 bytes per pair:
+
+    values        uint16 fixed point, value * 65535 (error below 1e-5)
+    hero_bans     uint8 share of the equilibrium each lineup deck is banned in, * 255
+    villain_bans  uint8 the same for each deck of the field lineup
+
+That is still 10 bytes times lineups times field lineups per calculation, so
+the result store keeps them within PAIRINGS_MEMORY_MB: calculations that
+don't fit are run without pairings, and the pairings of the least recently
+used result sets are moved to their artifact (memory mapped) or dropped.
+"""
+import os
+from typing import Optional
+
+import numpy as np
+
+VALUE_SCALE = 65535
+BAN_SCALE = 255
+# Stored arrays, saved as <name>.npy
+ARRAYS = ("values", "hero_bans", "villain_bans", "filled")
+
+
+class Pairings:
+    """
+    Values and equilibrium bans of every lineup against every field lineup.
+
+    Rows are lineup ids (positions in the calculation's lineup list), so
+    rows finished by a restored checkpoint stay empty.
+    """
+
+    def __init__(self, num_lineups: int, num_opponents: int):
+        self.values = np.zeros((num_lineups, num_opponents), dtype=np.uint16)
+        self.hero_bans = np.zeros((num_lineups, num_opponents, 4), dtype=np.uint8)
+        self.villain_bans = np.zeros((num_lineups, num_opponents, 4), dtype=np.uint8)
+        self.filled = np.zeros(num_lineups, dtype=bool)
+
+    def record(self, lineup_ids: list, values: np.ndarray, rowcnt: np.ndarray, colcnt: np.ndarray) -> None:
+        """
+        Store solved pairs.
+
+        Args:
+            lineup_ids: Lineup ids of the rows
+            values: Game values, shape (lineups, opponents)
+            rowcnt: Solver row counts, shape (lineups, opponents, 4)
+            colcnt: Solver column counts, shape (lineups, opponents, 4)
+        """
+        iterations = rowcnt.sum(axis=-1, keepdims=True)
+        self.values[lineup_ids] = np.rint(np.clip(values, 0, 1) * VALUE_SCALE)
+        self.hero_bans[lineup_ids] = np.rint(rowcnt * BAN_SCALE / iterations)
+        self.villain_bans[lineup_ids] = np.rint(colcnt * BAN_SCALE / iterations)
+        self.filled[lineup_ids] = True
+
+    def reorder(self, lineup_ids: np.ndarray) -> "Pairings":
+        """Pairings with rows in another order, e.g. the result set's."""
+        pairings = Pairings.__new__(Pairings)
+        pairings.values = self.values[lineup_ids]
+        pairings.hero_bans = self.hero_bans[lineup_ids]
+        pairings.villain_bans = self.villain_bans[lineup_ids]
+        pairings.filled = self.filled[lineup_ids]
+        return pairings
+
+    def lineup(self, row: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Decoded pairs of one row.
+
+        Returns:
+            Tuple of (values (opponents,), hero_bans (opponents, 4), villain_bans (opponents, 4))
+        """
+        return (
+            self.values[row] / VALUE_SCALE,
+            self.hero_bans[row] / BAN_SCALE,
+            self.villain_bans[row] / BAN_SCALE,
+        )
+
+    def value_matrix(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Decoded values of some rows (None = all) as float32, shape (rows, opponents)."""
+        values = self.values if rows is None else self.values[rows]
+        return values.astype(np.float32) / VALUE_SCALE
+
+    @staticmethod
+    def size(num_lineups: int, num_opponents: int) -> int:
+        """Bytes the pairings of a calculation take."""
+        return num_lineups * (num_opponents * 10 + 1)
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.hero_bans.nbytes + self.villain_bans.nbytes
+
+    @property
+    def in_memory(self) -> bool:
+        """False once saved and memory mapped, see save."""
+        return not isinstance(self.values, np.memmap)
+
+    def save(self, directory: str) -> "Pairings":
+        """
+        Write the arrays to a directory.
+
+        Returns:
+            The same pairings memory mapped from the files
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        return Pairings.load(directory)
+
+    @staticmethod
+    def load(directory: str) -> "Pairings":
+        """Pairings memory mapped (read only) from a directory written by save."""
+        pairings = Pairings.__new__(Pairings)
+        for name in ARRAYS:
+            setattr(pairings, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r"))
+        return pairings
@@ -0,0 +1,309 @@
+"""
+Precomputed lookup structures for lineup calculations.
+
+Everything a calculation needs that only depends on the matchups is built
+once per dataset, in the background as soon as the dataset arrives:
+
+    lineup index   all possible lineups as deck ids (lineups x 4), and for
+                   each lineup the ids of its 4 deck triples (the triple
+                   left after banning deck i is column i)
+    outcome table  conquest_bo5 win rate of every hero triple against every
+                   villain triple (triples x triples)
+
+A ban matrix is then a 4x4 lookup into the outcome table, and the ban
+phases of many matchups are solved together with a batched version of the
+fictitious play solver. Results are bit for bit the same as the scalar path.
+"""
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .config import BAN_CACHE_SIZE, MAX_PRECOMPUTED, PRECOMPUTE_MAX_TABLE_MB
+from .crawler import get_class_archetypes, possible_lineups
+
+# Outcome table cells computed per vectorized block
+BLOCK_CELLS = 1 << 15
+
+
+class _MatrixRows:
+    """
+    Lets conquest_bo5 run on arrays of deck ids.
+
+    `mups[h][v]` becomes `matrix[h, v]`, so the scalar formula evaluates a
+    whole block of triple pairs with the same operations in the same order.
+    The formula reads each of the 9 cells many times, so lookups are cached.
+    """
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = matrix
+        self.cells = {}
+
+    def __getitem__(self, hero):
+        return _MatrixRow(self, hero)
+
+
+class _MatrixRow:
+    def __init__(self, rows: _MatrixRows, hero):
+        self.rows = rows
+        self.hero = hero
+
+    def __getitem__(self, villain):
+        key = (id(self.hero), id(villain))
+        cell = self.rows.cells.get(key)
+        if cell is None:
+            cell = self.rows.cells[key] = self.rows.matrix[self.hero, villain]
+        return cell
+
+
+def conquest_table(matchups: np.ndarray, hero_triples: np.ndarray, villain_triples: np.ndarray) -> np.ndarray:
+    """
+    Conquest Bo5 win rates of hero triples (rows) against villain triples (columns).
+
+    Args:
+        matchups: Normalized (0-1) matchup matrix
+        hero_triples: Deck ids, shape (rows, 3)
+        villain_triples: Deck ids, shape (columns, 3)
+    """
+    from .calculator import conquest_bo5
+
+    table = np.empty((len(hero_triples), len(villain_triples)))
+    if table.size == 0:
+        return table
+    v1, v2, v3 = (villain_triples[None, :, k] for k in range(3))
+    step = max(1, BLOCK_CELLS // len(villain_triples))
+    for start in range(0, len(hero_triples), step):
+        block = hero_triples[start:start + step]
+        h1, h2, h3 = (block[:, None, k] for k in range(3))
+        mups = _MatrixRows(matchups)
+        table[start:start + step] = conquest_bo5(mups, h1, h2, h3, v1, v2, v3)
+    return table
+
+
+def solve_batch(payoffs: np.ndarray, iterations: int = 1000) -> tuple:
+    """
+    Solve many payoff matrices at once, see calculator.solve.
+
+    Args:
+        payoffs: Payoff matrices, shape (games, rows, columns)
+
+    Returns:
+        Tuple of (row_counts, col_counts, values_of_games) arrays
+    """
+    games, numrows, numcols = payoffs.shape
+    game = np.arange(games)
+    row_cum_payoff = np.zeros((games, numrows))
+    col_cum_payoff = np.zeros((games, numcols))
+    rowcnt = np.zeros((games, numrows), dtype=np.int64)
+    colcnt = np.zeros((games, numcols), dtype=np.int64)
+    active = np.zeros(games, dtype=np.intp)
+
+    # argmin/argmax return the first index on ties, like the scalar solver
+    for _ in range(iterations):
+        rowcnt[game, active] += 1
+        col_cum_payoff += payoffs[game, active, :]
+        active = col_cum_payoff.argmin(axis=1)
+        colcnt[game, active] += 1
+        row_cum_payoff += payoffs[game, :, active]
+        active = row_cum_payoff.argmax(axis=1)
+
+    values = (row_cum_payoff.max(axis=1) + col_cum_payoff.min(axis=1)) / 2.0 / iterations
+    return rowcnt, colcnt, values
+
+
+def lineup_values(
+    matchups: np.ndarray, hero_decks: np.ndarray, villain_decks: np.ndarray, iterations: int = 1000
+) -> np.ndarray:
+    """
+    Win rates of lineups against lineups, ban phase included.
+
+    The same numbers the calculation uses for each pairing: conquest_bo5
+    outcome table of their triples, then the batched solver.
+
+    Args:
+        matchups: Normalized (0-1) matchup matrix
+        hero_decks: Deck ids, shape (heroes, 4)
+        villain_decks: Deck ids, shape (villains, 4)
+
+    Returns:
+        Array (heroes, villains)
+    """
+    keep = [[k for k in range(4) if k != ban] for ban in range(4)]
+    heroes, villains = len(hero_decks), len(villain_decks)
+    table = conquest_table(
+        matchups, hero_decks[:, keep].reshape(-1, 3), villain_decks[:, keep].reshape(-1, 3)
+    )
+    # banlists[h, v, i, j]: hero h without deck i against villain v without deck j
+    banlists = table.reshape(heroes, 4, villains, 4).transpose(0, 2, 1, 3).reshape(-1, 4, 4)
+    values = np.empty(len(banlists))
+    step = max(1, BLOCK_CELLS // 4)
+    for start in range(0, len(banlists), step):
+        values[start:start + step] = solve_batch(banlists[start:start + step], iterations)[2]
+    return values.reshape(heroes, villains)
+
+
+class Precomputed:
+    """
+    Lineup index and outcome table of one matchup matrix.
+
+    The full outcome table is only kept when it fits in PRECOMPUTE_MAX_TABLE_MB;
+    otherwise the columns needed by a field are computed when calculating.
+    """
+
+    def __init__(self, matchups: pd.DataFrame, archetypes: pd.DataFrame, max_table_mb: float = PRECOMPUTE_MAX_TABLE_MB):
+        self.deck_names = matchups.columns.tolist()
+        self.deck_ids = {name: i for i, name in enumerate(self.deck_names)}
+        self.matchups = (matchups / 100).values
+        self.lineups = possible_lineups(get_class_archetypes(archetypes))
+        self.lineup_decks = self.deck_array(self.lineups)
+
+        # Every triple shows up in the same deck order in all lineups (class order),
+        # so keys of ordered triples identify them
+        lineup_triple_keys = self._triple_keys(self.lineup_decks)
+        self.triple_keys, lineup_triples = np.unique(lineup_triple_keys, return_inverse=True)
+        self.lineup_triples = lineup_triples.reshape(-1, 4)
+        n = len(self.deck_names)
+        self.triple_decks = np.column_stack([
+            self.triple_keys // (n * n), self.triple_keys // n % n, self.triple_keys % n
+        ])
+
+        self.table = None
+        if len(self.triple_keys) ** 2 * 8 <= max_table_mb * 2 ** 20:
+            self.table = conquest_table(self.matchups, self.triple_decks, self.triple_decks)
+
+        # Triple ids by deck set, for lineups given in any deck order (built on first use)
+        self._triple_ids: Optional[dict[frozenset, int]] = None
+        self._ban_phases: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._ban_lock = Lock()
+
+    def deck_array(self, lineups: list) -> np.ndarray:
+        """Deck ids of lineups given by deck names, shape (lineups, 4)."""
+        ids = [[self.deck_ids[deck] for deck in line[:4]] for line in lineups]
+        return np.array(ids, dtype=np.intp).reshape(-1, 4)
+
+    def triples(self, decks: np.ndarray) -> np.ndarray:
+        """Triple ids of lineups given by deck ids, shape (lineups, 4)."""
+        keys = self._triple_keys(decks)
+        ids = np.searchsorted(self.triple_keys, keys)
+        if ids.size and (ids.max() >= len(self.triple_keys) or (self.triple_keys[ids] != keys).any()):
+            raise ValueError("Lineups don't match the precomputed lineup index")
+        return ids
+
+    def field_table(self, field_triples: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Outcome table covering the triples of a field.
+
+        Only the columns of the field's triples are kept, so pool workers
+        receive a table sized by the field (a few columns for a handful of
+        known opponents) instead of the full one.
+
+        Returns:
+            Tuple of (table, columns) where columns has the shape of
+            field_triples and holds the table column of each triple
+        """
+        needed, columns = np.unique(field_triples, return_inverse=True)
+        if self.table is not None:
+            table = self.table[:, needed]
+        else:
+            table = conquest_table(self.matchups, self.triple_decks, self.triple_decks[needed])
+        return table, columns.reshape(field_triples.shape)
+
+    def ban_phase(self, hero: list[int], villain: list[int]) -> tuple[np.ndarray, list[int], list[int], float]:
+        """
+        Ban matrix and solved ban phase of one pairing.
+
+        The 16 win rates are looked up in the outcome table when it's kept
+        and both lineups are in the lineup index (decks in any order), and
+        solved pairings are kept in an LRU cache of BAN_CACHE_SIZE entries.
+
+        Args:
+            hero: Deck ids of the hero lineup
+            villain: Deck ids of the villain lineup
+
+        Returns:
+            Tuple of (ban matrix, row_counts, col_counts, value_of_game), see
+            calculator.ban_list_bo5 and calculator.solve
+        """
+        from .calculator import ban_list_bo5, solve
+
+        key = (tuple(hero), tuple(villain))
+        with self._ban_lock:
+            phase = self._ban_phases.get(key)
+            if phase is not None:
+                self._ban_phases.move_to_end(key)
+                return phase
+
+        rows, columns = self._lineup_triple_ids(hero), self._lineup_triple_ids(villain)
+        if self.table is not None and rows is not None and columns is not None:
+            banlist = self.table[np.ix_(rows, columns)]
+        else:
+            banlist = np.array(ban_list_bo5(self.matchups.tolist(), list(hero), list(villain)))
+        phase = (banlist, *solve(banlist.tolist()))
+
+        with self._ban_lock:
+            self._ban_phases[key] = phase
+            while len(self._ban_phases) > BAN_CACHE_SIZE:
+                self._ban_phases.popitem(last=False)
+        return phase
+
+    def _lineup_triple_ids(self, decks: list[int]) -> Optional[list[int]]:
+        """Triple ids left after banning each deck, None if the lineup isn't indexed."""
+        if self._triple_ids is None:
+            self._triple_ids = {frozenset(triple): i for i, triple in enumerate(self.triple_decks.tolist())}
+        ids = [self._triple_ids.get(frozenset(decks[:ban] + decks[ban + 1:])) for ban in range(len(decks))]
+        return None if None in ids else ids
+
+    def _triple_keys(self, decks: np.ndarray) -> np.ndarray:
+        """Key of the triple left after banning each deck, shape (lineups, 4)."""
+        n = len(self.deck_names)
+        keys = np.empty(decks.shape, dtype=np.int64)
+        for ban in range(4):
+            a, b, c = (decks[:, k].astype(np.int64) for k in range(4) if k != ban)
+            keys[:, ban] = (a * n + b) * n + c
+        return keys
+
+
+class PrecomputeStore:
+    """
+    Builds precomputed structures in a background thread, keyed by matchups hash.
+
+    Field edits keep the key, so they reuse the structures; matchup edits
+    produce a new key and a new build.
+    """
+
+    def __init__(self, max_entries: int = MAX_PRECOMPUTED):
+        self.max_entries = max_entries
+        self._builds: "OrderedDict[str, Future]" = OrderedDict()
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="precompute")
+
+    def schedule(self, dataset) -> Future:
+        """Start building the dataset's structures unless already built or building."""
+        key = dataset.matchups_hash()
+        with self._lock:
+            build = self._builds.get(key)
+            if build is None:
+                build = self._executor.submit(Precomputed, dataset.matchups_df(), dataset.archetypes_df())
+                self._builds[key] = build
+            self._builds.move_to_end(key)
+            while len(self._builds) > self.max_entries:
+                self._builds.popitem(last=False)
+        return build
+
+    def get(self, dataset) -> Precomputed:
+        """Structures of the dataset, waiting for the build if needed."""
+        build = self.schedule(dataset)
+        try:
+            return build.result()
+        except Exception:
+            # Don't keep a failed build around, the next request retries it
+            with self._lock:
+                if self._builds.get(dataset.matchups_hash()) is build:
+                    del self._builds[dataset.matchups_hash()]
+            raise
+
+
+precompute_store = PrecomputeStore()
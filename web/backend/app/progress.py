@@ -0,0 +1,110 @@
+"""
+Progress channel between blocking work and a websocket.
+
+Blocking work runs through `loop.run_in_executor` and reports progress from
+its thread with plain callbacks. Updates are coalesced: only the latest one
+is kept and it is sent at most once per `min_interval`, so the event loop
+stays idle between sends no matter how often the work reports.
+"""
+import asyncio
+import time
+from threading import Lock
+from typing import Any, Awaitable, Callable, Optional
+
+from .config import PROGRESS_MIN_INTERVAL
+from .metrics import QUEUE_WAIT
+
+
+class ProgressChannel:
+    """
+    Rate-limited progress updates from worker threads to an async sender.
+
+    Args:
+        send: Coroutine function sending one update (e.g. websocket.send_json)
+        min_interval: Minimum seconds between two sent updates
+    """
+
+    def __init__(self, send: Callable[[dict], Awaitable[None]], min_interval: float = PROGRESS_MIN_INTERVAL):
+        self.loop = asyncio.get_running_loop()
+        self.send = send
+        self.min_interval = min_interval
+        self._lock = Lock()
+        self._latest: Optional[dict] = None
+        self._wakeup_pending = False
+        self._wakeup = asyncio.Event()
+
+    def report(self, phase: str, progress: float, message: str, **extra: Any) -> None:
+        """Publish an update, safe to call from any thread."""
+        update = {
+            "phase": phase,
+            "progress": progress,
+            "message": message,
+            "completed": False,
+            **extra,
+        }
+        with self._lock:
+            self._latest = update
+            if self._wakeup_pending:
+                return
+            self._wakeup_pending = True
+        self.loop.call_soon_threadsafe(self._wakeup.set)
+
+    def stage(
+        self,
+        phase: str,
+        start: float,
+        span: float,
+        total: Optional[int] = None,
+        unit: str = "items",
+    ) -> Callable[[float, str], None]:
+        """
+        Callback(progress, message) for one stage of the work.
+
+        The stage's 0-1 progress is mapped to [start, start + span] of the
+        overall progress. When `total` is known, updates also carry the
+        throughput (`rate` in `unit`/s) and the estimated seconds left (`eta`).
+        """
+        started = time.monotonic()
+
+        def callback(progress: float, message: str) -> None:
+            extra = {}
+            elapsed = time.monotonic() - started
+            if total and progress > 0 and elapsed > 0:
+                extra = {
+                    "rate": progress * total / elapsed,
+                    "unit": unit,
+                    "eta": elapsed * (1 - progress) / progress,
+                }
+            self.report(phase, start + progress * span, message, **extra)
+
+        return callback
+
+    async def run(self, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Run blocking `func` in the loop's executor while sending its progress."""
+        submitted = time.monotonic()
+
+        def work():
+            QUEUE_WAIT.labels("executor").observe(time.monotonic() - submitted)
+            return func(*args, **kwargs)
+
+        pump = asyncio.create_task(self._pump())
+        try:
+            return await self.loop.run_in_executor(None, work)
+        finally:
+            pump.cancel()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Send the pending update, if any."""
+        with self._lock:
+            update, self._latest = self._latest, None
+            self._wakeup_pending = False
+            self._wakeup.clear()
+        if update is not None:
+            await self.send(update)
+
+    async def _pump(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            await self.flush()
+            await asyncio.sleep(self.min_interval)
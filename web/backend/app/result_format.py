@@ -0,0 +1,38 @@
+"""
+Columnar binary format for lineup results.
+
+A result artifact is a directory with:
+    decks.npy     int16 (lineups x 4) deck ids, sorted by win rate
+    win_rate.npy  float64 (lineups) win rates
+    names.json    deck names, the position in the list is the deck id
+
+Same layout as the CLI's result_format.py. The arrays are loaded memory
+mapped, so millions of rows can be sliced or filtered without parsing text.
+"""
+import json
+import os
+
+import numpy as np
+
+
+def write_results(path: str, decks: np.ndarray, win_rate: np.ndarray, deck_names: list[str]) -> None:
+    """Write deck id and win rate arrays, already sorted, as a binary artifact."""
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "decks.npy"), np.asarray(decks, dtype=np.int16))
+    np.save(os.path.join(path, "win_rate.npy"), np.asarray(win_rate, dtype=np.float64))
+    with open(os.path.join(path, "names.json"), "w") as f:
+        json.dump(list(deck_names), f)
+
+
+def load_results(path: str) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    """
+    Load a binary artifact.
+
+    Returns:
+        Tuple of (decks, win_rate, names) with the arrays memory mapped read only
+    """
+    decks = np.load(os.path.join(path, "decks.npy"), mmap_mode="r")
+    win_rate = np.load(os.path.join(path, "win_rate.npy"), mmap_mode="r")
+    with open(os.path.join(path, "names.json")) as f:
+        names = json.load(f)
+    return decks, win_rate, names
@@ -0,0 +1,592 @@
+"""
+Server-side storage and querying of calculation results.
+Keeps the full sorted result set of each job in columnar form and serves
+pages, filters and sorts from it.
+"""
+import json
+import os
+import shutil
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .config import MAX_STORED_ARTIFACTS, MAX_STORED_RESULTS, PAIRINGS_MEMORY_MB, RESULTS_DIR
+from .evolution import MAX_EVOLUTION_STEPS, evolve_field, field_values
+from .pairings import Pairings
+from .precompute import lineup_values
+from .result_format import load_results, write_results
+from .sensitivity import matchup_sensitivity, top_matchups
+from .tournament import simulate_tournaments
+
+
+class ResultSet:
+    """
+    Full result set of one calculation.
+
+    Rows are kept in win rate order, so a row's position is its rank.
+    Filters use per-deck membership masks that are built once and cached.
+    Calculations with a bootstrap also keep per-row uncertainty columns.
+    """
+
+    # Bootstrap statistics returned with each row when present
+    UNCERTAINTY_COLUMNS = ("low", "high", "p_top1", "p_top10")
+
+    def __init__(self, decks: np.ndarray, win_rate: np.ndarray, names: list[str], classes: list[str]):
+        self.decks = decks
+        self.win_rate = win_rate
+        self.names = names
+        self.classes = classes
+        self.deck_ids = {name: i for i, name in enumerate(names)}
+        self._deck_masks: dict[int, np.ndarray] = {}
+        self._orders: dict[str, np.ndarray] = {}
+        self.uncertainty: Optional[dict[str, np.ndarray]] = None
+        self.uncertainty_options: Optional[dict] = None
+        # Inputs of the calculation, only kept in memory (see set_inputs)
+        self.matchups: Optional[np.ndarray] = None
+        self.field_decks: Optional[np.ndarray] = None
+        self.field_weights: Optional[np.ndarray] = None
+        # Values and bans of every row against each field lineup, see ResultStore for their memory budget
+        self.pairings: Optional[Pairings] = None
+        # Win rates against each field lineup of every row and of every field lineup,
+        # solved on first use and shared by tournaments and field evolution
+        self._lineup_values: Optional[np.ndarray] = None
+        self._field_matrix: Optional[np.ndarray] = None
+        self._values_lock = Lock()
+
+    @classmethod
+    def from_dataframe(cls, results_df: pd.DataFrame, archetypes: pd.DataFrame) -> "ResultSet":
+        """Build from sorted calculator results and the archetypes they were computed with."""
+        names = archetypes['name'].tolist()
+        index = {name: i for i, name in enumerate(names)}
+        decks = np.column_stack([
+            results_df[col].map(index).to_numpy(dtype=np.int16) for col in range(4)
+        ])
+        win_rate = results_df[4].to_numpy(dtype=np.float64)
+        return cls(decks, win_rate, names, archetypes['player_class_name'].tolist())
+
+    def attach_uncertainty(self, lineup_decks: np.ndarray, stats: dict[str, np.ndarray], options: dict) -> None:
+        """
+        Add bootstrap statistics computed for lineups in any order.
+
+        Args:
+            lineup_decks: Deck ids of the bootstrapped lineups, shape (lineups, 4)
+            stats: Arrays aligned with lineup_decks, see uncertainty.bootstrap_lineups
+            options: Bootstrap settings reported in the summary
+        """
+        rows = self._lineup_positions(lineup_decks)
+        self.uncertainty = {name: np.asarray(stats[name])[rows] for name in self.UNCERTAINTY_COLUMNS}
+        self.uncertainty_options = options
+
+    def attach_pairings(self, lineup_decks: np.ndarray, pairings: Pairings) -> None:
+        """
+        Keep the per-pairing results of the calculation, for lineup breakdowns.
+
+        Args:
+            lineup_decks: Deck ids of the pairings' rows, shape (lineups, 4)
+            pairings: Values and bans against each field lineup, see pairings.Pairings
+        """
+        self.pairings = pairings.reorder(self._lineup_positions(lineup_decks))
+
+    def _lineup_positions(self, lineup_decks: np.ndarray) -> np.ndarray:
+        """Position in lineup_decks of the lineup of each row."""
+        n = len(self.names)
+        weights = np.array([n ** 3, n ** 2, n, 1], dtype=np.int64)
+        keys = lineup_decks.astype(np.int64) @ weights
+        order = np.argsort(keys)
+        return order[np.searchsorted(keys, self.decks.astype(np.int64) @ weights, sorter=order)]
+
+    def set_inputs(self, matchups: np.ndarray, field_decks: np.ndarray, field_weights: np.ndarray) -> None:
+        """
+        Keep the inputs the win rates were calculated from, for the sensitivity
+        analysis, tournament simulations and field evolution.
+
+        Args:
+            matchups: Normalized (0-1) matchup matrix, in deck name order
+            field_decks: Deck ids of the field lineups, shape (opponents, 4)
+            field_weights: Share of the field of each opponent, summing to 1
+        """
+        self.matchups = matchups
+        self.field_decks = field_decks
+        self.field_weights = field_weights
+
+    def field_matrix(self, progress_callback: Optional[Callable[[float, str], None]] = None) -> np.ndarray:
+        """
+        Win rate of every field lineup against every field lineup.
+
+        Solved in a process pool on the first call, later calls reuse it.
+        """
+        with self._values_lock:
+            if self._field_matrix is None:
+                self._field_matrix = field_values(self.matchups, self.field_decks, self.field_decks, progress_callback)
+            return self._field_matrix
+
+    def lineup_values(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Win rate of some rows against every field lineup.
+
+        Read from the values kept by the calculation or a field evolution,
+        rows without them (restored from a checkpoint) are solved.
+        """
+        cached, pairings = self._lineup_values, self.pairings
+        if cached is not None:
+            return cached[rows]
+        if pairings is not None and pairings.filled[rows].all():
+            return pairings.value_matrix(rows)
+        return lineup_values(self.matchups, self.decks[rows].astype(np.intp), self.field_decks)
+
+    @property
+    def pair_nbytes(self) -> int:
+        """Memory held per (row, field lineup) pair: in-memory pairings and the evolution's values."""
+        nbytes = self.pairings.nbytes if self.pairings is not None and self.pairings.in_memory else 0
+        return nbytes + (self._lineup_values.nbytes if self._lineup_values is not None else 0)
+
+    def release_pairs(self, directory: Optional[str] = None) -> None:
+        """
+        Free the memory held per pair.
+
+        Args:
+            directory: Where to save the pairings, which are then memory mapped
+                from there. None drops them and breakdowns are no longer available
+        """
+        with self._values_lock:
+            self._lineup_values = None
+            if self.pairings is not None and self.pairings.in_memory:
+                self.pairings = self.pairings.save(directory) if directory else None
+
+    def sensitivity(self, top: int = 10, count: int = 20, delta: float = 1.0) -> dict:
+        """
+        Matchups the best lineups' win rates depend on the most.
+
+        Args:
+            top: Number of best lineups analyzed
+            count: Matchups reported per lineup
+            delta: Matchup change in percentage points, for the first order effect
+
+        Returns:
+            Dict with one entry per lineup listing its matchups with the derivative
+            (win rate points per matchup point) and the effect of a +delta change
+        """
+        if self.matchups is None:
+            raise ValueError("The inputs of this calculation are no longer available")
+        rows = np.arange(min(top, len(self)))
+        sens = matchup_sensitivity(self.matchups, self.decks[rows].astype(np.intp), self.field_decks, self.field_weights)
+        lineups = []
+        for row, lineup_sens in zip(rows, sens):
+            lineup = self.decks[row].tolist()
+            lineups.append({
+                **self._row(row),
+                "matchups": [
+                    {
+                        "deck": self.names[deck],
+                        "opponent": self.names[opponent],
+                        "derivative": derivative,
+                        "effect": derivative * delta,
+                    }
+                    for deck, opponent, derivative in top_matchups(lineup_sens, lineup, count)
+                ],
+            })
+        return {"delta": delta, "lineups": lineups}
+
+    def tournament(self, top: int = 10, **settings) -> dict:
+        """
+        Simulate tournaments for the best lineups against the calculation's field.
+
+        Args:
+            top: Number of best lineups simulated
+            settings: Event settings, see tournament.simulate_tournaments
+
+        Returns:
+            Dict with the settings and one entry per lineup with its chances
+            to make the top cut and to win
+        """
+        if self.matchups is None:
+            raise ValueError("The inputs of this calculation are no longer available")
+        rows = np.arange(min(top, len(self)))
+        stats = simulate_tournaments(self.lineup_values(rows), self.field_matrix(), self.field_weights, **settings)
+        return {
+            "settings": settings,
+            "lineups": [
+                {**self._row(row), **{name: float(values[row]) for name, values in stats.items()}}
+                for row in rows
+            ],
+        }
+
+    def evolution(
+        self,
+        report_steps: list[int],
+        dynamics: str = "replicator",
+        rate: float = 0.5,
+        top: int = 20,
+        progress_callback: Optional[Callable[[float, str], None]] = None,
+    ) -> dict:
+        """
+        Rankings against the field as it adapts, see evolution.evolve_field.
+
+        The first call evaluates every lineup against every field lineup (the
+        calculation's pairings when it kept them all) and the field against
+        itself, later calls with any settings reuse those values.
+
+        Args:
+            report_steps: Steps to report the field and rankings at (0 is the calculation's field)
+            dynamics: "replicator" or "best_response"
+            rate: Share of the field that adapts each step
+            top: Number of best lineups reported per step
+            progress_callback: Optional callback(progress, message) of the first evaluation
+
+        Returns:
+            Dict with one entry per reported step: the biggest field lineups
+            and the best lineups, with their rank and win rate at that step
+        """
+        if self.matchups is None:
+            raise ValueError("The inputs of this calculation are no longer available")
+        if min(report_steps) < 0 or max(report_steps) > MAX_EVOLUTION_STEPS:
+            raise ValueError(f"Steps must be between 0 and {MAX_EVOLUTION_STEPS}")
+        with self._values_lock:
+            if self._lineup_values is None:
+                pairings = self.pairings
+                if pairings is not None and pairings.filled.all():
+                    self._lineup_values = pairings.value_matrix()
+                else:
+                    self._lineup_values = field_values(
+                        self.matchups, self.decks.astype(np.intp), self.field_decks, progress_callback
+                    )
+            values = self._lineup_values
+        field_matrix = self.field_matrix(progress_callback)
+        history = evolve_field(field_matrix, self.field_weights, max(report_steps), dynamics, rate)
+
+        steps = []
+        for step in sorted(set(report_steps)):
+            weights = history[step]
+            win_rates = values @ weights
+            best = np.argsort(-win_rates, kind="stable")[:top]
+            biggest = np.argsort(-weights, kind="stable")[:10]
+            steps.append({
+                "step": step,
+                "field": [
+                    {"decks": [self.names[d] for d in self.field_decks[opponent]], "weight": float(weights[opponent])}
+                    for opponent in biggest
+                ],
+                "lineups": [
+                    {**self._row(row), "evolved_rank": rank, "evolved_win_rate": float(win_rates[row])}
+                    for rank, row in enumerate(best, 1)
+                ],
+            })
+        return {"dynamics": dynamics, "rate": rate, "steps": steps}
+
+    def breakdown(self, row: int, opponents: int = 5) -> dict:
+        """
+        Where a lineup's win rate comes from, built from the kept pairings.
+
+        Args:
+            row: Result row (rank - 1)
+            opponents: Number of worst and best field opponents reported
+
+        Returns:
+            Dict with the lineup row and:
+                deck_stats: for each of its decks the share of matches it's banned in
+                    and its average matchup against the opponent decks left
+                bans: opponent decks the lineup bans the most (share of matches)
+                worst, best: field opponents with their share of the field,
+                    the lineup's win rate and the deck each side bans the most
+        """
+        # The store may release the pairings meanwhile, see ResultStore.trim_pairs
+        pairings = self.pairings
+        if pairings is None:
+            raise ValueError("The pairings of this calculation are no longer available")
+        if not pairings.filled[row]:
+            raise ValueError("This lineup was restored from a checkpoint, its pairings weren't kept")
+        values, hero_bans, villain_bans = pairings.lineup(row)
+        weights = self.field_weights
+        lineup = self.decks[row].astype(np.intp)
+
+        # Chance each opponent deck is still in when facing the lineup, weighted by field share
+        field_matchups = self.matchups[lineup][:, self.field_decks]
+        faced = weights[:, None] * (1 - villain_bans)
+        deck_stats = [
+            {
+                "deck": self.names[deck],
+                "banned": float(weights @ hero_bans[:, k]),
+                "matchup": float((field_matchups[k] * faced).sum() / faced.sum()),
+            }
+            for k, deck in enumerate(lineup)
+        ]
+
+        banned = np.bincount(
+            self.field_decks.ravel(), weights=(weights[:, None] * villain_bans).ravel(), minlength=len(self.names)
+        )
+        bans = [
+            {"deck": self.names[deck], "share": float(banned[deck])}
+            for deck in np.argsort(-banned, kind="stable")[:10] if banned[deck] > 0
+        ]
+
+        def opponent(index: int) -> dict:
+            field_lineup = self.field_decks[index]
+            return {
+                "decks": [self.names[d] for d in field_lineup],
+                "share": float(weights[index]),
+                "win_rate": float(values[index]),
+                "hero_ban": self.names[lineup[hero_bans[index].argmax()]],
+                "villain_ban": self.names[field_lineup[villain_bans[index].argmax()]],
+            }
+
+        order = np.argsort(values, kind="stable")
+        return {
+            **self._row(row),
+            "deck_stats": deck_stats,
+            "bans": bans,
+            "worst": [opponent(index) for index in order[:opponents]],
+            "best": [opponent(index) for index in order[::-1][:opponents]],
+        }
+
+    def __len__(self) -> int:
+        return len(self.win_rate)
+
+    def deck_mask(self, deck_id: int) -> np.ndarray:
+        """Rows whose lineup contains the deck."""
+        mask = self._deck_masks.get(deck_id)
+        if mask is None:
+            mask = (self.decks == deck_id).any(axis=1)
+            self._deck_masks[deck_id] = mask
+        return mask
+
+    def class_mask(self, class_name: str) -> np.ndarray:
+        """Rows whose lineup contains a deck of the class."""
+        mask = np.zeros(len(self), dtype=bool)
+        for deck_id, deck_class in enumerate(self.classes):
+            if deck_class == class_name:
+                mask |= self.deck_mask(deck_id)
+        return mask
+
+    def order(self, sort: str) -> np.ndarray:
+        """Row order for a sort key, computed once per key."""
+        order = self._orders.get(sort)
+        if order is None:
+            if sort == "win_rate":
+                order = np.arange(len(self))
+            elif sort == "lineup":
+                names = np.asarray(self.names, dtype=object)
+                keys = [names[self.decks[:, col]] for col in range(3, -1, -1)]
+                order = np.lexsort(keys)
+            else:
+                raise ValueError(f"Unknown sort key: {sort}")
+            self._orders[sort] = order
+        return order
+
+    def query(
+        self,
+        offset: int = 0,
+        limit: int = 100,
+        include: Optional[list[str]] = None,
+        exclude: Optional[list[str]] = None,
+        include_classes: Optional[list[str]] = None,
+        exclude_classes: Optional[list[str]] = None,
+        sort: str = "win_rate",
+        descending: bool = True,
+    ) -> dict:
+        """
+        Get one page of results.
+
+        Args:
+            offset: Index of the first row of the page in the filtered results
+            limit: Maximum number of rows in the page
+            include: Decks every lineup must contain
+            exclude: Decks no lineup may contain
+            include_classes: Classes every lineup must contain
+            exclude_classes: Classes no lineup may contain
+            sort: "win_rate" or "lineup" (deck names)
+            descending: Sort direction
+
+        Returns:
+            Dict with the filtered total and the page rows, each with its overall rank
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for deck in include or []:
+            mask &= self.deck_mask(self._deck_id(deck))
+        for deck in exclude or []:
+            mask &= ~self.deck_mask(self._deck_id(deck))
+        for class_name in include_classes or []:
+            mask &= self.class_mask(class_name)
+        for class_name in exclude_classes or []:
+            mask &= ~self.class_mask(class_name)
+
+        order = self.order(sort)
+        # Win rate rows are stored best first, lineup order is ascending
+        if descending != (sort == "win_rate"):
+            order = order[::-1]
+        rows = order[mask[order]]
+        page = rows[offset:offset + limit]
+
+        return {
+            "total": int(len(rows)),
+            "offset": offset,
+            "rows": [self._row(row) for row in page],
+        }
+
+    def _row(self, row: int) -> dict:
+        result = {
+            "rank": int(row) + 1,
+            "decks": [self.names[d] for d in self.decks[row]],
+            "win_rate": float(self.win_rate[row]),
+        }
+        if self.uncertainty is not None:
+            for name in self.UNCERTAINTY_COLUMNS:
+                result[name] = float(self.uncertainty[name][row])
+        return result
+
+    def summary(self) -> dict:
+        """Totals and deck list used by the results view."""
+        top = np.asarray(self.win_rate[:10])
+        return {
+            "total": len(self),
+            "best_win_rate": float(self.win_rate[0]) if len(self) else None,
+            "top10_average": float(top.mean()) if len(top) else None,
+            "decks": [
+                {"name": name, "player_class_name": deck_class}
+                for name, deck_class in zip(self.names, self.classes)
+            ],
+            "uncertainty": self.uncertainty_options,
+        }
+
+    def _deck_id(self, deck: str) -> int:
+        if deck not in self.deck_ids:
+            raise KeyError(f"Unknown deck: {deck}")
+        return self.deck_ids[deck]
+
+
+class ResultStore:
+    """
+    Keeps the result sets of the most recent jobs in memory.
+
+    When RESULTS_DIR is set, every result set is also saved there as a
+    binary artifact and jobs evicted from memory are reloaded memory mapped.
+    Artifacts are written in a background thread, and beyond max_artifacts
+    the oldest ones of jobs no longer in memory are deleted.
+
+    Pairings are evicted on their own: beyond pairs_budget bytes, the least
+    recently used result sets move their pairings to their artifact (or drop
+    them without RESULTS_DIR) and drop their field evolution values.
+    """
+
+    def __init__(
+        self,
+        max_results: int = MAX_STORED_RESULTS,
+        results_dir: str = RESULTS_DIR,
+        pairs_budget: int = int(PAIRINGS_MEMORY_MB * 2**20),
+        max_artifacts: int = MAX_STORED_ARTIFACTS
+    ):
+        self.max_results = max_results
+        self.results_dir = results_dir
+        self.pairs_budget = pairs_budget
+        self.max_artifacts = max_artifacts
+        self._results: "OrderedDict[str, ResultSet]" = OrderedDict()
+        self._lock = Lock()
+        # Disk work runs in order in one thread: an artifact is complete before its pairings move there
+        self._disk = ThreadPoolExecutor(max_workers=1, thread_name_prefix="results")
+
+    def add(self, job_id: str, result_set: ResultSet) -> Future:
+        """
+        Keep a result set, saving its artifact in the background.
+
+        Returns:
+            Future done once the artifact is written and the pairings trimmed
+        """
+        with self._lock:
+            self._keep(job_id, result_set)
+        if self.results_dir:
+            self._disk.submit(self._save, job_id, result_set)
+        return self.trim_pairs()
+
+    def _save(self, job_id: str, result_set: ResultSet) -> None:
+        """Write a result set's artifact, then delete the oldest artifacts beyond max_artifacts."""
+        # Written next to its final place and renamed, get never sees half an artifact
+        tmp_path = os.path.join(self.results_dir, f".{job_id}.tmp")
+        write_results(tmp_path, result_set.decks, result_set.win_rate, result_set.names)
+        with open(os.path.join(tmp_path, "classes.txt"), "w") as f:
+            f.write("\n".join(result_set.classes))
+        if result_set.uncertainty is not None:
+            np.savez(os.path.join(tmp_path, "uncertainty.npz"), **result_set.uncertainty)
+            with open(os.path.join(tmp_path, "uncertainty.json"), "w") as f:
+                json.dump(result_set.uncertainty_options, f)
+        os.replace(tmp_path, os.path.join(self.results_dir, job_id))
+        self._remove_old_artifacts()
+
+    def _remove_old_artifacts(self) -> None:
+        """Delete the oldest artifacts beyond max_artifacts, except those of jobs in memory."""
+        with self._lock:
+            in_memory = set(self._results)
+        artifacts = [
+            entry for entry in os.scandir(self.results_dir)
+            if entry.is_dir() and not entry.name.startswith(".")
+            and os.path.isfile(os.path.join(entry.path, "names.json"))
+        ]
+        artifacts.sort(key=lambda entry: entry.stat().st_mtime)
+        excess = len(artifacts) - self.max_artifacts
+        for entry in artifacts:
+            if excess <= 0:
+                break
+            if entry.name not in in_memory:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                excess -= 1
+
+    def trim_pairs(self) -> Future:
+        """Release the per-pair memory beyond pairs_budget in the background, see _trim_pairs."""
+        return self._disk.submit(self._trim_pairs)
+
+    def _trim_pairs(self) -> None:
+        """Release the per-pair memory of the least recently used result sets beyond pairs_budget."""
+        with self._lock:
+            stored = list(self._results.items())
+        total = sum(result_set.pair_nbytes for _, result_set in stored)
+        for job_id, result_set in stored:
+            if total <= self.pairs_budget:
+                break
+            nbytes = result_set.pair_nbytes
+            if nbytes:
+                directory = os.path.join(self.results_dir, job_id, "pairings") if self.results_dir else None
+                result_set.release_pairs(directory)
+                total -= nbytes
+
+    def _keep(self, job_id: str, result_set: ResultSet) -> None:
+        """Store a result set as the most recent one and evict the oldest beyond max_results (lock held)."""
+        self._results[job_id] = result_set
+        self._results.move_to_end(job_id)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+    def _artifact_path(self, job_id: str) -> Optional[str]:
+        """Directory of a job's artifact, None unless it's a directory directly inside results_dir."""
+        if not self.results_dir or job_id.startswith("."):
+            return None
+        path = os.path.realpath(os.path.join(self.results_dir, job_id))
+        if os.path.dirname(path) != os.path.realpath(self.results_dir) or not os.path.isdir(path):
+            return None
+        return path
+
+    def get(self, job_id: str) -> Optional[ResultSet]:
+        with self._lock:
+            result_set = self._results.get(job_id)
+            if result_set is not None:
+                self._results.move_to_end(job_id)
+                return result_set
+        path = self._artifact_path(job_id)
+        if path is None:
+            return None
+        decks, win_rate, names = load_results(path)
+        with open(os.path.join(path, "classes.txt")) as f:
+            classes = f.read().split("\n")
+        result_set = ResultSet(decks, win_rate, names, classes)
+        if os.path.exists(os.path.join(path, "uncertainty.npz")):
+            with np.load(os.path.join(path, "uncertainty.npz")) as stats:
+                result_set.uncertainty = {name: stats[name] for name in ResultSet.UNCERTAINTY_COLUMNS}
+            with open(os.path.join(path, "uncertainty.json")) as f:
+                result_set.uncertainty_options = json.load(f)
+        with self._lock:
+            self._keep(job_id, result_set)
+        return result_set
+
+
+result_store = ResultStore()
@@ -0,0 +1,119 @@
+"""
+Matchup sensitivity of lineup win rates.
+
+By the envelope theorem, the derivative of a ban phase's value with respect
+to its payoff B[i][j] is x[i] * y[j], where x and y are the equilibrium ban
+strategies the solver already finds. Chained with the derivatives of
+conquest_bo5 with respect to its 9 matchup cells (complex step, exact for
+the formula), one vectorized pass gives the derivative of each lineup's
+field win rate with respect to every matchup without solving anything again.
+"""
+import numpy as np
+
+from .calculator import conquest_bo5
+from .precompute import solve_batch
+
+# f(x + ih).imag / h is the exact derivative of a real formula, without the
+# cancellation of finite differences
+STEP = 1e-20
+
+# Decks left in each triple after banning deck i
+KEEP = [[k for k in range(4) if k != ban] for ban in range(4)]
+
+
+class _Cells:
+    """
+    Lets conquest_bo5 run on arrays of deck ids, `mups[h][v]` becomes `matrix[h, v]`.
+
+    The cell read through exactly the `hero` and `villain` arrays gets the
+    complex step added, so every element is differentiated with respect to
+    its own cell.
+    """
+
+    def __init__(self, matrix: np.ndarray, hero=None, villain=None):
+        self.matrix = matrix
+        self.hero = hero
+        self.villain = villain
+        self.cache = {}
+
+    def __getitem__(self, hero):
+        return _CellsRow(self, hero)
+
+
+class _CellsRow:
+    def __init__(self, cells: _Cells, hero):
+        self.cells = cells
+        self.hero = hero
+
+    def __getitem__(self, villain):
+        key = (id(self.hero), id(villain))
+        if key not in self.cells.cache:
+            value = self.cells.matrix[self.hero, villain]
+            if self.hero is self.cells.hero and villain is self.cells.villain:
+                value = value + 1j * STEP
+            self.cells.cache[key] = value
+        return self.cells.cache[key]
+
+
+def matchup_sensitivity(
+    matchups: np.ndarray, lineups: np.ndarray, field: np.ndarray, weights: np.ndarray, iterations: int = 1000
+) -> np.ndarray:
+    """
+    Derivative of each lineup's field win rate with respect to every matchup.
+
+    Args:
+        matchups: Normalized (0-1) matchup matrix
+        lineups: Deck ids, shape (lineups, 4)
+        field: Deck ids of the field lineups, shape (opponents, 4)
+        weights: Share of the field of each opponent, summing to 1
+
+    Returns:
+        Array (lineups, decks, decks): change of the win rate per unit of
+        m[a][b], with the mirrored m[b][a] = 1 - m[a][b] moving the other
+        way (so it's antisymmetric). Times a change, it's the first order
+        effect of that change.
+    """
+    num_lineups, num_opponents, n = len(lineups), len(field), len(matchups)
+
+    # banlists[k, o, i, j]: lineup k without deck i against opponent o without deck j
+    shape = (num_lineups, num_opponents, 4, 4)
+    hero = lineups[:, KEEP][:, None, :, None, :]
+    villain = field[:, KEEP][None, :, None, :, :]
+    h = [np.broadcast_to(hero[..., p], shape) for p in range(3)]
+    v = [np.broadcast_to(villain[..., q], shape) for q in range(3)]
+    banlists = conquest_bo5(_Cells(matchups), *h, *v)
+
+    rowcnt, colcnt, _ = solve_batch(banlists.reshape(-1, 4, 4), iterations)
+    x = rowcnt.reshape(num_lineups, num_opponents, 4) / iterations
+    y = colcnt.reshape(num_lineups, num_opponents, 4) / iterations
+    value_by_payoff = weights[None, :, None, None] * x[..., :, None] * y[..., None, :]
+
+    sens = np.zeros((num_lineups, n, n))
+    lineup_index = np.broadcast_to(np.arange(num_lineups)[:, None, None, None], shape)
+    for p in range(3):
+        for q in range(3):
+            payoff_by_cell = conquest_bo5(_Cells(matchups, h[p], v[q]), *h, *v).imag / STEP
+            np.add.at(sens, (lineup_index, h[p], v[q]), value_by_payoff * payoff_by_cell)
+    return sens - sens.transpose(0, 2, 1)
+
+
+def top_matchups(sens: np.ndarray, lineup: list[int], count: int = 20) -> list[tuple[int, int, float]]:
+    """
+    Matchups a lineup depends on the most, largest derivative first.
+
+    Each matchup shows up once, seen from the lineup's side when one of its
+    decks is in it. Matchups that don't affect the lineup are left out.
+
+    Returns:
+        List of (deck id, opponent deck id, derivative)
+    """
+    upper = np.triu_indices(len(sens), 1)
+    order = np.argsort(-np.abs(sens[upper]), kind="stable")[:count]
+    matchups = []
+    for a, b in zip(upper[0][order], upper[1][order]):
+        if sens[a, b] == 0:
+            break
+        if b in lineup and a not in lineup:
+            a, b = b, a
+        matchups.append((int(a), int(b), float(sens[a, b])))
+    return matchups
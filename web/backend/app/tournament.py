@@ -0,0 +1,217 @@
+"""
+Monte Carlo simulation of Swiss tournaments with a top cut.
+
+A lineup's win rate against the field is an average over single matches.
+How often it makes the top cut or wins the event also depends on who it
+meets along the way. To estimate those numbers, each simulated event seats
+the lineup with players drawn from the generated field. Then:
+
+    Swiss       every round players are paired inside their score group
+                (sorted by wins with random tiebreaks, then 1v2, 3v4...)
+    top cut     the best records play a seeded single elimination bracket
+
+Every match is a Bernoulli draw at the pairing's win rate, ban phase
+included. Those win rates come from the calculation: the (lineup, field
+lineup) values it kept and the (field lineup, field lineup) values the
+result set computes once and shares with field evolution. Events are simulated in batches as
+(events x players) arrays. Batches run in a process pool, each with its own
+seed, so results don't depend on the number of workers. Rematches and real
+tiebreakers are not modelled.
+"""
+import os
+import time
+from multiprocessing import Pool
+from typing import Callable, Optional
+
+import numpy as np
+
+from .metrics import PoolMonitor
+
+# Events simulated per pool task, sized to keep the (events x players) arrays small
+EVENTS_PER_TASK = 2000
+
+
+def bracket_seeds(size: int) -> list[int]:
+    """
+    Seeds (0 = best record) in bracket order for a single elimination cut.
+
+    Adjacent seeds play each other and the best seeds only meet in the last
+    rounds: [0, 7, 3, 4, 1, 6, 2, 5] for a top 8.
+    """
+    seeds = [0]
+    while len(seeds) < size:
+        seeds = [s for seed in seeds for s in (seed, 2 * len(seeds) - 1 - seed)]
+    return seeds
+
+
+def pairing_matrix(hero_values: np.ndarray, field_values: np.ndarray) -> np.ndarray:
+    """
+    Win rate of every seat type against every other one.
+
+    Rows and columns are the simulated lineups followed by the field
+    lineups. The field block is made antisymmetric by averaging both
+    directions of each pairing, the lineups never meet each other.
+
+    Args:
+        hero_values: Win rate of each simulated lineup against each field lineup
+        field_values: Win rate of each field lineup against each field lineup
+
+    Returns:
+        Array (lineups + field, lineups + field)
+    """
+    num_lineups = len(hero_values)
+    values = np.full((num_lineups + len(field_values),) * 2, 0.5)
+    values[:num_lineups, num_lineups:] = hero_values
+    values[num_lineups:, :num_lineups] = 1 - hero_values.T
+    values[num_lineups:, num_lineups:] = (field_values + 1 - field_values.T) / 2
+    return values
+
+
+def play(values: np.ndarray, seats: np.ndarray, a: np.ndarray, b: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Play the matches between players a and b of each event, True where a won."""
+    events = np.arange(len(seats))[:, None]
+    return rng.random(a.shape) < values[seats[events, a], seats[events, b]]
+
+
+def simulate_events(
+    values: np.ndarray,
+    lineup: int,
+    field_weights: np.ndarray,
+    events: int,
+    players: int,
+    rounds: int,
+    top_cut: int,
+    rng: np.random.Generator,
+) -> tuple[int, int, float]:
+    """
+    Simulate a batch of events where player 0 plays `lineup`.
+
+    Args:
+        values: Pairing win rates, see pairing_matrix
+        lineup: Row of the simulated lineup in values
+        field_weights: Share of the field of each field lineup
+        players: Players per event (even)
+        rounds: Swiss rounds
+        top_cut: Players in the single elimination cut (a power of two)
+
+    Returns:
+        Tuple of (events making the cut, events won, total Swiss wins)
+    """
+    num_field = len(field_weights)
+    first_field = len(values) - num_field
+    events_index = np.arange(events)[:, None]
+
+    # seats[e, p]: row in values of player p in event e
+    seats = np.empty((events, players), dtype=np.intp)
+    seats[:, 0] = lineup
+    seats[:, 1:] = first_field + rng.choice(num_field, size=(events, players - 1), p=field_weights)
+
+    wins = np.zeros((events, players))
+    for _ in range(rounds):
+        standings = np.argsort(-(wins + rng.random(wins.shape)), axis=1)
+        a, b = standings[:, 0::2], standings[:, 1::2]
+        a_won = play(values, seats, a, b, rng)
+        wins[events_index, a] += a_won
+        wins[events_index, b] += ~a_won
+
+    standings = np.argsort(-(wins + rng.random(wins.shape)), axis=1)
+    alive = standings[:, :top_cut][:, bracket_seeds(top_cut)]
+    made_cut = (alive == 0).any(axis=1)
+    while alive.shape[1] > 1:
+        a, b = alive[:, 0::2], alive[:, 1::2]
+        alive = np.where(play(values, seats, a, b, rng), a, b)
+    return int(made_cut.sum()), int((alive[:, 0] == 0).sum()), float(wins[:, 0].sum())
+
+
+# Constant inputs of the running simulation, set in each pool worker
+_tournament = None
+
+
+def init_tournament_worker(values, field_weights, players, rounds, top_cut, seed) -> None:
+    """Pool initializer shipping the simulation inputs to a worker once."""
+    global _tournament
+    _tournament = (values, field_weights, players, rounds, top_cut, seed)
+
+
+def simulate_task(task: tuple[int, int, int]) -> tuple[int, int, int, float, int, float, float]:
+    """
+    Simulate one batch of events, seeded by the lineup and the batch number.
+
+    Returns:
+        Tuple of (lineup, made cut, won, Swiss wins, events, start time, seconds spent)
+    """
+    started = time.time()
+    lineup, batch, events = task
+    values, field_weights, players, rounds, top_cut, seed = _tournament
+    rng = np.random.default_rng([seed, lineup, batch])
+    made_cut, won, swiss_wins = simulate_events(values, lineup, field_weights, events, players, rounds, top_cut, rng)
+    return lineup, made_cut, won, swiss_wins, events, started, time.time() - started
+
+
+def simulate_tournaments(
+    hero_values: np.ndarray,
+    field_values: np.ndarray,
+    field_weights: np.ndarray,
+    events: int = 20000,
+    players: int = 128,
+    rounds: int = 7,
+    top_cut: int = 8,
+    seed: int = 0,
+    progress_callback: Optional[Callable[[float, str], None]] = None,
+    max_workers: Optional[int] = None,
+) -> dict[str, np.ndarray]:
+    """
+    Chances of lineups to make the top cut and win a tournament.
+
+    Args:
+        hero_values: Win rate of each simulated lineup against each field
+            lineup, shape (lineups, opponents)
+        field_values: Win rate of each field lineup against each field
+            lineup, shape (opponents, opponents)
+        field_weights: Share of the field of each opponent, summing to 1
+        events: Events simulated per lineup
+        players: Players per event (even)
+        rounds: Swiss rounds
+        top_cut: Players in the single elimination cut (a power of two)
+        seed: Seed of the draws, the same seed gives the same results
+        progress_callback: Optional callback(progress, message)
+        max_workers: Maximum parallel workers (None = auto)
+
+    Returns:
+        Dict of arrays aligned with hero_values: p_top_cut, p_win and the
+        average number of Swiss wins
+    """
+    if players < 2 or players % 2:
+        raise ValueError("Tournaments need an even number of players")
+    if top_cut < 2 or top_cut & (top_cut - 1) or top_cut > players:
+        raise ValueError("The top cut must be a power of two no larger than the number of players")
+
+    num_lineups = len(hero_values)
+    values = pairing_matrix(hero_values, field_values)
+    tasks = [
+        (lineup, batch, min(EVENTS_PER_TASK, events - start))
+        for lineup in range(num_lineups)
+        for batch, start in enumerate(range(0, events, EVENTS_PER_TASK))
+    ]
+
+    made_cut = np.zeros(num_lineups)
+    won = np.zeros(num_lineups)
+    swiss_wins = np.zeros(num_lineups)
+    initargs = (values, np.asarray(field_weights, dtype=np.float64), players, rounds, top_cut, seed)
+    monitor = PoolMonitor(max_workers or os.cpu_count() or 1, "tournament")
+    with Pool(processes=max_workers, initializer=init_tournament_worker, initargs=initargs) as pool, monitor:
+        for done, (lineup, cut, wins, swiss, count, started, seconds) in enumerate(
+            pool.imap_unordered(simulate_task, tasks), 1
+        ):
+            monitor.record(started, seconds)
+            made_cut[lineup] += cut
+            won[lineup] += wins
+            swiss_wins[lineup] += swiss
+            if progress_callback:
+                progress_callback(done / len(tasks), f"Simulating tournaments... {done}/{len(tasks)}")
+
+    return {
+        "p_top_cut": made_cut / events,
+        "p_win": won / events,
+        "swiss_wins": swiss_wins / events,
+    }
@@ -0,0 +1,169 @@
+"""
+Bootstrap confidence intervals for lineup win rates.
+
+HSReplay win rates come from a finite number of games per matchup. Each
+bootstrap replicate draws a new matchup matrix from those game counts and
+re-evaluates every lineup against the same field on the precomputed lineup
+index, so the spread of a lineup's win rate and rank across replicates shows
+how much of its result is sampling noise.
+
+A replicate costs one warm calculation: the outcome table columns used by
+the field plus one batched solve of all ban phases. Replicates run in a
+process pool and the constant inputs are shipped to each worker once.
+"""
+import os
+import time
+from multiprocessing import Pool
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .calculator import WARM_BATCH_GAMES
+from .metrics import PoolMonitor
+from .precompute import Precomputed, conquest_table, solve_batch
+
+METHODS = ("beta", "binomial")
+# Size of the top group counted in p_top10
+TOP_GROUP = 10
+
+
+def resample_matchups(matchups: np.ndarray, games: np.ndarray, rng: np.random.Generator, method: str = "beta") -> np.ndarray:
+    """
+    Draw one bootstrap matchup matrix.
+
+    Cells above the diagonal are drawn from their game counts and mirrored
+    (m[j][i] = 1 - m[i][j]); cells without games or win rate keep their value.
+
+    Args:
+        matchups: Normalized (0-1) matchup matrix
+        games: Games behind each matchup cell
+        method: "binomial" redraws the wins of each matchup at its observed
+            win rate, "beta" draws the win rate from its posterior given the
+            observed wins and losses (uniform prior)
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown bootstrap method: {method}")
+    upper = np.triu_indices(len(matchups), 1)
+    observed = matchups[upper]
+    counts = np.nan_to_num(games[upper]).astype(np.int64)
+    known = (counts > 0) & ~np.isnan(observed)
+    p = np.clip(np.nan_to_num(observed, nan=0.5), 0, 1)
+
+    if method == "binomial":
+        drawn = rng.binomial(counts, p) / np.maximum(counts, 1)
+    else:
+        wins = np.rint(p * counts)
+        drawn = rng.beta(wins + 1, counts - wins + 1)
+
+    sample = matchups.copy()
+    drawn = np.where(known, drawn, observed)
+    sample[upper] = drawn
+    sample[upper[1], upper[0]] = np.where(known, 1 - drawn, matchups[upper[1], upper[0]])
+    return sample
+
+
+# Constant inputs of the running bootstrap, set in each pool worker
+_bootstrap = None
+
+
+def init_bootstrap_worker(matchups, games, triple_decks, hero_triples, field_triples, field_columns, weights, method, seed) -> None:
+    """Pool initializer shipping the bootstrap inputs to a worker once."""
+    global _bootstrap
+    _bootstrap = (matchups, games, triple_decks, hero_triples, field_triples, field_columns, weights, method, seed)
+
+
+def evaluate_replicate(replicate: int) -> tuple[int, np.ndarray, float, float]:
+    """
+    Win rates of all lineups with one resampled matchup matrix.
+
+    The draw only depends on the seed and the replicate number, so results
+    don't depend on which worker runs it.
+
+    Returns:
+        Tuple of (replicate, win rates, start time, seconds spent)
+    """
+    started = time.time()
+    matchups, games, triple_decks, hero_triples, field_triples, field_columns, weights, method, seed = _bootstrap
+    sample = resample_matchups(matchups, games, np.random.default_rng([seed, replicate]), method)
+    table = conquest_table(sample, triple_decks, triple_decks[field_triples])
+
+    values = np.empty(len(hero_triples))
+    batch = max(1, WARM_BATCH_GAMES // max(1, len(field_columns)))
+    for start in range(0, len(hero_triples), batch):
+        hero = hero_triples[start:start + batch]
+        # banlists[l, o, i, j]: lineup l without deck i against opponent o without deck j
+        banlists = table[hero[:, None, :, None], field_columns[None, :, None, :]]
+        game_values = solve_batch(banlists.reshape(-1, 4, 4))[2].reshape(len(hero), -1)
+        values[start:start + batch] = game_values @ weights
+    return replicate, values, started, time.time() - started
+
+
+def bootstrap_lineups(
+    precomputed: Precomputed,
+    games: np.ndarray,
+    field: pd.DataFrame,
+    lineups: list,
+    replicates: int = 100,
+    method: str = "beta",
+    confidence: float = 0.95,
+    seed: int = 0,
+    progress_callback: Optional[Callable[[float, str], None]] = None,
+    max_workers: Optional[int] = None,
+) -> dict[str, np.ndarray]:
+    """
+    Bootstrap the win rates of lineups against a field.
+
+    Args:
+        precomputed: Lineup index of the matchups
+        games: Games behind each matchup cell, in the precomputed deck order
+        field: Field DataFrame with lineup frequencies
+        lineups: Lineups to evaluate (deck names)
+        replicates: Number of resampled matchup matrices
+        method: "beta" or "binomial", see resample_matchups
+        confidence: Coverage of the reported intervals
+        seed: Seed of the draws, the same seed gives the same intervals
+        progress_callback: Optional callback(progress, message)
+        max_workers: Maximum parallel workers (None = auto)
+
+    Returns:
+        Dict of arrays aligned with lineups: mean, low, high (interval
+        bounds), p_top1 and p_top10 (share of replicates where the lineup
+        was the best, or among the best 10)
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown bootstrap method: {method}")
+    field_data = field.values.tolist()
+    hero_triples = precomputed.triples(precomputed.deck_array(lineups))
+    field_triples, field_columns = np.unique(
+        precomputed.triples(precomputed.deck_array(field_data)), return_inverse=True
+    )
+    counts = np.array([opp[4] for opp in field_data], dtype=np.float64)
+    initargs = (
+        precomputed.matchups, np.asarray(games, dtype=np.float64), precomputed.triple_decks, hero_triples,
+        field_triples, field_columns.reshape(-1, 4), counts / counts.sum(), method, seed,
+    )
+
+    samples = np.empty((replicates, len(lineups)), dtype=np.float32)
+    monitor = PoolMonitor(max_workers or os.cpu_count() or 1, "bootstrap")
+    with Pool(processes=max_workers, initializer=init_bootstrap_worker, initargs=initargs) as pool, monitor:
+        for done, (replicate, values, started, seconds) in enumerate(
+            pool.imap_unordered(evaluate_replicate, range(replicates)), 1
+        ):
+            monitor.record(started, seconds)
+            samples[replicate] = values
+            if progress_callback:
+                progress_callback(done / replicates, f"Bootstrapping win rates... {done}/{replicates}")
+
+    top = min(TOP_GROUP, len(lineups))
+    best = samples.argmax(axis=1)
+    best_group = np.argpartition(-samples, top - 1, axis=1)[:, :top]
+    tail = (1 - confidence) / 2
+    low, high = np.quantile(samples, [tail, 1 - tail], axis=0)
+    return {
+        "mean": samples.mean(axis=0, dtype=np.float64),
+        "low": low.astype(np.float64),
+        "high": high.astype(np.float64),
+        "p_top1": np.bincount(best, minlength=len(lineups)) / replicates,
+        "p_top10": np.bincount(best_group.ravel(), minlength=len(lineups)) / replicates,
+    }
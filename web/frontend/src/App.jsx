@@ -18,6 +18,8 @@ function App() {
   const [currentStep, setCurrentStep] = useState(STEPS.DATA_SOURCE)
   const [matchups, setMatchups] = useState(null)
   const [field, setField] = useState(null)
+  // Data as stored on the server, calculations only send the edits made to it
+  const [dataset, setDataset] = useState(null)
   const [results, setResults] = useState(null)
   const [progress, setProgress] = useState({ phase: '', progress: 0, message: '' })
   const [isLoading, setIsLoading] = useState(false)
@@ -45,9 +47,10 @@ function App() {
     }
   }
 
-  const handleDataLoaded = (loadedMatchups, loadedField) => {
+  const handleDataLoaded = (loadedMatchups, loadedField, loadedDataset = null) => {
     setMatchups(loadedMatchups)
     setField(loadedField)
+    setDataset(loadedDataset?.id ? loadedDataset : null)
     setCurrentStep(STEPS.MATCHUPS)
   }
 
@@ -70,6 +73,7 @@ function App() {
     setCurrentStep(STEPS.DATA_SOURCE)
     setMatchups(null)
     setField(null)
+    setDataset(null)
     setResults(null)
     setProgress({ phase: '', progress: 0, message: '' })
   }
@@ -163,6 +167,7 @@ function App() {
             <CalculateStep
               matchups={matchups}
               field={field}
+              dataset={dataset}
               onComplete={handleCalculationComplete}
               onBack={() => setCurrentStep(STEPS.FIELD)}
               setProgress={setProgress}
@@ -1,10 +1,32 @@
 import { useState } from 'react'
 
-export default function CalculateStep({ matchups, field, onComplete, onBack, setProgress, setIsLoading }) {
+// Matchup cells and field entries that differ from the dataset stored on the server
+const datasetEdits = (dataset, matchups, field) => {
+  const matchupEdits = []
+  matchups.deck_names.forEach((rowDeck, rowIdx) => {
+    matchups.deck_names.forEach((colDeck, colIdx) => {
+      const value = matchups.values[rowIdx][colIdx]
+      const base = dataset.matchups.values[rowIdx][colIdx]
+      if (value !== base && !(Number.isNaN(value) && Number.isNaN(base))) {
+        matchupEdits.push({ row_deck: rowDeck, col_deck: colDeck, value })
+      }
+    })
+  })
+
+  const basePct = Object.fromEntries(dataset.field.entries.map((e) => [e.deck, e.pct]))
+  const fieldEdits = field.entries.filter((e) => basePct[e.deck] !== e.pct)
+
+  return { matchup_edits: matchupEdits, field_edits: fieldEdits }
+}
+
+export default function CalculateStep({ matchups, field, dataset, onComplete, onBack, setProgress, setIsLoading }) {
   const [error, setError] = useState(null)
   const [isCalculating, setIsCalculating] = useState(false)
+  // Bootstrap confidence intervals, only crawled datasets have the game counts they need
+  const [withUncertainty, setWithUncertainty] = useState(false)
+  const [replicates, setReplicates] = useState(100)
 
-  const handleCalculate = () => {
+  const handleCalculate = (sendFullData = false) => {
     setIsLoading(true)
     setIsCalculating(true)
     setError(null)
@@ -14,10 +36,13 @@ export default function CalculateStep({ matchups, field, onComplete, onBack, set
     const ws = new WebSocket(wsUrl)
 
     ws.onopen = () => {
-      ws.send(JSON.stringify({
-        matchups,
-        field,
-      }))
+      const request = dataset && !sendFullData
+        ? { dataset_id: dataset.id, ...datasetEdits(dataset, matchups, field) }
+        : { matchups, field }
+      if (withUncertainty && dataset?.hasGames) {
+        request.uncertainty = { replicates }
+      }
+      ws.send(JSON.stringify(request))
     }
 
     ws.onmessage = (event) => {
@@ -26,15 +51,28 @@ export default function CalculateStep({ matchups, field, onComplete, onBack, set
         phase: data.phase,
         progress: data.progress,
         message: data.message,
+        rate: data.rate,
+        unit: data.unit,
+        eta: data.eta,
       })
 
       if (data.completed) {
         setIsLoading(false)
         setIsCalculating(false)
-        if (data.error) {
+        if (data.error === 'dataset_not_found' && !sendFullData) {
+          // The server forgot the dataset, send everything instead
+          ws.onclose = null
+          ws.close()
+          handleCalculate(true)
+          return
+        } else if (data.error) {
           setError(data.error)
         } else if (data.results) {
-          onComplete(data.results)
+          onComplete({
+            id: data.result_id,
+            total: data.total,
+            top: data.results,
+          })
         }
         ws.close()
       }
@@ -133,9 +171,42 @@ export default function CalculateStep({ matchups, field, onComplete, onBack, set
         </ol>
       </div>
 
+      {/* Uncertainty */}
+      {dataset?.hasGames && (
+        <div className="bg-slate-700/30 rounded-lg p-6 mb-6">
+          <label className="flex items-center gap-3 text-white font-medium">
+            <input
+              type="checkbox"
+              checked={withUncertainty}
+              onChange={(e) => setWithUncertainty(e.target.checked)}
+              disabled={isCalculating}
+            />
+            Confidence intervals
+          </label>
+          <p className="text-gray-400 text-sm mt-2">
+            Resamples the matchups from their HSReplay game counts and recalculates every lineup,
+            reporting a 95% interval and how often each lineup ends up best or in the top 10.
+          </p>
+          {withUncertainty && (
+            <label className="flex items-center gap-3 text-sm text-gray-400 mt-3">
+              Replicates
+              <input
+                type="number"
+                min={10}
+                max={1000}
+                value={replicates}
+                onChange={(e) => setReplicates(Math.min(1000, Math.max(10, Number(e.target.value) || 10)))}
+                disabled={isCalculating}
+                className="w-24 bg-slate-800 border border-slate-600 rounded px-2 py-1 text-white"
+              />
+            </label>
+          )}
+        </div>
+      )}
+
       {/* Calculate Button */}
       <button
-        onClick={handleCalculate}
+        onClick={() => handleCalculate()}
         disabled={isCalculating}
         className={`w-full py-4 rounded-lg font-bold text-lg transition-all ${
           isCalculating
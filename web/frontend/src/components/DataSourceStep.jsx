@@ -50,6 +50,9 @@ export default function DataSourceStep({ onDataLoaded, setProgress, setIsLoading
         phase: data.phase,
         progress: data.progress,
         message: data.message,
+        rate: data.rate,
+        unit: data.unit,
+        eta: data.eta,
       })
 
       if (data.completed) {
@@ -57,7 +60,12 @@ export default function DataSourceStep({ onDataLoaded, setProgress, setIsLoading
         if (data.error) {
           setError(data.error)
         } else if (data.matchups && data.field) {
-          onDataLoaded(data.matchups, data.field)
+          onDataLoaded(data.matchups, data.field, {
+            id: data.dataset_id,
+            matchups: data.matchups,
+            field: data.field,
+            hasGames: data.has_games,
+          })
         }
         ws.close()
       }
@@ -88,7 +96,7 @@ export default function DataSourceStep({ onDataLoaded, setProgress, setIsLoading
       })
       const data = await response.json()
       if (data.success) {
-        setUploadedMatchups(data.matchups)
+        setUploadedMatchups({ ...data.matchups, datasetId: data.dataset_id })
         setError(null)
       } else {
         setError(data.detail || 'Failed to parse matchups file')
@@ -124,14 +132,20 @@ export default function DataSourceStep({ onDataLoaded, setProgress, setIsLoading
 
   const handleManualContinue = () => {
     if (uploadedMatchups) {
-      // If no field uploaded, create default field with equal distribution
-      const defaultField = uploadedField || {
-        entries: uploadedMatchups.deck_names.map((deck) => ({
+      const { datasetId, ...matchups } = uploadedMatchups
+      // The server stores uploaded matchups with this same equal distribution field,
+      // an uploaded field is sent as edits to it
+      const defaultField = {
+        entries: matchups.deck_names.map((deck) => ({
           deck,
-          pct: 100 / uploadedMatchups.deck_names.length,
+          pct: 100 / matchups.deck_names.length,
         })),
       }
-      onDataLoaded(uploadedMatchups, defaultField)
+      onDataLoaded(matchups, uploadedField || defaultField, {
+        id: datasetId,
+        matchups,
+        field: defaultField,
+      })
     }
   }
 
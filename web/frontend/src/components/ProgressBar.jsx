@@ -1,5 +1,5 @@
 export default function ProgressBar({ progress }) {
-  const { phase, progress: progressValue, message } = progress
+  const { phase, progress: progressValue, message, rate, unit, eta } = progress
 
   const getPhaseLabel = () => {
     switch (phase) {
@@ -28,6 +28,13 @@ export default function ProgressBar({ progress }) {
 
   const percentage = Math.round(progressValue * 100)
 
+  const formatEta = (seconds) => {
+    if (seconds < 60) return `~${Math.ceil(seconds)}s left`
+    const minutes = Math.floor(seconds / 60)
+    if (minutes < 60) return `~${minutes}m ${Math.ceil(seconds % 60)}s left`
+    return `~${Math.floor(minutes / 60)}h ${minutes % 60}m left`
+  }
+
   return (
     <div className="w-full">
       <div className="flex justify-between text-sm text-gray-400 mb-2">
@@ -45,6 +52,12 @@ export default function ProgressBar({ progress }) {
       {message && (
         <p className="text-sm text-gray-400 mt-2">{message}</p>
       )}
+      {rate > 0 && (
+        <p className="text-xs text-gray-500 mt-1">
+          {Math.round(rate).toLocaleString()} {unit}/s
+          {eta != null && ` • ${formatEta(eta)}`}
+        </p>
+      )}
     </div>
   )
 }
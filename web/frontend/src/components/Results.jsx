@@ -1,57 +1,148 @@
-import { useState, useMemo } from 'react'
+import { useState, useEffect, useMemo, useRef, useCallback } from 'react'
 
-export default function Results({ results, onBack, onReset }) {
-  const [filter, setFilter] = useState('')
-  const [showTop, setShowTop] = useState(20)
-
-  const filteredResults = useMemo(() => {
-    if (!filter) return results.slice(0, showTop)
-    
-    const lowerFilter = filter.toLowerCase()
-    return results
-      .filter(r => r.decks.some(d => d.toLowerCase().includes(lowerFilter)))
-      .slice(0, showTop)
-  }, [results, filter, showTop])
-
-  const handleExportCSV = () => {
-    const headers = ['Deck 1', 'Deck 2', 'Deck 3', 'Deck 4', 'Win Rate']
-    const rows = results.map(r => [...r.decks, r.win_rate.toFixed(4)])
-    const csvContent = [headers, ...rows].map(row => row.join(',')).join('\n')
-    
-    const blob = new Blob([csvContent], { type: 'text/csv' })
-    const url = URL.createObjectURL(blob)
-    const a = document.createElement('a')
-    a.href = url
-    a.download = 'lineup_results.csv'
-    a.click()
-    URL.revokeObjectURL(url)
+const ROW_HEIGHT = 44
+const VIEWPORT_HEIGHT = 560
+const PAGE_SIZE = 100
+const OVERSCAN = 10
+
+// Class colors
+const getClassColor = (deckName) => {
+  const classColors = {
+    'Warrior': 'text-amber-600',
+    'Paladin': 'text-yellow-400',
+    'Hunter': 'text-green-500',
+    'Rogue': 'text-yellow-600',
+    'Priest': 'text-gray-300',
+    'Shaman': 'text-blue-400',
+    'Mage': 'text-cyan-400',
+    'Warlock': 'text-purple-500',
+    'Druid': 'text-orange-600',
+    'Demon Hunter': 'text-emerald-400',
+    'Death Knight': 'text-sky-300',
   }
 
-  // Best lineup
-  const bestLineup = results[0]
-
-  // Class colors
-  const getClassColor = (deckName) => {
-    const classColors = {
-      'Warrior': 'text-amber-600',
-      'Paladin': 'text-yellow-400',
-      'Hunter': 'text-green-500',
-      'Rogue': 'text-yellow-600',
-      'Priest': 'text-gray-300',
-      'Shaman': 'text-blue-400',
-      'Mage': 'text-cyan-400',
-      'Warlock': 'text-purple-500',
-      'Druid': 'text-orange-600',
-      'Demon Hunter': 'text-emerald-400',
-      'Death Knight': 'text-sky-300',
-    }
-    
-    for (const [className, color] of Object.entries(classColors)) {
-      if (deckName.includes(className)) return color
+  for (const [className, color] of Object.entries(classColors)) {
+    if (deckName.includes(className)) return color
+  }
+  return 'text-gray-400'
+}
+
+const getWinRateColor = (winRate) =>
+  winRate >= 0.52
+    ? 'text-green-400'
+    : winRate >= 0.5
+    ? 'text-yellow-400'
+    : 'text-red-400'
+
+export default function Results({ results, onBack, onReset }) {
+  const [summary, setSummary] = useState(null)
+  const [include, setInclude] = useState([])
+  const [exclude, setExclude] = useState([])
+  const [excludeClass, setExcludeClass] = useState([])
+  const [sort, setSort] = useState('win_rate:desc')
+  const [filteredTotal, setFilteredTotal] = useState(results.total)
+  const [pages, setPages] = useState({})
+  const [scrollTop, setScrollTop] = useState(0)
+  const [error, setError] = useState(null)
+  const requested = useRef(new Set())
+  const scrollRef = useRef(null)
+
+  // Query string shared by page requests and the CSV export
+  const filterQuery = useMemo(() => {
+    const params = new URLSearchParams()
+    include.forEach((deck) => params.append('include', deck))
+    exclude.forEach((deck) => params.append('exclude', deck))
+    excludeClass.forEach((cls) => params.append('exclude_class', cls))
+    return params
+  }, [include, exclude, excludeClass])
+
+  const pageQuery = useMemo(() => {
+    const params = new URLSearchParams(filterQuery)
+    const [sortKey, order] = sort.split(':')
+    params.set('sort', sortKey)
+    params.set('order', order)
+    params.set('limit', PAGE_SIZE)
+    return params.toString()
+  }, [filterQuery, sort])
+
+  useEffect(() => {
+    fetch(`/api/results/${results.id}/summary`)
+      .then((res) => res.json())
+      .then(setSummary)
+      .catch((err) => console.error('Failed to fetch summary:', err))
+  }, [results.id])
+
+  // New filters or sort start over from the first page
+  useEffect(() => {
+    requested.current = new Set()
+    setPages({})
+    setScrollTop(0)
+    if (scrollRef.current) scrollRef.current.scrollTop = 0
+  }, [pageQuery])
+
+  const fetchPage = useCallback((page) => {
+    const key = `${pageQuery}#${page}`
+    if (requested.current.has(key)) return
+    requested.current.add(key)
+
+    fetch(`/api/results/${results.id}?${pageQuery}&offset=${page * PAGE_SIZE}`)
+      .then((res) => {
+        if (!res.ok) throw new Error(`Request failed with status ${res.status}`)
+        return res.json()
+      })
+      .then((data) => {
+        if (!requested.current.has(key)) return // filters changed meanwhile
+        setFilteredTotal(data.total)
+        setPages((prev) => ({ ...prev, [page]: data.rows }))
+        setError(null)
+      })
+      .catch((err) => {
+        requested.current.delete(key)
+        setError(err.message)
+      })
+  }, [results.id, pageQuery])
+
+  // Only the rows in view (plus some overscan) are rendered and fetched
+  const firstRow = Math.max(0, Math.floor(scrollTop / ROW_HEIGHT) - OVERSCAN)
+  const lastRow = Math.min(
+    filteredTotal,
+    Math.ceil((scrollTop + VIEWPORT_HEIGHT) / ROW_HEIGHT) + OVERSCAN
+  )
+
+  useEffect(() => {
+    const firstPage = Math.floor(firstRow / PAGE_SIZE)
+    const lastPage = Math.floor(Math.max(firstRow, lastRow - 1) / PAGE_SIZE)
+    for (let page = firstPage; page <= lastPage; page++) {
+      fetchPage(page)
     }
-    return 'text-gray-400'
+  }, [firstRow, lastRow, fetchPage])
+
+  const visibleRows = []
+  for (let index = firstRow; index < lastRow; index++) {
+    const page = pages[Math.floor(index / PAGE_SIZE)]
+    visibleRows.push({ index, row: page ? page[index % PAGE_SIZE] : null })
+  }
+
+  const deckOptions = summary?.decks || []
+  const classOptions = [...new Set(deckOptions.map((d) => d.player_class_name))].sort()
+
+  const addTo = (setter) => (e) => {
+    const value = e.target.value
+    if (value) setter((prev) => (prev.includes(value) ? prev : [...prev, value]))
+    e.target.value = ''
   }
 
+  const removeFrom = (setter, value) => setter((prev) => prev.filter((v) => v !== value))
+
+  const chips = [
+    ...include.map((v) => ({ label: `+ ${v}`, onRemove: () => removeFrom(setInclude, v), color: 'border-green-600' })),
+    ...exclude.map((v) => ({ label: `− ${v}`, onRemove: () => removeFrom(setExclude, v), color: 'border-red-600' })),
+    ...excludeClass.map((v) => ({ label: `− ${v}`, onRemove: () => removeFrom(setExcludeClass, v), color: 'border-red-600' })),
+  ]
+
+  // Best lineup
+  const bestLineup = results.top[0]
+
   return (
     <div>
       <div className="flex items-center justify-between mb-6">
@@ -60,7 +151,7 @@ export default function Results({ results, onBack, onReset }) {
             Results
           </h2>
           <p className="text-gray-400 text-sm mt-1">
-            {results.length} lineups calculated and ranked by win rate
+            {results.total} lineups calculated and ranked by win rate
           </p>
         </div>
         <div className="flex gap-3">
@@ -70,12 +161,12 @@ export default function Results({ results, onBack, onReset }) {
           >
             ← Back
           </button>
-          <button
-            onClick={handleExportCSV}
+          <a
+            href={`/api/results/${results.id}/csv?${filterQuery.toString()}`}
             className="px-4 py-2 bg-slate-700 hover:bg-slate-600 rounded-lg text-white transition-colors"
           >
             📥 Export CSV
-          </button>
+          </a>
           <button
             onClick={onReset}
             className="px-4 py-2 bg-hs-gold hover:bg-yellow-500 text-hs-dark font-semibold rounded-lg transition-colors"
@@ -111,87 +202,135 @@ export default function Results({ results, onBack, onReset }) {
       )}
 
       {/* Filter and Controls */}
-      <div className="flex gap-4 mb-4">
-        <input
-          type="text"
-          placeholder="Filter by deck name..."
-          value={filter}
-          onChange={(e) => setFilter(e.target.value)}
-          className="flex-1 bg-slate-700 border border-slate-600 rounded-lg px-4 py-2 text-white placeholder-gray-500 focus:border-hs-gold focus:outline-none"
-        />
+      <div className="grid md:grid-cols-4 gap-4 mb-3">
         <select
-          value={showTop}
-          onChange={(e) => setShowTop(parseInt(e.target.value))}
+          onChange={addTo(setInclude)}
+          defaultValue=""
           className="bg-slate-700 border border-slate-600 rounded-lg px-4 py-2 text-white focus:border-hs-gold focus:outline-none"
         >
-          <option value={10}>Top 10</option>
-          <option value={20}>Top 20</option>
-          <option value={50}>Top 50</option>
-          <option value={100}>Top 100</option>
+          <option value="">Must include deck...</option>
+          {deckOptions.map((d) => (
+            <option key={d.name} value={d.name}>{d.name}</option>
+          ))}
+        </select>
+        <select
+          onChange={addTo(setExclude)}
+          defaultValue=""
+          className="bg-slate-700 border border-slate-600 rounded-lg px-4 py-2 text-white focus:border-hs-gold focus:outline-none"
+        >
+          <option value="">Exclude deck...</option>
+          {deckOptions.map((d) => (
+            <option key={d.name} value={d.name}>{d.name}</option>
+          ))}
+        </select>
+        <select
+          onChange={addTo(setExcludeClass)}
+          defaultValue=""
+          className="bg-slate-700 border border-slate-600 rounded-lg px-4 py-2 text-white focus:border-hs-gold focus:outline-none"
+        >
+          <option value="">Exclude class...</option>
+          {classOptions.map((cls) => (
+            <option key={cls} value={cls}>{cls}</option>
+          ))}
+        </select>
+        <select
+          value={sort}
+          onChange={(e) => setSort(e.target.value)}
+          className="bg-slate-700 border border-slate-600 rounded-lg px-4 py-2 text-white focus:border-hs-gold focus:outline-none"
+        >
+          <option value="win_rate:desc">Best win rate first</option>
+          <option value="win_rate:asc">Worst win rate first</option>
+          <option value="lineup:asc">Lineup A-Z</option>
+          <option value="lineup:desc">Lineup Z-A</option>
         </select>
       </div>
 
-      {/* Results Table */}
+      {chips.length > 0 && (
+        <div className="flex flex-wrap gap-2 mb-3">
+          {chips.map((chip) => (
+            <button
+              key={chip.label}
+              onClick={chip.onRemove}
+              className={`px-3 py-1 rounded-full border ${chip.color} text-sm text-gray-300 hover:text-white`}
+            >
+              {chip.label} ✕
+            </button>
+          ))}
+        </div>
+      )}
+
+      {error && (
+        <div className="bg-red-900/50 border border-red-700 rounded-lg p-4 mb-3">
+          <p className="text-red-300">{error}</p>
+        </div>
+      )}
+
+      <p className="text-gray-500 text-sm mb-2">
+        {filteredTotal} matching lineups
+      </p>
+
+      {/* Results Table (virtualized, pages are fetched as they scroll into view) */}
       <div className="bg-slate-700/30 rounded-lg overflow-hidden">
-        <table className="w-full">
-          <thead>
-            <tr className="bg-slate-800">
-              <th className="px-4 py-3 text-left text-gray-400 text-sm font-medium w-12">
-                #
-              </th>
-              <th className="px-4 py-3 text-left text-gray-400 text-sm font-medium">
-                Lineup
-              </th>
-              <th className="px-4 py-3 text-right text-gray-400 text-sm font-medium w-24">
-                Win Rate
-              </th>
-            </tr>
-          </thead>
-          <tbody>
-            {filteredResults.map((result, idx) => {
-              const originalIdx = results.indexOf(result)
-              return (
-                <tr
-                  key={idx}
-                  className="border-t border-slate-700 hover:bg-slate-700/50 transition-colors"
-                >
-                  <td className="px-4 py-3 text-gray-500 text-sm">
-                    {originalIdx + 1}
-                  </td>
-                  <td className="px-4 py-3">
-                    <div className="flex flex-wrap gap-2">
-                      {result.decks.map((deck, deckIdx) => (
-                        <span
-                          key={deckIdx}
-                          className={`text-sm ${getClassColor(deck)}`}
-                        >
-                          {deck}
-                          {deckIdx < result.decks.length - 1 && (
-                            <span className="text-gray-600 ml-2">•</span>
-                          )}
-                        </span>
-                      ))}
-                    </div>
-                  </td>
-                  <td className="px-4 py-3 text-right">
-                    <span className={`font-mono font-medium ${
-                      result.win_rate >= 0.52
-                        ? 'text-green-400'
-                        : result.win_rate >= 0.5
-                        ? 'text-yellow-400'
-                        : 'text-red-400'
-                    }`}>
-                      {(result.win_rate * 100).toFixed(2)}%
+        <div className="flex bg-slate-800 text-gray-400 text-sm font-medium">
+          <div className="px-4 py-3 w-20">#</div>
+          <div className="px-4 py-3 flex-1">Lineup</div>
+          <div className="px-4 py-3 w-28 text-right">Win Rate</div>
+        </div>
+        <div
+          ref={scrollRef}
+          onScroll={(e) => setScrollTop(e.currentTarget.scrollTop)}
+          style={{ height: Math.min(VIEWPORT_HEIGHT, Math.max(filteredTotal, 1) * ROW_HEIGHT) }}
+          className="overflow-y-auto"
+        >
+          <div style={{ height: filteredTotal * ROW_HEIGHT, position: 'relative' }}>
+            {visibleRows.map(({ index, row }) => (
+              <div
+                key={index}
+                style={{ position: 'absolute', top: index * ROW_HEIGHT, height: ROW_HEIGHT, left: 0, right: 0 }}
+                className="flex items-center border-t border-slate-700 hover:bg-slate-700/50 transition-colors"
+              >
+                <div className="px-4 w-20 text-gray-500 text-sm">
+                  {row ? row.rank : index + 1}
+                </div>
+                <div className="px-4 flex-1 flex flex-wrap gap-2 overflow-hidden">
+                  {row ? (
+                    row.decks.map((deck, deckIdx) => (
+                      <span
+                        key={deckIdx}
+                        className={`text-sm ${getClassColor(deck)}`}
+                      >
+                        {deck}
+                        {deckIdx < row.decks.length - 1 && (
+                          <span className="text-gray-600 ml-2">•</span>
+                        )}
+                      </span>
+                    ))
+                  ) : (
+                    <span className="text-sm text-gray-600">Loading...</span>
+                  )}
+                </div>
+                <div className="px-4 w-28 text-right">
+                  {row && (
+                    <span className={`font-mono font-medium ${getWinRateColor(row.win_rate)}`}>
+                      {(row.win_rate * 100).toFixed(2)}%
                     </span>
-                  </td>
-                </tr>
-              )
-            })}
-          </tbody>
-        </table>
+                  )}
+                  {row?.low != null && (
+                    <div
+                      className="font-mono text-xs text-gray-500"
+                      title={`Best in ${(row.p_top1 * 100).toFixed(0)}% and top 10 in ${(row.p_top10 * 100).toFixed(0)}% of bootstrap replicates`}
+                    >
+                      {(row.low * 100).toFixed(1)}–{(row.high * 100).toFixed(1)}%
+                    </div>
+                  )}
+                </div>
+              </div>
+            ))}
+          </div>
+        </div>
       </div>
 
-      {filteredResults.length === 0 && (
+      {filteredTotal === 0 && (
         <div className="text-center py-8 text-gray-500">
           No lineups match your filter
         </div>
@@ -202,19 +341,19 @@ export default function Results({ results, onBack, onReset }) {
         <div className="bg-slate-700/30 rounded-lg p-4">
           <div className="text-gray-400 text-sm">Highest Win Rate</div>
           <div className="text-xl font-bold text-green-400">
-            {(results[0]?.win_rate * 100).toFixed(2)}%
+            {summary?.best_win_rate != null ? `${(summary.best_win_rate * 100).toFixed(2)}%` : '-'}
           </div>
         </div>
         <div className="bg-slate-700/30 rounded-lg p-4">
           <div className="text-gray-400 text-sm">Average Top 10</div>
           <div className="text-xl font-bold text-yellow-400">
-            {(results.slice(0, 10).reduce((sum, r) => sum + r.win_rate, 0) / Math.min(10, results.length) * 100).toFixed(2)}%
+            {summary?.top10_average != null ? `${(summary.top10_average * 100).toFixed(2)}%` : '-'}
           </div>
         </div>
         <div className="bg-slate-700/30 rounded-lg p-4">
           <div className="text-gray-400 text-sm">Total Lineups</div>
           <div className="text-xl font-bold text-white">
-            {results.length}
+            {results.total}
           </div>
         </div>
       </div>
@@ -0,0 +1,102 @@
+import csv
+import heapq
+import os
+import shutil
+from result_format import BinaryResultWriter
+from configuration import RESULTS_CHUNK_SIZE, TOP_K
+
+# Max number of chunk files merged at once, keeps open file handles bounded
+MERGE_FAN_IN = 128
+
+def value_key(row):
+    return float(row[4])
+
+# Streams lineup results to disk in sorted chunks so memory stays flat
+# Chunks are temporary merge files in "<output>.parts", cleared when a writer starts and removed after the merge;
+# resuming an interrupted run comes from the checkpoint, not from the chunks
+# If binary_path is given, the merge also writes the binary results (see result_format.py)
+class ResultWriter:
+    def __init__(self, output_path, chunk_size=RESULTS_CHUNK_SIZE, top_k=TOP_K, binary_path=None, deck_names=None):
+        self.output_path = output_path
+        self.binary_path = binary_path
+        self.deck_names = deck_names
+        self.chunk_size = chunk_size
+        self.top_k = top_k
+        self.parts_dir = f"{output_path}.parts"
+        self.buffer = []
+        self.chunks = []
+        self.count = 0
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        os.makedirs(self.parts_dir)
+
+    def add(self, row):
+        self.buffer.append(row)
+        self.count += 1
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    # Sorts the buffered rows and writes them as a new chunk
+    def flush(self):
+        if not self.buffer:
+            return
+        self.buffer.sort(key=value_key, reverse=True)
+        if self.top_k:
+            del self.buffer[self.top_k:]
+        self.chunks.append(self.write_chunk(self.buffer))
+        self.buffer = []
+
+    def write_chunk(self, rows):
+        path = os.path.join(self.parts_dir, f"chunk_{len(self.chunks):06d}.csv")
+        with open(path, "w", newline="") as f:
+            csv.writer(f, lineterminator="\n").writerows(rows)
+        return path
+
+    # External merge sort of all chunks into the output path, keeping only the top K rows if set
+    def finish(self):
+        self.flush()
+        chunks = self.chunks
+        level = 0
+        while len(chunks) > MERGE_FAN_IN:
+            merged = []
+            for i in range(0, len(chunks), MERGE_FAN_IN):
+                path = os.path.join(self.parts_dir, f"merge_{level}_{i // MERGE_FAN_IN:06d}.csv")
+                merge_chunks(chunks[i:i + MERGE_FAN_IN], path, self.top_k)
+                merged.append(path)
+            chunks = merged
+            level += 1
+
+        saved = min(self.count, self.top_k) if self.top_k else self.count
+        binary = None
+        if self.binary_path:
+            binary = BinaryResultWriter(self.binary_path, self.deck_names, saved)
+        tmp_path = f"{self.output_path}.tmp"
+        merge_chunks(chunks, tmp_path, self.top_k, binary)
+        os.replace(tmp_path, self.output_path)
+        if binary:
+            binary.close()
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        return saved
+
+def read_chunk(f):
+    for row in csv.reader(f):
+        if row:
+            yield row
+
+# Merges already sorted chunk files into one sorted file, also feeding the rows to binary if given
+def merge_chunks(paths, output_path, top_k=None, binary=None):
+    files = [open(path, newline="") for path in paths]
+    try:
+        merged = heapq.merge(*(read_chunk(f) for f in files), key=value_key, reverse=True)
+        with open(output_path, "w", newline="") as out:
+            writer = csv.writer(out, lineterminator="\n")
+            for count, row in enumerate(merged):
+                if top_k and count >= top_k:
+                    break
+                writer.writerow(row)
+                if binary:
+                    binary.append(row)
+    finally:
+        for f in files:
+            f.close()
+    for path in paths:
+        os.remove(path)